@@ -4,3 +4,24 @@ from django.apps import AppConfig
 class CatalogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'catalog'
+
+    def ready(self):
+        from django.db.models.signals import post_save, post_delete, m2m_changed, post_migrate
+        from . import signals  # connects signal receivers
+        from .models import BaseDetails
+        from .query_cache import query_cache
+
+        for model in self.apps.get_models(include_auto_created=True):
+            if issubclass(model, BaseDetails):
+                post_save.connect(signals.details_changed, sender=model)
+                post_delete.connect(signals.details_changed, sender=model)
+            if query_cache.is_tracked(model):
+                post_save.connect(signals.model_written, sender=model)
+                post_delete.connect(signals.model_written, sender=model)
+                for field in model._meta.many_to_many:
+                    m2m_changed.connect(signals.relation_written, sender=field.remote_field.through)
+        post_migrate.connect(signals.catalog_migrated, sender=self)
+        from . import checks  # registers system checks
+        from .filter_registry import filter_registry
+
+        filter_registry.compile_all()
@@ -0,0 +1,147 @@
+import bisect
+import re
+import threading
+from typing import Dict, List, Tuple
+
+from django.utils.timezone import now
+
+from .models import Product, Category
+from .versions import catalog_version
+
+
+class AutocompleteDictionary:
+    """ In-memory sorted dictionary of terms of product and category names, answers prefix lookups with bisect.
+        Every word of a name starts a term ('red led garland' gives 'red led garland', 'led garland', 'garland'),
+        so a prefix matches beginning of any word. Loaded lazily, then kept up to date by catalog.signals
+        in the process that saved, other processes load it again once catalog_version is bumped.
+        Products published in future are kept too, they are excluded at lookup time.
+    """
+    PRODUCT = 'product'
+    CATEGORY = 'category'
+
+    word_re = re.compile(r'\w+')
+    max_scanned = 1000  # terms looked through for a single lookup, bounds time of too short prefixes
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.version = None  # catalog_version the dictionary was loaded at, None if not loaded
+        self._reset()
+
+    def _reset(self) -> None:
+        self.terms: List[Tuple[str, str, int]] = []  # sorted (term, kind, pk)
+        self.products: Dict[int, Dict] = dict()
+        self.categories: Dict[int, Dict] = dict()
+
+    @classmethod
+    def normalize(cls, text: str) -> str:
+        return ' '.join(cls.word_re.findall(text.lower()))
+
+    @classmethod
+    def terms_of(cls, name: str) -> List[str]:
+        words = cls.word_re.findall(name.lower())
+        return [' '.join(words[i:]) for i in range(len(words))]
+
+    def load(self) -> None:
+        version = catalog_version.get()  # read before rows, so writes made meanwhile make the dictionary stale
+        products = Product.objects.values('pk', 'name', 'category_id', 'published_at')
+        categories = Category.objects.values('pk', 'name', 'slug')
+        with self.lock:
+            self._reset()
+            for c in categories:
+                self.categories[c['pk']] = c
+                self.terms.extend((term, self.CATEGORY, c['pk']) for term in self.terms_of(c['name']))
+            for p in products:
+                self.products[p['pk']] = p
+                self.terms.extend((term, self.PRODUCT, p['pk']) for term in self.terms_of(p['name']))
+            self.terms.sort()
+            self.version = version
+
+    def ensure_loaded(self) -> None:
+        version = catalog_version.get()
+        if self.version != version:
+            with self.lock:
+                if self.version != version:
+                    self.load()
+
+    def drop(self) -> None:
+        with self.lock:
+            self._reset()
+            self.version = None
+
+    def _insert(self, name: str, kind: str, pk: int) -> None:
+        for term in self.terms_of(name):
+            bisect.insort(self.terms, (term, kind, pk))
+
+    def _delete(self, name: str, kind: str, pk: int) -> None:
+        for term in self.terms_of(name):
+            position = bisect.bisect_left(self.terms, (term, kind, pk))
+            if position < len(self.terms) and self.terms[position] == (term, kind, pk):
+                del self.terms[position]
+
+    def upsert_product(self, product: Product) -> None:
+        with self.lock:
+            if self.version is None:
+                return
+            self.remove_product(product.pk)
+            self.products[product.pk] = {'pk': product.pk, 'name': product.name,
+                                         'category_id': product.category_id, 'published_at': product.published_at}
+            self._insert(product.name, self.PRODUCT, product.pk)
+
+    def remove_product(self, pk: int) -> None:
+        with self.lock:
+            old = self.products.pop(pk, None)
+            if old is not None:
+                self._delete(old['name'], self.PRODUCT, pk)
+
+    def upsert_category(self, category: Category) -> None:
+        with self.lock:
+            if self.version is None:
+                return
+            self.remove_category(category.pk)
+            self.categories[category.pk] = {'pk': category.pk, 'name': category.name, 'slug': category.slug}
+            self._insert(category.name, self.CATEGORY, category.pk)
+
+    def remove_category(self, pk: int) -> None:
+        with self.lock:
+            old = self.categories.pop(pk, None)
+            if old is not None:
+                self._delete(old['name'], self.CATEGORY, pk)
+
+    def lookup(self, prefix: str, limit: int = 10) -> Dict[str, List[Dict]]:
+        """ At most limit published products and categories with a word of name starting with prefix,
+            in alphabetical order of matched terms
+        """
+        self.ensure_loaded()
+        prefix = self.normalize(prefix)
+        result = {'products': [], 'categories': []}
+        if not prefix:
+            return result
+
+        current_time = now()
+        seen = set()
+        with self.lock:
+            start = bisect.bisect_left(self.terms, (prefix,))
+            for term, kind, pk in self.terms[start:start + self.max_scanned]:
+                if not term.startswith(prefix):
+                    break
+                if (kind, pk) in seen:
+                    continue
+                seen.add((kind, pk))
+
+                if kind == self.CATEGORY and len(result['categories']) < limit:
+                    c = self.categories[pk]
+                    result['categories'].append({'name': c['name'], 'slug': c['slug']})
+                elif kind == self.PRODUCT and len(result['products']) < limit:
+                    p = self.products[pk]
+                    category = self.categories.get(p['category_id'])
+                    if p['published_at'] <= current_time and category is not None:
+                        result['products'].append({'pk': pk, 'name': p['name'],
+                                                   'category__name': category['name'],
+                                                   'category__slug': category['slug']})
+
+                if len(result['products']) >= limit and len(result['categories']) >= limit:
+                    break
+        return result
+
+
+autocomplete_dictionary = AutocompleteDictionary()
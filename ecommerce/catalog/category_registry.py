@@ -0,0 +1,56 @@
+import threading
+from typing import Dict, List, Optional
+
+from .models import Category, BaseDetails
+from .versions import categories_version
+
+
+class CategoryRegistry:
+    """ Process-local copy of every Category with resolved details model, categories change a few times a year.
+        Checks categories_version on access (at most once per request, see SharedVersion), so all processes
+        reload categories once any of them is saved.
+        Returned categories are shared between requests and must not be modified.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._categories: List[Category] = []
+        self._by_slug: Dict[str, Category] = dict()
+        self._by_pk: Dict[int, Category] = dict()
+        self._details_models: Dict[int, Optional[type[BaseDetails]]] = dict()
+
+    def _ensure_fresh(self) -> None:
+        version = categories_version.get()
+        with self._lock:
+            if version == self._version:
+                return
+
+            categories = list(Category.objects.select_related('details_content_type').order_by('pk'))
+            self._categories = categories
+            self._by_slug = {c.slug: c for c in categories}
+            self._by_pk = {c.pk: c for c in categories}
+            self._details_models = {c.pk: c.details_content_type.model_class() for c in categories}
+            self._version = version
+
+    def all(self) -> List[Category]:
+        self._ensure_fresh()
+        return list(self._categories)
+
+    def get(self, pk: int) -> Optional[Category]:
+        self._ensure_fresh()
+        return self._by_pk.get(pk)
+
+    def get_by_slug(self, slug: str) -> Optional[Category]:
+        self._ensure_fresh()
+        return self._by_slug.get(slug)
+
+    def get_details_model(self, category: Category) -> Optional[type[BaseDetails]]:
+        self._ensure_fresh()
+        return self._details_models.get(category.pk)
+
+    def drop(self) -> None:
+        with self._lock:
+            self._version = None
+
+
+category_registry = CategoryRegistry()
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core import checks
+
+from .filter_registry import filter_registry
+
+
+@checks.register(checks.Tags.models)
+def check_filters(app_configs, **kwargs):
+    """ Reports invalid FILTERS of BaseDetails subclasses """
+    return filter_registry.get_errors()
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """ Catalog caches are invalidated through versions kept in default cache, it must be shared by processes """
+    timeouts = ['CATALOG_PRODUCT_CACHE_TIMEOUT', 'CATALOG_ENTITY_CACHE_TIMEOUT',
+                'CATALOG_QUERY_CACHE_TIMEOUT', 'CATALOG_LISTING_CACHE_TIMEOUT']
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if backend.endswith('LocMemCache') and any(getattr(settings, name, 0) for name in timeouts):
+        return [checks.Warning(
+            'Default cache is local to process, catalog caches of other processes are not invalidated',
+            hint='Use a shared backend (DatabaseCache, Redis, Memcached) or set CATALOG_*_CACHE_TIMEOUT to 0',
+            id='catalog.W001',
+        )]
+    return []
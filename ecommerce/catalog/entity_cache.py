@@ -0,0 +1,79 @@
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import models, transaction
+
+from .models import Product, BaseDetails
+from .versions import SharedVersion
+
+
+class EntityCache:
+    """ Read-through cache of Product and BaseDetails instances keyed on (content type, pk),
+        misses of a multi-get are loaded with a single query.
+        Entries are dropped by catalog.signals when instances are saved or deleted and once more on commit,
+        rows loaded while entries of the model were dropped are not stored, so a slow reader does not put back
+        stale rows.
+        instances changed with QuerySet.update must be invalidated explicitly.
+        Entries may be stale for a moment after writes, use them only for reading: write paths load rows from DB.
+        Caching is disabled if settings.CATALOG_ENTITY_CACHE_TIMEOUT is 0, instances are still loaded in batches.
+    """
+    @staticmethod
+    def is_enabled() -> bool:
+        return bool(settings.CATALOG_ENTITY_CACHE_TIMEOUT)
+
+    @staticmethod
+    def key(model: type[models.Model], pk: int) -> str:
+        return f'catalog:entity:{ContentType.objects.get_for_model(model).pk}:{pk}'
+
+    @staticmethod
+    def version(model: type[models.Model]) -> SharedVersion:
+        """ Bumped on every invalidation of model's entries """
+        return SharedVersion(f'catalog:entity:{ContentType.objects.get_for_model(model).pk}:version')
+
+    @classmethod
+    def get(cls, model: type[models.Model], pk: int) -> Optional[models.Model]:
+        return cls.get_many(model, [pk]).get(pk)
+
+    @classmethod
+    def get_many(cls, model: type[models.Model], pks: Iterable[int]) -> Dict[int, models.Model]:
+        """ Instances found by pks, missing ones are absent in result """
+        pks = set(pks)
+        if not pks:
+            return dict()
+        if not cls.is_enabled():
+            return model._base_manager.in_bulk(pks)
+
+        keys = {cls.key(model, pk): pk for pk in pks}
+        found = {keys[key]: instance for key, instance in cache.get_many(list(keys)).items()}
+
+        missing = pks - found.keys()
+        if missing:
+            version = cls.version(model).get()
+            loaded = model._base_manager.in_bulk(missing)
+            if cls.version(model).get() != version:  # rows may have been written after they were read
+                return {**found, **loaded}
+            cache.set_many({cls.key(model, pk): instance for pk, instance in loaded.items()},
+                           settings.CATALOG_ENTITY_CACHE_TIMEOUT)
+            found.update(loaded)
+        return found
+
+    @classmethod
+    def get_details(cls, product: Product) -> Optional[BaseDetails]:
+        details_model = ContentType.objects.get_for_id(product.details_content_type_id).model_class()
+        return cls.get(details_model, product.details_id)
+
+    @classmethod
+    def _drop(cls, model: type[models.Model], pks: Iterable[int]) -> None:
+        cache.delete_many([cls.key(model, pk) for pk in pks])
+        cls.version(model).bump()
+
+    @classmethod
+    def invalidate(cls, model: type[models.Model], *pks: int, using: str = None) -> None:
+        """ Drops entries, once more on commit, so rows committed before the write and loaded
+            by concurrent readers after the first drop are dropped too
+        """
+        if cls.is_enabled() and pks:
+            cls._drop(model, pks)
+            transaction.on_commit(lambda: cls._drop(model, pks), using=using)
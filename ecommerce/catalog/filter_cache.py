@@ -0,0 +1,71 @@
+from typing import Callable, List
+
+from django.conf import settings
+from django.db.models import QuerySet, Min
+from django.utils.timezone import now
+
+from .filters import FilterBase, FilterSpec, FilterFactory
+from .models import Product
+from .pagination import KeysetPaginator
+from .tiered_cache import TieredCache
+
+
+def get_category_timeout(category_id: int, timeout: float) -> float:
+    """ Timeout cut to the moment next product of the category gets published """
+    next_published_at = Product.objects.filter(category_id=category_id, published_at__gt=now())\
+        .aggregate(next=Min('published_at'))['next']
+    if next_published_at is not None:
+        timeout = min(timeout, (next_published_at - now()).total_seconds())
+    return timeout
+
+
+class FiltersCache:
+    """ Stores filters produced for a category, so facets are not gathered from DB on every request.
+        Filters are stored unparsed, every get returns new copies of them to be parsed per request.
+        Entries are invalidated by signals (see catalog.signals) and expire when next product gets published.
+    """
+    timeout = 10 * 60
+    tiers = TieredCache('catalog:filters')
+
+    @staticmethod
+    def key(category_id: int) -> str:
+        return str(category_id)
+
+    @classmethod
+    def get_or_produce(cls, category_id: int, specs: List[FilterSpec], queryset: QuerySet) -> List[FilterBase]:
+        """ :param queryset: published products of the category, used to produce filters if they are not cached """
+        return cls.tiers.get_or_compute(cls.key(category_id),
+                                        lambda: FilterFactory.produce_from_specs(specs, queryset),
+                                        lambda: get_category_timeout(category_id, cls.timeout))
+
+    @classmethod
+    def invalidate(cls, *category_ids: int) -> None:
+        cls.tiers.delete(*[cls.key(category_id) for category_id in category_ids if category_id is not None])
+
+
+class ListingCache:
+    """ Stores the first page of a category listing in default order, the page most of visitors land on.
+        Invalidated along with FiltersCache. Disabled if settings.CATALOG_LISTING_CACHE_TIMEOUT is 0.
+    """
+    tiers = TieredCache('catalog:listings')
+
+    @staticmethod
+    def is_enabled() -> bool:
+        return bool(settings.CATALOG_LISTING_CACHE_TIMEOUT)
+
+    @staticmethod
+    def key(category_id: int) -> str:
+        return str(category_id)
+
+    @classmethod
+    def get_or_paginate(cls, category_id: int, paginate: Callable[[], KeysetPaginator.Page]) -> KeysetPaginator.Page:
+        if not cls.is_enabled():
+            return paginate()
+        timeout = settings.CATALOG_LISTING_CACHE_TIMEOUT
+        return cls.tiers.get_or_compute(cls.key(category_id), paginate,
+                                        lambda: get_category_timeout(category_id, timeout))
+
+    @classmethod
+    def invalidate(cls, *category_ids: int) -> None:
+        if cls.is_enabled():
+            cls.tiers.delete(*[cls.key(category_id) for category_id in category_ids if category_id is not None])
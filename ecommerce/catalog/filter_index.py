@@ -0,0 +1,253 @@
+import bisect
+import threading
+from typing import Optional, List, Dict, Tuple, Mapping, Iterable
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.signals import request_finished
+from django.utils.timezone import now
+
+from .filters import FilterBase, FilterSpec, Filters
+from .models import Product, BaseDetails
+from .pagination import KeysetPaginator
+from .versions import catalog_version
+
+
+class CategoryIndex:
+    """ In-memory index of products of a category, answers filters without DB requests.
+        Every product takes a position, sets of products are bitsets over positions (python int),
+        values of choices fields (as strings) are mapped to bitsets, values of bound fields are kept in sorted columns.
+        Products published in future are indexed too, they are excluded at query time.
+        Values of ordering fields are kept too, so results are cut to a page before they are sent to DB.
+    """
+    class NotIndexed(Exception):
+        pass
+
+    PUBLISHED_AT = 'published_at'
+
+    def __init__(self, category_id: int, specs: List[FilterSpec], ordering_fields: Iterable[str] = ()):
+        """ :param ordering_fields: fields listings are sorted by, see KeysetPaginator """
+        self.category_id = category_id
+        self.version = None  # catalog_version the index was loaded at
+
+        self.choices_names = [spec.query_name for spec in specs if spec.filter_type != Filters.BOUND]
+        self.bound_names = [spec.query_name for spec in specs if spec.filter_type == Filters.BOUND]
+        self.bound_names.append(self.PUBLISHED_AT)
+        indexed = {'pk', *self.choices_names, *self.bound_names}
+        self.ordering_names = [name for name in dict.fromkeys(ordering_fields) if name not in indexed]
+
+        self.lock = threading.RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.ids: List[Optional[int]] = []  # position -> pk, None for removed products
+        self.positions: Dict[int, int] = dict()  # pk -> position
+        self.rows: Dict[int, Mapping] = dict()  # pk -> indexed values
+        self.alive = 0
+        self.value_masks: Dict[str, Dict[object, int]] = {name: dict() for name in self.choices_names}
+        self.columns: Dict[str, List[Tuple]] = {name: [] for name in self.bound_names}
+
+    @property
+    def fields(self) -> List[str]:
+        """ Values required by the index for every product """
+        return ['pk'] + self.choices_names + self.bound_names + self.ordering_names
+
+    def __len__(self):
+        return len(self.positions)
+
+    def load(self, rows: Iterable[Mapping]) -> None:
+        with self.lock:
+            self._reset()
+            for row in rows:
+                self._add(row)
+
+    def upsert(self, row: Mapping) -> None:
+        with self.lock:
+            self._remove(row['pk'])
+            self._add(row)
+            if len(self.ids) > 2 * len(self.positions) + 64:
+                self.load(list(self.rows.values()))  # compacts positions of removed products
+
+    def remove(self, pk: int) -> None:
+        with self.lock:
+            self._remove(pk)
+
+    def _add(self, row: Mapping) -> None:
+        pk = row['pk']
+        position = len(self.ids)
+        bit = 1 << position
+
+        self.ids.append(pk)
+        self.positions[pk] = position
+        self.rows[pk] = row
+        self.alive |= bit
+
+        for name in self.choices_names:
+            masks = self.value_masks[name]
+            masks[str(row[name])] = masks.get(str(row[name]), 0) | bit
+        for name in self.bound_names:
+            if row[name] is not None:
+                bisect.insort(self.columns[name], (row[name], position))
+
+    def _remove(self, pk: int) -> None:
+        position = self.positions.pop(pk, None)
+        if position is None:
+            return
+        row = self.rows.pop(pk)
+        bit = 1 << position
+
+        self.ids[position] = None
+        self.alive &= ~bit
+
+        for name in self.choices_names:
+            self.value_masks[name][str(row[name])] &= ~bit
+        for name in self.bound_names:
+            if row[name] is not None:
+                column = self.columns[name]
+                del column[bisect.bisect_left(column, (row[name], position))]
+
+    def _mask_of(self, positions: Iterable[int]) -> int:
+        bits = bytearray(len(self.ids) // 8 + 1)
+        for position in positions:
+            bits[position >> 3] |= 1 << (position & 7)
+        return int.from_bytes(bits, 'little')
+
+    def value_mask(self, query_name: str, value) -> int:
+        """ Products having provided value of choices field """
+        try:
+            masks = self.value_masks[query_name]
+        except KeyError:
+            raise self.NotIndexed(query_name)
+        return masks.get(str(value), 0)
+
+    def range_mask(self, query_name: str, lower=None, upper=None) -> int:
+        """ Products with value of bound field in [lower, upper], None means no restriction """
+        try:
+            column = self.columns[query_name]
+        except KeyError:
+            raise self.NotIndexed(query_name)
+
+        start = 0 if lower is None else bisect.bisect_left(column, (lower,))
+        # every (upper, position) tuple is less than (upper, len(ids))
+        stop = len(column) if upper is None else bisect.bisect_right(column, (upper, len(self.ids)))
+        return self._mask_of(position for _, position in column[start:stop])
+
+    def published_mask(self) -> int:
+        return self.range_mask(self.PUBLISHED_AT, upper=now())
+
+    def ids_of(self, mask: int) -> List[int]:
+        bits = bin(mask)[:1:-1]  # lowest bit goes first
+        result = []
+        position = bits.find('1')
+        while position != -1:
+            result.append(self.ids[position])
+            position = bits.find('1', position + 1)
+        return result
+
+    def filter(self, filters: List[FilterBase], paginator: Optional[KeysetPaginator] = None,
+               cursor: Optional[str] = None) -> Optional[List[int]]:
+        """ Returns pks of published products passing all filters,
+            None if no filter is applied (plain queryset does the job) or some filter can not be answered.
+            If paginator is provided, pks are cut to the page after cursor, see KeysetPaginator.paginate_rows
+        """
+        with self.lock:
+            mask = self.alive & self.published_mask()
+            is_filtered = False
+            for f in filters:
+                try:
+                    filter_mask = f.get_index_mask(self)
+                except self.NotIndexed:
+                    return None
+                if filter_mask is not None:
+                    mask &= filter_mask
+                    is_filtered = True
+            if not is_filtered:
+                return None
+
+            ids = self.ids_of(mask)
+            if paginator is None or any(name not in self.fields for name, _ in paginator.keys):
+                return ids
+            return [row['pk'] for row in paginator.paginate_rows([self.rows[pk] for pk in ids], cursor)]
+
+
+class FilterIndexRegistry:
+    """ Process-local storage of CategoryIndex for each indexed category.
+        Signals update indexes of the process that saved a product, other processes drop their indexes
+        once catalog_version is bumped and build them again.
+    """
+    def __init__(self):
+        self._indexes: Dict[int, CategoryIndex] = dict()
+        self._lock = threading.Lock()
+
+    def get(self, category_id: int) -> Optional[CategoryIndex]:
+        """ Returns index of the category or None if index is cold or stale """
+        index = self._indexes.get(category_id)
+        if index is not None and index.version != catalog_version.get():
+            with self._lock:
+                if self._indexes.get(category_id) is index:
+                    del self._indexes[category_id]
+            return None
+        return index
+
+    def build(self, category_id: int, specs: List[FilterSpec], ordering_fields: Iterable[str] = ()) -> CategoryIndex:
+        index = CategoryIndex(category_id, specs, ordering_fields)
+        version = catalog_version.get()  # read before rows, so writes made meanwhile make the index stale
+        index.load(Product.objects.filter(category_id=category_id).values(*index.fields))
+        index.version = version
+        with self._lock:
+            self._indexes[category_id] = index
+        return index
+
+    def build_later(self, category_id: int, specs: List[FilterSpec], ordering_fields: Iterable[str] = ()) -> None:
+        """ Builds index once current request is finished, so the request itself is served without waiting """
+        dispatch_uid = f'build_filter_index_{category_id}'
+
+        def build(**kwargs):
+            request_finished.disconnect(dispatch_uid=dispatch_uid)
+            self.build(category_id, specs, ordering_fields)
+
+        request_finished.connect(build, weak=False, dispatch_uid=dispatch_uid)
+
+    def drop(self, category_id: Optional[int] = None) -> None:
+        """ Drops index of the category or every index if category is not provided """
+        with self._lock:
+            if category_id is None:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(category_id, None)
+
+    def refresh_products(self, pks: List[int]) -> None:
+        """ Rereads products from DB and moves them to indexes of their current categories """
+        if not self._indexes or not pks:
+            return
+
+        with self._lock:
+            indexes = list(self._indexes.values())
+
+        for index in indexes:
+            for pk in pks:
+                index.remove(pk)
+
+        categories = set(Product.objects.filter(pk__in=pks).values_list('category_id', flat=True))
+        for index in indexes:
+            if index.category_id in categories:
+                rows = Product.objects.filter(pk__in=pks, category_id=index.category_id).values(*index.fields)
+                for row in rows:
+                    index.upsert(row)
+
+    def refresh_details(self, details: BaseDetails) -> None:
+        """ Rereads products described by provided details """
+        if not self._indexes:
+            return
+
+        products = Product.objects.filter(details_content_type=ContentType.objects.get_for_model(details),
+                                          details_id=details.pk)
+        self.refresh_products(list(products.values_list('pk', flat=True)))
+
+    def remove_product(self, pk: int) -> None:
+        with self._lock:
+            indexes = list(self._indexes.values())
+        for index in indexes:
+            index.remove(pk)
+
+
+filter_indexes = FilterIndexRegistry()
@@ -0,0 +1,92 @@
+import dataclasses
+from typing import Dict, List
+
+from django.apps import apps
+from django.contrib.contenttypes.fields import GenericRelation
+from django.core import checks
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+
+from .filters import FilterSpec, Filters
+from .models import BaseDetails
+
+
+class FilterRegistry:
+    """ FILTERS of every BaseDetails subclass validated and compiled into FilterSpec once, at startup.
+        Problems found are reported by Django system check framework, see catalog.checks
+    """
+    bound_fields = (models.IntegerField, models.DecimalField, models.FloatField)
+
+    def __init__(self):
+        self._specs: Dict[type[BaseDetails], List[FilterSpec]] = dict()
+        self._errors: Dict[type[BaseDetails], List[checks.CheckMessage]] = dict()
+
+    def compile_all(self) -> None:
+        for model in apps.get_models():
+            if issubclass(model, BaseDetails):
+                self.compile(model)
+
+    def compile(self, model: type[BaseDetails]) -> List[FilterSpec]:
+        specs = []
+        errors = []
+
+        relation_name = model.generic_relation_name
+        relations = [f for f in model._meta.private_fields if isinstance(f, GenericRelation)
+                     and f.remote_field.related_query_name == relation_name]
+        if not relation_name or not relations:
+            errors.append(checks.Error(
+                f"{model.__name__}.generic_relation_name is '{relation_name}', "
+                f"but there is no GenericRelation with such related_query_name",
+                obj=model, id='catalog.E001'))
+
+        for entry in model.FILTERS:
+            try:
+                field_name, filter_type = entry
+            except (TypeError, ValueError):
+                errors.append(checks.Error(f"FILTERS entry {entry!r} is not a (field, filter type) pair",
+                                           obj=model, id='catalog.E002'))
+                continue
+
+            try:
+                field = model._meta.get_field(field_name)
+            except FieldDoesNotExist:
+                errors.append(checks.Error(f"FILTERS entry refers to '{field_name}', "
+                                           f"which is not a field of {model.__name__}",
+                                           obj=model, id='catalog.E003'))
+                continue
+
+            error = self.check_field(field, filter_type)
+            if error:
+                errors.append(checks.Error(f"FILTERS entry for '{field_name}': {error}", obj=model, id='catalog.E004'))
+                continue
+
+            choices = list(field.choices) if filter_type == Filters.STATIC_CHOICES else None
+            specs.append(FilterSpec(field_name, filter_type, query_to=relation_name, choices=choices))
+
+        self._specs[model] = specs
+        self._errors[model] = errors
+        return specs
+
+    def check_field(self, field: models.Field, filter_type) -> str:
+        """ Returns description of the problem or empty string if field can be filtered with filter_type """
+        if not isinstance(filter_type, Filters):
+            return f'{filter_type!r} is not a filter type'
+        if filter_type == Filters.BOUND and not isinstance(field, self.bound_fields):
+            return 'BOUND filter requires numeric field'
+        if filter_type == Filters.BOOL_CHOICES and not isinstance(field, models.BooleanField):
+            return 'BOOL_CHOICES filter requires BooleanField'
+        if filter_type == Filters.STATIC_CHOICES and not field.choices:
+            return 'STATIC_CHOICES filter requires field with choices'
+        return ''
+
+    def get_specs(self, model: type[BaseDetails]) -> List[FilterSpec]:
+        """ Returns copies of compiled specs """
+        if model not in self._specs:
+            self.compile(model)
+        return [dataclasses.replace(spec) for spec in self._specs[model]]
+
+    def get_errors(self) -> List[checks.CheckMessage]:
+        return [error for errors in self._errors.values() for error in errors]
+
+
+filter_registry = FilterRegistry()
@@ -1,11 +1,16 @@
 from abc import ABC, abstractmethod
+import dataclasses
 import decimal
+from dataclasses import dataclass
 from decimal import Decimal
-from typing import Optional, List, Mapping, Tuple, Dict
+from typing import Optional, List, Mapping, Tuple, Dict, Callable
 from enum import Enum, auto
 
-from django.db.models import QuerySet
-from django.db.models import Max, Min
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections, models
+from django.db.models import QuerySet, Q, F, Value, IntegerField
+from django.db.models import Max, Min, Count
+from django.db.models.functions import Cast, Round
 
 
 # TODO: use forms with GET method for filters?
@@ -23,6 +28,43 @@ class Filters(Enum):
     STATIC_CHOICES = auto()
 
 
+class Buckets(Enum):
+    """ Ways to split range of a BOUND filter into histogram buckets """
+    EQUAL_WIDTH = auto()
+    QUANTILE = auto()
+
+
+@dataclass
+class Bucket:
+    lower: Decimal
+    upper: Decimal
+    count: int
+
+
+@dataclass
+class FilterSpec:
+    """ Description of a filter to be produced by FilterFactory """
+    field: str
+    filter_type: Filters
+    query_to: Optional[str] = None
+    choices: Optional[List[Tuple]] = None
+    buckets: int = 0  # number of histogram buckets for BOUND filters, 0 for no histogram
+    bucket_mode: Buckets = Buckets.EQUAL_WIDTH
+
+    @property
+    def query_name(self) -> str:
+        return (self.query_to + '__' + self.field) if self.query_to else self.field
+
+
+@dataclass
+class Facets:
+    """ Data gathered from DB for a set of filters, see FilterFactory.plan_facets
+        Both dicts are keyed by query name of a filter, choices map stored value to number of objects having it
+    """
+    bounds: Dict[str, Tuple] = dataclasses.field(default_factory=dict)
+    choices: Dict[str, Dict[object, int]] = dataclasses.field(default_factory=dict)
+
+
 class FilterBase(ABC):
     """ Base class for filters.
     Filters parse GET-queries and filter QuerySets accordingly. Also can present itself using get_html method """
@@ -34,6 +76,7 @@ class FilterBase(ABC):
         :param query_to: name of the related model with provided field
         """
         self.field = field
+        self.query_to = query_to
         self.query_name = (query_to + '__' + self.field) if query_to else self.field
         self.name = name if name else field
 
@@ -43,9 +86,25 @@ class FilterBase(ABC):
         pass
 
     @abstractmethod
+    def get_Q(self, relative: bool = False) -> Q:
+        """ Returns condition which narrows QuerySet according to parsed input, empty Q if there is nothing to filter
+        :param relative: if set, lookups are relative to the related model (query_to), e.g. for its own QuerySet
+        """
+        pass
+
+    def get_lookup_name(self, relative: bool = False) -> str:
+        return self.field if relative else self.query_name
+
+    @abstractmethod
+    def get_index_mask(self, index) -> Optional[int]:
+        """ Returns bitset of products passing the filter from catalog.filter_index.CategoryIndex,
+            None if there is nothing to filter
+        """
+        pass
+
     def filter(self, queryset: QuerySet) -> QuerySet:
         """ Narrows provided QuerySet """
-        pass
+        return queryset.filter(self.get_Q())
 
     @abstractmethod
     def get_html(self) -> str:
@@ -65,20 +124,84 @@ def get_decimal(from_mapping: Mapping[str, str], key: str, default: Decimal) ->
 
 class FilterBound(FilterBase):
     """ Filters by numeric field, checking whether it is in provided range.
-    Available range is determined dynamically by a request to DB """
-    def __init__(self, field: str, queryset: QuerySet, **kwargs):
+    Available range is determined dynamically by a request to DB or taken from provided facets.
+    Optionally splits the range into histogram buckets counting objects in each of them """
+    def __init__(self, field: str, queryset: Optional[QuerySet] = None, *, facets: Optional[Facets] = None,
+                 buckets: int = 0, bucket_mode: Buckets = Buckets.EQUAL_WIDTH, **kwargs):
+        """
+        :param buckets: number of histogram buckets, 0 for no histogram, requires queryset
+        :param bucket_mode: how to split the range, see Buckets
+        """
         super().__init__(field, queryset=queryset, **kwargs)
 
-        bounds_dict = queryset.aggregate(min=Min(self.query_name), max=Max(self.query_name))
-        self.lower_bound = bounds_dict['min']
-        self.upper_bound = bounds_dict['max']
+        if facets is not None:
+            self.lower_bound, self.upper_bound = facets.bounds[self.query_name]
+        else:
+            bounds_dict = queryset.aggregate(min=Min(self.query_name), max=Max(self.query_name))
+            self.lower_bound = bounds_dict['min']
+            self.upper_bound = bounds_dict['max']
 
         self.min = self.lower_bound
         self.max = self.upper_bound
 
+        # range available with other filters applied, see FilterFactory.narrow_facets
+        self.available_bounds = (self.lower_bound, self.upper_bound)
+
         self.GET_key_min = self.name + '_min'
         self.GET_key_max = self.name + '_max'
 
+        self.histogram: Optional[List[Bucket]] = None
+        if buckets:
+            if bucket_mode == Buckets.QUANTILE:
+                self.histogram = self.get_quantile_histogram(queryset, buckets)
+            else:
+                self.histogram = self.get_equal_width_histogram(queryset, buckets)
+
+    def get_equal_width_histogram(self, queryset: QuerySet, buckets: int) -> List[Bucket]:
+        """ Counts objects in buckets of equal width with one grouped query, bucket number is calculated by DB.
+            Values are scaled to integer units of the field (e.g. cents for 2 decimal places),
+            so bucket number is found with integer division and values on bucket edges are not lost to rounding
+        """
+        if self.lower_bound is None:
+            return []
+
+        lower, upper = Decimal(self.lower_bound), Decimal(self.upper_bound)
+        if lower == upper:
+            return [Bucket(lower, upper, queryset.filter(**{self.query_name: lower}).count())]
+
+        width = (upper - lower) / buckets
+        scale = 10 ** (getattr(FilterFactory.get_field(queryset.model, self.query_name), 'decimal_places', None) or 0)
+        lower_units = int((lower * scale).to_integral_value())
+        upper_units = int((upper * scale).to_integral_value())
+        units = Cast(Round(F(self.query_name) * Value(scale)), IntegerField())
+        bucket_number = (units - Value(lower_units)) * Value(buckets) / Value(upper_units - lower_units)
+        rows = queryset.order_by().annotate(facet_bucket=bucket_number)\
+            .filter(facet_bucket__isnull=False).values('facet_bucket').annotate(facet_count=Count('pk'))
+
+        counts = [0] * buckets
+        for row in rows:
+            counts[min(int(row['facet_bucket']), buckets - 1)] += row['facet_count']  # upper bound is included
+
+        return [Bucket(lower + width * i, upper if i == buckets - 1 else lower + width * (i + 1), count)
+                for i, count in enumerate(counts)]
+
+    def get_quantile_histogram(self, queryset: QuerySet, buckets: int) -> List[Bucket]:
+        """ Splits objects into buckets of (almost) equal size using NTILE window function in one grouped query """
+        values = queryset.order_by().annotate(facet_value=F(self.query_name))\
+            .filter(facet_value__isnull=False).values('facet_value')
+        field = values.query.annotations['facet_value'].output_field
+
+        inner_sql, params = values.query.get_compiler(queryset.db).as_sql()
+        sql = f'SELECT MIN(facet_value), MAX(facet_value), COUNT(*) FROM (' \
+              f'SELECT facet_value, NTILE({int(buckets)}) OVER (ORDER BY facet_value) AS facet_tile ' \
+              f'FROM ({inner_sql}) facet_values) facet_tiles GROUP BY facet_tile ORDER BY facet_tile'
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+
+        return [Bucket(Decimal(str(field.to_python(lower))), Decimal(str(field.to_python(upper))), count)
+                for lower, upper, count in rows]
+
     def parse(self, query_dict: Mapping[str, str]) -> None:
         self.max = min(get_decimal(query_dict, self.GET_key_max, self.max), self.upper_bound)
         self.min = max(get_decimal(query_dict, self.GET_key_min, self.min), self.lower_bound)
@@ -87,17 +210,25 @@ class FilterBound(FilterBase):
             self.max = self.upper_bound
             self.min = self.lower_bound
 
-    def filter(self, queryset: QuerySet) -> QuerySet:
+    def get_Q(self, relative: bool = False) -> Q:
         lookups = dict()
         if self.min != self.lower_bound:
-            lookups[self.query_name + '__gte'] = self.min
+            lookups[self.get_lookup_name(relative) + '__gte'] = self.min
         if self.max != self.upper_bound:
-            lookups[self.query_name + '__lte'] = self.max
-        return queryset.filter(**lookups)
+            lookups[self.get_lookup_name(relative) + '__lte'] = self.max
+        return Q(**lookups)
+
+    def get_index_mask(self, index) -> Optional[int]:
+        lower = self.min if self.min != self.lower_bound else None
+        upper = self.max if self.max != self.upper_bound else None
+        if lower is None and upper is None:
+            return None
+        return index.range_mask(self.query_name, lower, upper)
 
     def get_html(self):
         # TODO: get context from DecimalField somehow
-        return f'{self.name}: {self.lower_bound:.2f}-{self.upper_bound:.2f} | min {self.min:.2f}, max {self.max:.2f}'
+        available_min, available_max = self.available_bounds
+        return f'{self.name}: {available_min:.2f}-{available_max:.2f} | min {self.min:.2f}, max {self.max:.2f}'
 
 
 class FilterChoicesBase(FilterBase):
@@ -112,6 +243,7 @@ class FilterChoicesBase(FilterBase):
         self.GET_key = self.name
 
         self.choices: Dict[str, bool] = None  # Note: set self.choices in concrete's class __init__
+        self.counts: Optional[Dict[str, int]] = None  # number of objects for each choice, if known
 
     def parse(self, query_dict: Mapping[str, str]) -> None:
         user_input = query_dict.get(self.GET_key)
@@ -127,17 +259,42 @@ class FilterChoicesBase(FilterBase):
     def get_stored(self, choice: str) -> str:
         return choice
 
-    def filter(self, queryset: QuerySet) -> QuerySet:
+    def get_choice(self, stored) -> str:
+        """ Inverse of get_stored """
+        return str(stored)
+
+    def set_counts(self, stored_counts: Mapping[object, int]) -> None:
+        """ Sets counts of choices from mapping of stored values to number of objects having them """
+        self.counts = {choice: 0 for choice in self.choices}
+        for stored, count in stored_counts.items():
+            choice = self.get_choice(stored)
+            if choice in self.counts:
+                self.counts[choice] += count
+
+    def get_Q(self, relative: bool = False) -> Q:
         if self.show_all_choices:
-            return queryset
+            return Q()
 
         user_choices = [self.get_stored(choice) for choice, show in self.choices.items() if show]
         lookup = dict()
-        lookup[self.query_name + '__in'] = user_choices
-        return queryset.filter(**lookup)
+        lookup[self.get_lookup_name(relative) + '__in'] = user_choices
+        return Q(**lookup)
+
+    def get_index_mask(self, index) -> Optional[int]:
+        if self.show_all_choices:
+            return None
+
+        result = 0
+        for choice, show in self.choices.items():
+            if show:
+                result |= index.value_mask(self.query_name, self.get_stored(choice))
+        return result
 
     def get_html(self):
-        result = self.name + ': ' + ', '.join(self.choices.keys()) + ' | '
+        if self.counts is not None:
+            result = self.name + ': ' + ', '.join(f'{key} ({self.counts[key]})' for key in self.choices) + ' | '
+        else:
+            result = self.name + ': ' + ', '.join(self.choices.keys()) + ' | '
         if not self.show_all_choices:
             user_choices = []
             for key, show in self.choices.items():
@@ -150,10 +307,20 @@ class FilterChoicesBase(FilterBase):
 
 
 class FilterDynamicChoices(FilterChoicesBase):
-    """ Filters by field with arbitrary variants (e.g. manufacturer), available variants determined by DB request """
-    def __init__(self, field: str, queryset: QuerySet, **kwargs):
+    """ Filters by field with arbitrary variants (e.g. manufacturer),
+        available variants determined by DB request or taken from provided facets
+    """
+    def __init__(self, field: str, queryset: Optional[QuerySet] = None, *, facets: Optional[Facets] = None,
+                 **kwargs):
         super().__init__(field, **kwargs)
-        self.choices = {str(choice): False for choice in queryset.values_list(self.query_name, flat=True).distinct()}
+        if facets is not None:
+            available = facets.choices[self.query_name]
+        else:
+            rows = queryset.order_by().values(self.query_name).annotate(facet_count=Count('pk'))
+            available = {row[self.query_name]: row['facet_count'] for row in rows}
+
+        self.choices = {self.get_choice(choice): False for choice in available}
+        self.set_counts(available)
 
 
 class FilterBool(FilterBase):
@@ -174,12 +341,17 @@ class FilterBool(FilterBase):
             self.choice = False
         # else use default
 
-    def filter(self, queryset: QuerySet) -> QuerySet:
+    def get_Q(self, relative: bool = False) -> Q:
         if self.choice is None:
-            return queryset
+            return Q()
         lookup = dict()
-        lookup[self.query_name] = self.choice
-        return queryset.filter(**lookup)
+        lookup[self.get_lookup_name(relative)] = self.choice
+        return Q(**lookup)
+
+    def get_index_mask(self, index) -> Optional[int]:
+        if self.choice is None:
+            return None
+        return index.value_mask(self.query_name, self.choice)
 
     def get_html(self):
         return f"{self.name}: True or False: { 'Any' if self.choice is None else self.choice }"
@@ -187,17 +359,25 @@ class FilterBool(FilterBase):
 
 class FilterStaticChoices(FilterChoicesBase):
     """ Filters by static set of variants (e.g. django Field with choices attribute set)"""
-    def __init__(self, field: str, choices: List[Tuple], **kwargs):
+    def __init__(self, field: str, choices: List[Tuple], *, facets: Optional[Facets] = None, **kwargs):
         """
         :param: choices - django-style choices of the field
+        :param: facets - if provided, counts of objects for each choice are taken from it
         """
         super().__init__(field, **kwargs)
         self.choices = {key: False for _, key in choices}
         self.model_choices = {human_readable: stored for stored, human_readable in choices}
+        self.human_readable_choices = {stored: human_readable for stored, human_readable in choices}
+
+        if facets is not None:
+            self.set_counts(facets.choices[self.query_name])
 
     def get_stored(self, choice: str) -> str:
         return self.model_choices[choice]
 
+    def get_choice(self, stored) -> str:
+        return self.human_readable_choices.get(stored, str(stored))
+
 
 class FilterFactory:
     _constructors = {
@@ -217,14 +397,164 @@ class FilterFactory:
         return filter_constructor(field, queryset=queryset, **kwargs)
 
     @classmethod
-    def add_filters_for_related_model(cls, filters_list: List[FilterBase], related_name: str,
-                                      related_model: type[FilterableMixin], queryset: QuerySet):
-        """ Parses Django model with FilterableMixin, produces filters and adds them to filter_list """
+    def get_specs_for_related_model(cls, related_name: str,
+                                    related_model: type[FilterableMixin]) -> List[FilterSpec]:
+        """ Parses Django model with FilterableMixin and returns specs of its filters """
+        specs = []
         for field, filter_type in related_model.FILTERS:
             choices = None
             if filter_type == Filters.STATIC_CHOICES:
-                choices = related_model.__getattribute__(related_model, field).field.choices
+                choices = related_model._meta.get_field(field).choices
+
+            specs.append(FilterSpec(field, filter_type, query_to=related_name, choices=choices))
+        return specs
+
+    @staticmethod
+    def get_field(model: type[models.Model], query_name: str) -> models.Field:
+        """ Field found by lookup path, e.g. details__color """
+        *relations, name = query_name.split('__')
+        for relation in relations:
+            model = model._meta.get_field(relation).related_model
+        return model._meta.get_field(name)
+
+    @classmethod
+    def group_by_each(cls, queryset: QuerySet, query_names: List[str],
+                      get_aggregates: Callable[[int], dict]) -> List[dict]:
+        """ Groups objects by each of query_names separately, all groupings are sent as one UNION ALL query.
+            Row of i-th grouping has 'facet' set to i, grouped value in 'value_i' (other values are None)
+            and aggregates returned by get_aggregates(i), which must have same keys for every i
+        """
+        fields = [cls.get_field(queryset.model, query_name) for query_name in query_names]
+        groupings = []
+        for i in range(len(query_names)):
+            # every grouping has all value columns, typed by their fields, so columns of the union match
+            values = {f'value_{j}': F(query_name) if i == j else Value(None, output_field=field)
+                      for j, (query_name, field) in enumerate(zip(query_names, fields))}
+            groupings.append(queryset.order_by().values(facet=Value(i), **values).annotate(**get_aggregates(i)))
+        return list(groupings[0].union(*groupings[1:], all=True))
+
+    @classmethod
+    def plan_facets(cls, specs: List[FilterSpec], queryset: QuerySet) -> Facets:
+        """ Gathers data for all the specs at once: one aggregate query for every BOUND filter
+            and one query counting objects by each of DYNAMIC_CHOICES and STATIC_CHOICES filters, see group_by_each
+        """
+        facets = Facets()
+
+        bound_names = [spec.query_name for spec in specs if spec.filter_type == Filters.BOUND]
+        if bound_names:
+            aggregates = dict()
+            for i, query_name in enumerate(bound_names):
+                aggregates[f'min_{i}'] = Min(query_name)
+                aggregates[f'max_{i}'] = Max(query_name)
+            bounds_dict = queryset.aggregate(**aggregates)
+            for i, query_name in enumerate(bound_names):
+                facets.bounds[query_name] = (bounds_dict[f'min_{i}'], bounds_dict[f'max_{i}'])
+
+        choices_types = (Filters.DYNAMIC_CHOICES, Filters.STATIC_CHOICES)
+        choices_names = [spec.query_name for spec in specs if spec.filter_type in choices_types]
+        if choices_names:
+            facets.choices = {query_name: dict() for query_name in choices_names}
+            for row in cls.group_by_each(queryset, choices_names, lambda i: dict(facet_count=Count('pk'))):
+                facets.choices[choices_names[row['facet']]][row[f'value_{row["facet"]}']] = row['facet_count']
+
+        return facets
+
+    @classmethod
+    def narrow_facets(cls, filters: List[FilterBase], queryset: QuerySet) -> None:
+        """ Recalculates counts of choices filters and available bounds of bound filters so that each of them
+            reflects every other filter except itself (disjunctive faceting). Filters should be parsed already.
+            Uses one query with conditional aggregation regardless of number of filters, see group_by_each.
+        """
+        conditions = [f.get_Q() for f in filters]
+
+        def others_condition(index: int) -> Optional[Q]:
+            result = Q()
+            for i, condition in enumerate(conditions):
+                if i != index:
+                    result &= condition
+            return result if result else None
+
+        choices_filters = [(i, f) for i, f in enumerate(filters) if isinstance(f, FilterChoicesBase)]
+        bound_filters = [(i, f) for i, f in enumerate(filters) if isinstance(f, FilterBound)]
+
+        if not choices_filters and not bound_filters:
+            return
 
-            filters_list.append(
-                cls.produce(field, filter_type, queryset, query_to=related_name, choices=choices)
-            )
+        bound_aggregates = dict()
+        for i, f in bound_filters:
+            bound_aggregates[f'min_{i}'] = Min(f.query_name, filter=others_condition(i))
+            bound_aggregates[f'max_{i}'] = Max(f.query_name, filter=others_condition(i))
+
+        if choices_filters:
+            # each grouping partitions all objects, so bounds are aggregated over groups of any of them
+            def get_aggregates(facet: int) -> dict:
+                i, _ = choices_filters[facet]
+                return dict(facet_count=Count('pk', filter=others_condition(i)), **bound_aggregates)
+
+            rows = cls.group_by_each(queryset, [f.query_name for _, f in choices_filters], get_aggregates)
+        else:
+            rows = [queryset.aggregate(**bound_aggregates)]
+
+        for facet, (i, f) in enumerate(choices_filters):
+            f.set_counts({row[f'value_{facet}']: row['facet_count'] for row in rows if row['facet'] == facet})
+
+        for i, f in bound_filters:
+            minimums = [row[f'min_{i}'] for row in rows if row[f'min_{i}'] is not None]
+            maximums = [row[f'max_{i}'] for row in rows if row[f'max_{i}'] is not None]
+            if minimums and maximums:
+                f.available_bounds = (min(minimums), max(maximums))
+
+    @classmethod
+    def produce_from_specs(cls, specs: List[FilterSpec], queryset: QuerySet) -> List[FilterBase]:
+        """ Produces filters for all the specs, gathering their facets with minimal number of DB requests """
+        facets = cls.plan_facets(specs, queryset)
+        return [
+            cls.produce(spec.field, spec.filter_type, queryset, query_to=spec.query_to, choices=spec.choices,
+                        buckets=spec.buckets, bucket_mode=spec.bucket_mode, facets=facets)
+            for spec in specs
+        ]
+
+    @classmethod
+    def add_filters_for_related_model(cls, filters_list: List[FilterBase], related_name: str,
+                                      related_model: type[FilterableMixin], queryset: QuerySet):
+        """ Parses Django model with FilterableMixin, produces filters and adds them to filter_list """
+        specs = cls.get_specs_for_related_model(related_name, related_model)
+        filters_list.extend(cls.produce_from_specs(specs, queryset))
+
+
+class FilterCompiler:
+    """ Merges filters into a single condition, so QuerySet is narrowed by one filter() call.
+        Each filter() call on a multi-valued relation (e.g. GenericRelation to details) may add another join,
+        merged condition joins related table only once.
+    """
+    @classmethod
+    def compile(cls, filters: List[FilterBase]) -> Q:
+        result = Q()
+        for f in filters:
+            result &= f.get_Q()
+        return result
+
+    @classmethod
+    def apply(cls, queryset: QuerySet, filters: List[FilterBase],
+              details_model: Optional[type[FilterableMixin]] = None) -> QuerySet:
+        """ Narrows provided QuerySet by all filters at once.
+            If details_model is provided, conditions on it are resolved without join, as semi-join:
+            details_id IN (SELECT id FROM details WHERE ...)
+        """
+        if details_model is None:
+            return queryset.filter(cls.compile(filters))
+
+        related_name = details_model.generic_relation_name
+        details_condition = Q()
+        result = Q()
+        for f in filters:
+            if f.query_to == related_name:
+                details_condition &= f.get_Q(relative=True)
+            else:
+                result &= f.get_Q()
+
+        if details_condition:
+            result &= Q(details_content_type=ContentType.objects.get_for_model(details_model),
+                        details_id__in=details_model.objects.filter(details_condition).values('pk'))
+
+        return queryset.filter(result)
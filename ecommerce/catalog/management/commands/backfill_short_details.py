@@ -0,0 +1,42 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+
+from catalog.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Fills Product.short_details from details of every product'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Products read and updated at once')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        updated = 0
+
+        content_type_ids = Product.objects.order_by().values_list('details_content_type', flat=True).distinct()
+        for content_type in ContentType.objects.filter(pk__in=list(content_type_ids)):
+            details_model = content_type.model_class()
+            if details_model is None:  # model was removed
+                continue
+            products = Product.objects.filter(details_content_type=content_type)\
+                .only('pk', 'details_id', 'short_details').order_by('pk')
+
+            last_pk = 0
+            while True:
+                batch = list(products.filter(pk__gt=last_pk)[:batch_size])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+
+                details = details_model.objects.in_bulk({p.details_id for p in batch})
+                changed = []
+                for p in batch:
+                    short_details = Product.make_short_details(details.get(p.details_id))
+                    if p.short_details != short_details:
+                        p.short_details = short_details
+                        changed.append(p)
+                Product.objects.bulk_update(changed, ['short_details'])
+                updated += len(changed)
+
+        self.stdout.write(self.style.SUCCESS(f'Short details of {updated} products updated'))
@@ -0,0 +1,116 @@
+import tracemalloc
+from typing import Callable, Dict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from catalog.category_registry import category_registry
+from catalog.entity_cache import EntityCache
+from catalog.models import Category, Product
+from catalog.search import SearchCatalog
+from integration_app.views import CategoryView, OrderView
+from orders.models import OrderProducts
+
+
+class Command(BaseCommand):
+    help = 'Compares whole rows and list projections of catalog listings: ' \
+           'bytes fetched from DB and objects allocated per page'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--category', help='slug of category to list, the largest one by default')
+        parser.add_argument('--query', default='a', help='query for catalog search')
+        parser.add_argument('--page-size', type=int, default=CategoryView.products_per_page)
+
+    @staticmethod
+    def value_size(value) -> int:
+        if value is None:
+            return 0
+        if isinstance(value, (bytes, memoryview)):
+            return len(value)
+        return len(str(value).encode())
+
+    def measure(self, listing: Callable[[], object]) -> Dict[str, int]:
+        """ Runs listing, then reruns its SQL to count bytes of fetched values """
+        tracemalloc.start()
+        with CaptureQueriesContext(connection) as context:
+            result = listing()
+        snapshot = tracemalloc.take_snapshot()  # taken while result of listing is alive
+        tracemalloc.stop()
+        del result
+
+        fetched = 0
+        with connection.cursor() as cursor:
+            for query in context.captured_queries:
+                cursor.execute(query['sql'])
+                fetched += sum(self.value_size(value) for row in cursor.fetchall() for value in row)
+
+        stats = snapshot.statistics('filename')
+        return {
+            'queries': len(context.captured_queries),
+            'bytes fetched': fetched,
+            'objects allocated': sum(stat.count for stat in stats),
+            'KiB allocated': sum(stat.size for stat in stats) // 1024,
+        }
+
+    def handle(self, *args, **options):
+        page_size = options['page_size']
+
+        if options['category']:
+            category = Category.objects.filter(slug=options['category']).first()
+        else:
+            category = max(Category.objects.all(), key=lambda c: c.product_set.count(), default=None)
+        if category is None:
+            raise CommandError('No category to list')
+
+        def category_page(fields):
+            """ Whole rows are listed with short details made of details objects, as before Product.short_details """
+            def listing():
+                queryset = Product.published.filter(category_id=category.pk).prefetch_related('category')
+                if fields:
+                    products = list(queryset.only(*fields).order_by('-published_at', '-pk')[:page_size])
+                    return [(p.name, p.category.slug, p.short_details) for p in products]
+
+                products = list(queryset.prefetch_related('details_object').order_by('-published_at', '-pk')[:page_size])
+                return [(p.name, p.category.slug, p.details_object.get_short_details()) for p in products]
+            return listing
+
+        def search_page(fields):
+            def listing():
+                search_engine = SearchCatalog(show_first=page_size, fuzzy=False)
+                search_engine.list_fields = fields
+                try:
+                    return search_engine.filter(options['query'])
+                except SearchCatalog.NoQuerySpecified:
+                    return []
+            return listing
+
+        order_id = OrderProducts.objects.values_list('order_id', flat=True).first()
+
+        def order_page(fields):
+            """ Projection of order lines is listed with products resolved through EntityCache, as OrderView does """
+            def listing():
+                queryset = OrderProducts.objects.filter(order_id=order_id)
+                if fields:
+                    details = list(queryset.only(*fields)[:page_size])
+                    products = EntityCache.get_many(Product, [d.product_id for d in details])
+                    lines = [(products[d.product_id], d.amount) for d in details]
+                    return [(p.name, category_registry.get(p.category_id).slug, p.price, amount) for p, amount in lines]
+
+                details = list(queryset.select_related('product').prefetch_related('product__category')[:page_size])
+                return [(d.product.name, d.product.category.slug, d.product.price, d.amount) for d in details]
+            return listing
+
+        listings = [
+            (f'category {category.slug}', category_page, CategoryView.list_fields),
+            (f'search "{options["query"]}"', search_page, SearchCatalog.list_fields),
+        ]
+        if order_id is not None:
+            listings.append((f'order {order_id}', order_page, OrderView.list_fields))
+
+        for name, page, fields in listings:
+            full = self.measure(page(None))
+            slim = self.measure(page(fields))
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for key in full:
+                self.stdout.write(f'    {key:>18}: {full[key]:>10} -> {slim[key]:>10}')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from catalog.search_index import ProductSearchIndex
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds full-text index of products from catalog_product table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to rebuild index in')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if not ProductSearchIndex.is_available(using):
+            raise CommandError(f"Full-text index is not available in '{using}' database, "
+                               f"it requires SQLite with FTS5")
+
+        ProductSearchIndex.rebuild(using)
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt'))
@@ -0,0 +1,74 @@
+from django.db import migrations
+
+
+CREATE_INDEX = [
+    """
+    CREATE VIRTUAL TABLE catalog_product_fts USING fts5(
+        name, manufacturer, description,
+        content='catalog_product', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER catalog_product_fts_insert AFTER INSERT ON catalog_product BEGIN
+        INSERT INTO catalog_product_fts(rowid, name, manufacturer, description)
+        VALUES (new.id, new.name, new.manufacturer, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER catalog_product_fts_delete AFTER DELETE ON catalog_product BEGIN
+        INSERT INTO catalog_product_fts(catalog_product_fts, rowid, name, manufacturer, description)
+        VALUES ('delete', old.id, old.name, old.manufacturer, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER catalog_product_fts_update AFTER UPDATE OF name, manufacturer, description ON catalog_product
+    BEGIN
+        INSERT INTO catalog_product_fts(catalog_product_fts, rowid, name, manufacturer, description)
+        VALUES ('delete', old.id, old.name, old.manufacturer, old.description);
+        INSERT INTO catalog_product_fts(rowid, name, manufacturer, description)
+        VALUES (new.id, new.name, new.manufacturer, new.description);
+    END
+    """,
+    "INSERT INTO catalog_product_fts(catalog_product_fts) VALUES ('rebuild')",
+]
+
+DROP_INDEX = [
+    "DROP TRIGGER IF EXISTS catalog_product_fts_insert",
+    "DROP TRIGGER IF EXISTS catalog_product_fts_delete",
+    "DROP TRIGGER IF EXISTS catalog_product_fts_update",
+    "DROP TABLE IF EXISTS catalog_product_fts",
+]
+
+
+def fts5_supported(schema_editor) -> bool:
+    if schema_editor.connection.vendor != 'sqlite':
+        return False
+    if schema_editor.connection.Database.sqlite_version_info < (3, 34):  # trigram tokenizer
+        return False
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def create_index(apps, schema_editor):
+    """ Search falls back to LIKE where FTS5 is not available, see catalog.search_index """
+    if fts5_supported(schema_editor):
+        for sql in CREATE_INDEX:
+            schema_editor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in DROP_INDEX:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0006_delete_fridgedetails_delete_phonedetails'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
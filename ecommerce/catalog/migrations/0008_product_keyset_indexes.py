@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'published_at', 'id'], name='catalog_pro_categor_1ea997_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'price', 'id'], name='catalog_pro_categor_36fdd5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'discount_percent', 'id'], name='catalog_pro_categor_e53504_idx'),
+        ),
+    ]
@@ -8,10 +8,11 @@ from django.utils import timezone
 from django.utils.timezone import now
 
 from .filters import FilterableMixin, Filters
+from .query_cache import CachingManager
 from .validators import validate_percent, validate_resolution
 
 
-class ProductManager(models.Manager):
+class ProductManager(CachingManager):
     """ Only published products """
     def get_queryset(self):
         return super().get_queryset().filter(published_at__lte=now())
@@ -24,6 +25,8 @@ class Category(models.Model):
 
     details_content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
 
+    objects = CachingManager()
+
     def get_absolute_url(self):
         return reverse_lazy('category', kwargs={'slug': self.slug})
 
@@ -54,18 +57,52 @@ class Product(models.Model):
     details_id = models.PositiveIntegerField()
     details_object = GenericForeignKey("details_content_type", "details_id")
 
+    # copy of details_object.get_short_details() for listings, kept up to date by catalog.signals
+    short_details = models.CharField(max_length=255, blank=True, default='', editable=False)
+
     def __str__(self):
         return self.name
 
-    objects = models.Manager()
+    objects = CachingManager()
     published = ProductManager()
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remembered to notice moves between categories and changes of details on save, see catalog.signals
+        loaded = dict(zip(field_names, values))
+        instance._loaded_category_id = loaded.get('category_id')
+        instance._loaded_details = (loaded.get('details_content_type_id'), loaded.get('details_id'))
+        return instance
+
+    def get_loaded_category_id(self):
+        """ Category of the product when it was loaded from DB, None for new products """
+        return getattr(self, '_loaded_category_id', None)
+
+    def details_changed(self) -> bool:
+        """ True for new products and products pointed to other details since they were loaded """
+        loaded = getattr(self, '_loaded_details', None)
+        return loaded != (self.details_content_type_id, self.details_id)
+
+    @staticmethod
+    def make_short_details(details) -> str:
+        if details is None:
+            return ''
+        return details.get_short_details()[:Product._meta.get_field('short_details').max_length]
+
+    def refresh_short_details(self) -> None:
+        self.short_details = self.make_short_details(self.details_object)
+
     def get_absolute_url(self):
         return reverse_lazy('product', kwargs={'cat_slug': self.category.slug, 'id': self.pk})
 
     class Meta:
         indexes = [
             models.Index(fields=["details_content_type", "details_id"]),
+            # keyset pagination of categories, see integration_app.views.CategoryView.sorts
+            models.Index(fields=["category", "published_at", "id"]),
+            models.Index(fields=["category", "price", "id"]),
+            models.Index(fields=["category", "discount_percent", "id"]),
         ]
 
 
@@ -76,5 +113,7 @@ class BaseDetails(FilterableMixin, models.Model):
 
     generic_relation_name = None
 
+    objects = CachingManager()
+
     class Meta:
         abstract = True
@@ -0,0 +1,115 @@
+import datetime
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import List, Mapping, Optional, Sequence
+
+from django.core import signing
+from django.db.models import Q, QuerySet
+
+
+class KeysetPaginator:
+    """ Cursor pagination: next page starts right after the last row of the previous one,
+        so it is found by index lookup instead of skipping rows with OFFSET, and deep pages cost as much as the first.
+        Ordering must end with a unique field (pk) for rows to be in stable total order.
+        Cursor holds values of ordering fields of the last row and is signed, so users can not forge it.
+    """
+    class InvalidCursor(Exception):
+        pass
+
+    salt = 'catalog.pagination'
+
+    @dataclass
+    class Page:
+        object_list: List
+        next_cursor: Optional[str]  # None for the last page
+
+        def has_next(self) -> bool:
+            return self.next_cursor is not None
+
+    def __init__(self, ordering: Sequence[str], per_page: int):
+        """ :param ordering: fields as for QuerySet.order_by, '-' prefix means descending order """
+        self.ordering = list(ordering)
+        self.per_page = per_page
+
+    @property
+    def keys(self) -> List[tuple]:
+        return [(name.lstrip('-'), name.startswith('-')) for name in self.ordering]
+
+    @staticmethod
+    def _encode_value(value):
+        if isinstance(value, (datetime.datetime, datetime.date)):
+            return value.isoformat()  # DjangoJSONEncoder would truncate microseconds
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
+
+    def encode_cursor(self, row) -> str:
+        values = [self._encode_value(getattr(row, name)) for name, _ in self.keys]
+        return signing.dumps([self.ordering, values], salt=self.salt)
+
+    def decode_cursor(self, cursor: str) -> List:
+        """ Raises InvalidCursor for forged cursors or cursors of other ordering """
+        try:
+            ordering, values = signing.loads(cursor, salt=self.salt)
+        except (signing.BadSignature, ValueError, TypeError):
+            raise self.InvalidCursor()
+        if ordering != self.ordering or len(values) != len(self.ordering):
+            raise self.InvalidCursor()
+        return values
+
+    @staticmethod
+    def _decode_value(value, like):
+        """ Cursor value converted back to the type of provided value of the same field """
+        if isinstance(like, datetime.datetime):
+            return datetime.datetime.fromisoformat(value)
+        if isinstance(like, datetime.date):
+            return datetime.date.fromisoformat(value)
+        if isinstance(like, Decimal):
+            return Decimal(value)
+        return value
+
+    def paginate_rows(self, rows: Sequence[Mapping], cursor: Optional[str] = None) -> List[Mapping]:
+        """ Same as paginate for rows kept in memory, rows must have every ordering field.
+            Returns rows of the page and the first row of the next one if it exists. Raises InvalidCursor
+        """
+        cursor_values = self.decode_cursor(cursor) if cursor else None
+        rows = list(rows)
+        for name, descending in reversed(self.keys):  # sort is stable, the first key is applied last
+            rows.sort(key=lambda row: row[name], reverse=descending)
+        if cursor_values is None or not rows:
+            return rows[:self.per_page + 1]
+
+        values = [self._decode_value(value, rows[0][name]) for (name, _), value in zip(self.keys, cursor_values)]
+
+        def is_after(row) -> bool:
+            for (name, descending), value in zip(self.keys, values):
+                if row[name] != value:
+                    return row[name] < value if descending else row[name] > value
+            return False
+
+        rows = [row for row in rows if is_after(row)]
+        return rows[:self.per_page + 1]
+
+    def get_after_Q(self, values: List) -> Q:
+        """ Rows going after row with provided values of ordering fields """
+        result_Q = None
+        equal = dict()
+        for (name, descending), value in zip(self.keys, values):
+            lookup = f'{name}__lt' if descending else f'{name}__gt'
+            key_Q = Q(**equal, **{lookup: value})
+            result_Q = key_Q if result_Q is None else result_Q | key_Q
+            equal[name] = value
+        return result_Q
+
+    def paginate(self, queryset: QuerySet, cursor: Optional[str] = None) -> Page:
+        """ Raises InvalidCursor, see decode_cursor """
+        queryset = queryset.order_by(*self.ordering)
+        if cursor:
+            queryset = queryset.filter(self.get_after_Q(self.decode_cursor(cursor)))
+
+        rows = list(queryset[:self.per_page + 1])
+        if len(rows) <= self.per_page:
+            return self.Page(rows, None)
+
+        rows = rows[:self.per_page]
+        return self.Page(rows, self.encode_cursor(rows[-1]))
@@ -0,0 +1,74 @@
+from typing import Optional, Tuple, Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.expressions import Combinable
+
+from .models import Product, BaseDetails
+from .versions import categories_version
+
+
+class ProductCache:
+    """ Stores product (with its category) and its details for product page.
+        Entries are written through on commit of saves of products and details (see catalog.signals),
+        so uncommitted data is never cached; deleted products are dropped at once and once more on commit.
+        key includes categories_version, so changes of categories make every entry stale.
+        Disabled if settings.CATALOG_PRODUCT_CACHE_TIMEOUT is 0.
+    """
+    @staticmethod
+    def is_enabled() -> bool:
+        return bool(settings.CATALOG_PRODUCT_CACHE_TIMEOUT)
+
+    @staticmethod
+    def key(pk: int) -> str:
+        return f'catalog:product:{categories_version.get()}:{pk}'
+
+    @classmethod
+    def get(cls, pk: int) -> Optional[Tuple[Product, Optional[BaseDetails]]]:
+        if not cls.is_enabled():
+            return None
+        return cache.get(cls.key(pk))
+
+    @classmethod
+    def set(cls, product: Product, details: Optional[BaseDetails]) -> None:
+        """ :param product: product with category loaded """
+        if cls.is_enabled():
+            cache.set(cls.key(product.pk), (product, details), settings.CATALOG_PRODUCT_CACHE_TIMEOUT)
+
+    @classmethod
+    def product_saved(cls, product: Product) -> None:
+        """ Writes saved product through if it is cached, products saved with expressions are dropped """
+        if not cls.is_enabled():
+            return
+        entry = cache.get(cls.key(product.pk))
+        if entry is None:
+            return
+
+        has_expressions = any(isinstance(getattr(product, field.attname), Combinable)
+                              for field in product._meta.concrete_fields if field.attname in product.__dict__)
+        if has_expressions or product.get_deferred_fields() or product.category_id != entry[0].category_id:
+            cache.delete(cls.key(product.pk))
+            return
+
+        product.category = entry[0].category
+        details = entry[1] if not product.details_changed() else product.details_object
+        cls.set(product, details)
+
+    @classmethod
+    def details_saved(cls, details: BaseDetails, product_pks: Iterable[int]) -> None:
+        """ Writes saved details through to cached products described by them """
+        if not cls.is_enabled():
+            return
+        for pk in product_pks:
+            entry = cache.get(cls.key(pk))
+            if entry is not None:
+                product = entry[0]
+                product.short_details = Product.make_short_details(details)
+                cls.set(product, details)
+
+    @classmethod
+    def invalidate(cls, *pks: int, using: str = None) -> None:
+        if cls.is_enabled() and pks:
+            cache.delete_many([cls.key(pk) for pk in pks])
+            transaction.on_commit(lambda: cache.delete_many([cls.key(pk) for pk in pks]), using=using)
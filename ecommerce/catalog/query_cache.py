@@ -0,0 +1,181 @@
+import hashlib
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import connections, models, transaction
+
+
+class QueryCache:
+    """ Results of querysets keyed on their compiled SQL and params.
+        Tables touched by a query are taken from SQL it executed, the entry is stored with versions of these tables
+        and is stale once any of them is bumped. Tables are bumped by catalog.signals on writes of models
+        using CachingQuerySet and by bulk methods of CachingQuerySet itself.
+        Queries touching tables of other models are not cached, their writes are not noticed.
+        Disabled if settings.CATALOG_QUERY_CACHE_TIMEOUT is 0.
+    """
+    key_prefix = 'catalog:query'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tables: Dict[str, Dict[str, bool]] = dict()  # per DB alias: quoted table name -> is tracked
+
+    @staticmethod
+    def is_enabled() -> bool:
+        return bool(settings.CATALOG_QUERY_CACHE_TIMEOUT)
+
+    @staticmethod
+    def is_tracked(model: type[models.Model]) -> bool:
+        return issubclass(getattr(model._default_manager, '_queryset_class', models.QuerySet), CachingQuerySet)
+
+    @staticmethod
+    def get_tables(model: type[models.Model]) -> List[str]:
+        """ Tables written by saves of model, parents of multi-table inheritance included """
+        return [model._meta.db_table] + [parent._meta.db_table for parent in model._meta.get_parent_list()]
+
+    def _get_known_tables(self, using: str) -> Dict[str, bool]:
+        with self._lock:
+            if using not in self._tables:
+                quote_name = connections[using].ops.quote_name
+                self._tables[using] = {quote_name(model._meta.db_table): self.is_tracked(model)
+                                       for model in apps.get_models(include_auto_created=True)}
+            return self._tables[using]
+
+    def get_touched_tables(self, using: str, executed: Iterable[str]) -> Optional[Set[str]]:
+        """ Tables mentioned by executed SQL, None if some of them are not tracked """
+        tables = set()
+        for quoted, is_tracked in self._get_known_tables(using).items():
+            if any(quoted in sql for sql in executed):
+                if not is_tracked:
+                    return None
+                tables.add(quoted[1:-1])
+        return tables
+
+    def version_key(self, table: str) -> str:
+        return f'{self.key_prefix}:table:{table}'
+
+    def get_versions(self, tables: Iterable[str]) -> Dict[str, int]:
+        keys = {self.version_key(table): table for table in tables}
+        versions = cache.get_many(list(keys))
+        for key in keys.keys() - versions.keys():
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+        return {keys[key]: version for key, version in versions.items()}
+
+    def bump(self, *tables: str) -> None:
+        for table in tables:
+            try:
+                cache.incr(self.version_key(table))
+            except ValueError:  # key is missing
+                cache.add(self.version_key(table), time.time_ns(), timeout=None)
+
+    def model_written(self, model: type[models.Model], using: str) -> None:
+        """ Bumps tables of tracked model, once more on commit, so entries built by concurrent readers
+            from data the transaction had not committed yet are stale too
+        """
+        if not self.is_tracked(model):
+            return
+        tables = self.get_tables(model)
+        self.bump(*tables)
+        transaction.on_commit(lambda: self.bump(*tables), using=using)
+
+    def get_or_fetch(self, queryset: 'CachingQuerySet', kind: str, fetch: Callable[[], object]):
+        """ :param kind: distinguishes results of different methods (fetch, count, aggregate) of the same queryset """
+        try:
+            sql, params = queryset.query.get_compiler(using=queryset.db).as_sql()
+        except EmptyResultSet:
+            return fetch()
+
+        signature = repr((queryset.db, kind, queryset._iterable_class.__name__, sql, params))
+        key = f'{self.key_prefix}:{hashlib.md5(signature.encode()).hexdigest()}'
+
+        entry = cache.get(key)
+        if entry is not None:
+            versions, result = entry
+            if self.get_versions(versions) == versions:
+                return result
+
+        # versions are taken before the query, so writes made while it runs make the entry stale
+        tracked = [quoted[1:-1] for quoted, is_tracked in self._get_known_tables(queryset.db).items() if is_tracked]
+        versions = self.get_versions(tracked)
+
+        executed = []
+
+        def record(execute, sql, params, many, context):
+            executed.append(sql)
+            return execute(sql, params, many, context)
+
+        with connections[queryset.db].execute_wrapper(record):
+            result = fetch()
+
+        tables = self.get_touched_tables(queryset.db, executed)
+        if tables:
+            cache.set(key, ({table: versions[table] for table in tables}, result), queryset._cache_timeout)
+        return result
+
+
+query_cache = QueryCache()
+
+
+class CachingQuerySet(models.QuerySet):
+    """ QuerySet with opt-in caching of results, see QueryCache. Only evaluation of the whole queryset,
+        count and aggregate are cached, iterator and prefetched relations are not.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cache_timeout = None
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._cache_timeout = self._cache_timeout
+        return clone
+
+    def cached(self, timeout: Optional[int] = None) -> 'CachingQuerySet':
+        """ :param timeout: seconds, settings.CATALOG_QUERY_CACHE_TIMEOUT by default """
+        clone = self._chain()
+        clone._cache_timeout = settings.CATALOG_QUERY_CACHE_TIMEOUT if timeout is None else timeout
+        return clone
+
+    def _is_cached(self) -> bool:
+        # related managers set known related objects to loaded instances, they must not get into cache
+        return bool(self._cache_timeout) and query_cache.is_enabled() and not self._known_related_objects
+
+    def _fetch_all(self):
+        if self._result_cache is None and self._is_cached():
+            self._result_cache = query_cache.get_or_fetch(self, 'fetch', lambda: list(self._iterable_class(self)))
+        super()._fetch_all()
+
+    def count(self):
+        if self._result_cache is not None or not self._is_cached():
+            return super().count()
+        count = super().count
+        return query_cache.get_or_fetch(self, 'count', count)
+
+    def aggregate(self, *args, **kwargs):
+        if not self._is_cached():
+            return super().aggregate(*args, **kwargs)
+        aggregate = super().aggregate
+        return query_cache.get_or_fetch(self, f'aggregate:{args!r}:{sorted(kwargs.items())!r}',
+                                        lambda: aggregate(*args, **kwargs))
+
+    def update(self, **kwargs):
+        result = super().update(**kwargs)
+        query_cache.model_written(self.model, self.db)
+        return result
+
+    def _raw_delete(self, using):
+        result = super()._raw_delete(using)
+        query_cache.model_written(self.model, using)
+        return result
+
+    def bulk_create(self, *args, **kwargs):
+        result = super().bulk_create(*args, **kwargs)
+        query_cache.model_written(self.model, self.db)
+        return result
+
+
+CachingManager = models.Manager.from_queryset(CachingQuerySet)
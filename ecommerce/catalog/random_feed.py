@@ -0,0 +1,74 @@
+import hashlib
+import threading
+from array import array
+
+from django.db.models import Min
+from django.utils.timezone import now
+
+from .models import Product
+from .versions import catalog_version
+
+
+class FeistelPermutation:
+    """ Pseudo-random permutation of range(size) defined by seed, any position is computed in O(1)
+        without building the whole permutation. Balanced Feistel network permutes range(2 ** (2 * half_bits)),
+        values outside of range(size) are walked through the network again until they fall into it.
+    """
+    rounds = 4
+
+    def __init__(self, size: int, seed):
+        self.size = size
+        self.half_bits = max(1, ((size - 1).bit_length() + 1) // 2)
+        self.mask = (1 << self.half_bits) - 1
+        self.keys = [hashlib.blake2b(f'{seed}:{i}'.encode(), digest_size=8).digest() for i in range(self.rounds)]
+
+    def _round(self, key: bytes, value: int) -> int:
+        digest = hashlib.blake2b(value.to_bytes(8, 'little'), key=key, digest_size=8).digest()
+        return int.from_bytes(digest, 'little') & self.mask
+
+    def _encrypt(self, value: int) -> int:
+        left, right = value >> self.half_bits, value & self.mask
+        for key in self.keys:
+            left, right = right, left ^ self._round(key, right)
+        return (left << self.half_bits) | right
+
+    def __call__(self, position: int) -> int:
+        if not 0 <= position < self.size:
+            raise IndexError(position)
+        value = self._encrypt(position)
+        while value >= self.size:  # cycle walking, domain is less than 4 * size, so few steps are expected
+            value = self._encrypt(value)
+        return value
+
+
+class PublishedIds:
+    """ Process-local sorted array of pks of published products.
+        Reloaded when catalog_version is bumped or when next product gets published.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = array('q')
+        self._version = None
+        self._expires_at = None
+
+    def _is_fresh(self, version) -> bool:
+        return self._version == version and (self._expires_at is None or now() < self._expires_at)
+
+    def get(self) -> array:
+        version = catalog_version.get()
+        with self._lock:
+            if self._is_fresh(version):
+                return self._ids
+
+            self._ids = array('q', Product.published.order_by('pk').values_list('pk', flat=True))
+            self._expires_at = Product.objects.filter(published_at__gt=now())\
+                .aggregate(next=Min('published_at'))['next']
+            self._version = version
+            return self._ids
+
+    def drop(self) -> None:
+        with self._lock:
+            self._version = None
+
+
+published_ids = PublishedIds()
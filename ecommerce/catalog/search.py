@@ -1,9 +1,12 @@
 from dataclasses import dataclass
-from typing import List, Dict
+from typing import List, Dict, Optional
 
-from django.db.models import Q, QuerySet, Count, Case, When, Value
+from django.db.models import Q, QuerySet, Count, Case, When, Value, F, Window, Expression
+from django.db.models.functions import RowNumber, Coalesce
 
 from catalog.models import Product, Category
+from catalog.search_index import ProductSearchIndex
+from catalog.trigram_index import trigram_index
 
 
 def make_Q(field: str, token: str) -> Q:
@@ -12,12 +15,89 @@ def make_Q(field: str, token: str) -> Q:
     return Q(**lookup)
 
 
+def make_products_Q(tokens: List[str], fields: List[str], using: str = None) -> Q:
+    """ Q for products having any of tokens in any of fields.
+        Uses full-text index when it is available, tokens too short for the index are searched with icontains
+    """
+    result_Q = Q()
+    indexed = [t for t in tokens if len(t) >= ProductSearchIndex.min_token_length]
+    if indexed and ProductSearchIndex.can_search(fields, using):
+        result_Q = ProductSearchIndex.get_Q(indexed, fields)
+        tokens = [t for t in tokens if len(t) < ProductSearchIndex.min_token_length]
+
+    for token in tokens:
+        for field in fields:
+            result_Q = result_Q | make_Q(field, token)
+    return result_Q
+
+
+def make_products_rank(tokens: List[str], fields: List[str], using: str = None) -> Optional[Expression]:
+    """ BM25 score of products, lower is better, None if full-text index can not rank such tokens """
+    indexed = [t for t in tokens if len(t) >= ProductSearchIndex.min_token_length]
+    if indexed and ProductSearchIndex.can_rank(fields, using):
+        return ProductSearchIndex.get_rank(indexed, fields)
+    return None
+
+
+class QueryPlanner:
+    """ Turns query into tokens to search for, every token costs a condition per searched field.
+        Duplicates (ignoring case), stop words and too short tokens are dropped,
+        unless nothing else is left, so a query of a single letter still searches for it.
+        Queries too long or having too many tokens are rejected before they reach DB.
+    """
+    class QueryRejected(Exception):
+        pass
+
+    max_query_length = 200
+    max_token_length = 50
+    max_tokens = 8
+    min_token_length = 2
+    stop_words = frozenset(['a', 'an', 'and', 'as', 'at', 'by', 'for', 'from', 'in', 'is', 'of', 'on', 'or',
+                            'the', 'to', 'with'])
+
+    def plan(self, query: str) -> List[str]:
+        """ Raises QueryRejected if query is too expensive to search for """
+        if len(query) > self.max_query_length:
+            raise self.QueryRejected(f'query is longer than {self.max_query_length} characters')
+
+        tokens = []
+        seen = set()
+        for token in query.split():
+            if len(token) > self.max_token_length:
+                raise self.QueryRejected(f'query has words longer than {self.max_token_length} characters')
+            if not token.isprintable():
+                raise self.QueryRejected('query has non-printable characters')
+            if token.lower() not in seen:
+                seen.add(token.lower())
+                tokens.append(token)
+
+        meaningful = [t for t in tokens if len(t) >= self.min_token_length and t.lower() not in self.stop_words]
+        tokens = meaningful or tokens
+
+        if len(tokens) > self.max_tokens:
+            raise self.QueryRejected(f'query has more than {self.max_tokens} words')
+        return tokens
+
+
 class SearchBase:
-    def __init__(self, fields: List[str]):
+    def __init__(self, fields: List[str], ranked: bool = False, planner: QueryPlanner = None):
+        """ :param ranked: order found products by relevance, see ProductSearchIndex.get_rank """
         self.fields = fields
+        self.ranked = ranked
+        self.planner = planner or QueryPlanner()
 
     def _filter(self, query: str, queryset: QuerySet) -> QuerySet:
-        tokens = query.split()
+        """ Raises QueryPlanner.QueryRejected for too expensive queries """
+        tokens = self.planner.plan(query)
+        if issubclass(queryset.model, Product):
+            queryset = queryset.filter(make_products_Q(tokens, self.fields, queryset.db))
+            rank = make_products_rank(tokens, self.fields, queryset.db) if self.ranked else None
+            if rank is not None:
+                # bm25 is negative for matched products, so products found only by short tokens go last
+                queryset = queryset.annotate(search_rank=Coalesce(rank, Value(0.0)))\
+                    .order_by('search_rank', 'pk')
+            return queryset
+
         result_Q = Q()
         for token in tokens:
             for field in self.fields:
@@ -37,8 +117,20 @@ class SearchCatalog:
     class NoQuerySpecified(Exception):
         pass
 
-    def __init__(self, show_first: int = 3):
+    # columns of found products used by search results, None loads whole rows
+    list_fields = ['name', 'category']
+
+    def __init__(self, show_first: int = 3, fuzzy: bool = True, fuzzy_limit: int = 50, ranked: bool = False,
+                 planner: QueryPlanner = None):
+        """ :param fuzzy: search similar products with trigram index when nothing is found exactly
+            :param fuzzy_limit: max number of products found by fuzzy search
+            :param ranked: show most relevant products of every category first, see ProductSearchIndex.get_rank
+        """
         self.show_first = show_first
+        self.planner = planner or QueryPlanner()
+        self.ranked = ranked
+        self.fuzzy = fuzzy
+        self.fuzzy_limit = fuzzy_limit
 
     @dataclass
     class SearchResultInfo:
@@ -46,37 +138,90 @@ class SearchCatalog:
         found: int
         first_found_products: List[Product]  # len <= show_first
         whole_category: bool
+        fuzzy: bool = False  # found by similarity, query itself does not match
 
     def filter(self, query: str) -> List[SearchResultInfo]:
+        """ Uses 3 queries regardless of number of categories:
+            categories, products count per category and first show_first products of every category
+        """
         if not query:
             raise self.NoQuerySpecified()
 
-        tokens = query.split()
-        result_Q = Q()
+        tokens = self.planner.plan(query)  # raises QueryPlanner.QueryRejected for too expensive queries
+        if not tokens:
+            raise self.NoQuerySpecified()
+        category_Q = Q()
         for token in tokens:
-            result_Q = result_Q | make_Q('name', token)
+            category_Q = category_Q | make_Q('name', token)
 
-        categories = Category.objects.annotate(whole_match=Case(When(result_Q, then=Value(1)), default=Value(0)))
+        categories = list(
+            Category.objects.annotate(whole_match=Case(When(category_Q, then=Value(1)), default=Value(0)))
+        )
 
-        search_results = list()
-        for c in categories:
-            if c.whole_match:
-                qs = c.product_set.all()
-            else:
-                qs = c.product_set.filter(result_Q)
+        whole_match_ids = [c.pk for c in categories if c.whole_match]
+        products = self.get_products().filter(Q(category_id__in=whole_match_ids) | make_products_Q(tokens, ['name']))
+
+        found_in_category = dict(products.order_by().values_list('category_id').annotate(found=Count('pk')))
+        if not found_in_category:
+            return self.fuzzy_filter(' '.join(tokens), categories) if self.fuzzy else []
+
+        order_by = [F('pk').asc()]
+        rank = make_products_rank(tokens, ['name']) if self.ranked else None
+        if rank is not None:
+            # not selected: SQLite evaluates selected columns once more after window, without index on ranks
+            products = products.alias(search_rank=rank)
+            order_by.insert(0, F('search_rank').asc(nulls_last=True))
 
-            found = qs.count()
+        first_products = products.annotate(
+            row_number=Window(RowNumber(), partition_by=F('category_id'), order_by=order_by)
+        ).filter(row_number__lte=self.show_first).order_by('category_id', 'row_number')
 
-            if found != 0:
-                first_products = list(qs[:self.show_first])
+        first_in_category = dict()
+        for p in first_products:
+            first_in_category.setdefault(p.category_id, []).append(p)
 
+        search_results = list()
+        for c in categories:
+            found = found_in_category.get(c.pk, 0)
+
+            # products may be moved or deleted between the two queries
+            if found != 0 and c.pk in first_in_category:
                 search_results.append(
                     self.SearchResultInfo(
                         category=c,
                         found=found,
-                        first_found_products=first_products,
+                        first_found_products=first_in_category[c.pk],
                         whole_category=c.whole_match
                     )
                 )
 
         return search_results
+
+    def get_products(self) -> QuerySet:
+        if self.list_fields is None:
+            return Product.objects.all()
+        return Product.objects.only(*self.list_fields)
+
+    def fuzzy_filter(self, query: str, categories: List[Category]) -> List[SearchResultInfo]:
+        """ Products similar to the query, most similar go first in every category """
+        ranked = trigram_index.search(query, limit=self.fuzzy_limit)
+        if not ranked:
+            return []
+
+        products = self.get_products().in_bulk([pk for pk, _ in ranked])
+        found_in_category = dict()
+        for pk, _ in ranked:
+            p = products.get(pk)  # index may be a bit behind DB
+            if p is not None:
+                found_in_category.setdefault(p.category_id, []).append(p)
+
+        return [
+            self.SearchResultInfo(
+                category=c,
+                found=len(found_in_category[c.pk]),
+                first_found_products=found_in_category[c.pk][:self.show_first],
+                whole_category=False,
+                fuzzy=True
+            )
+            for c in categories if c.pk in found_in_category
+        ]
@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Tuple
+
+from .search import SearchCatalog, QueryPlanner
+from .versions import catalog_version
+
+
+class SearchResultsCache:
+    """ Process-local LRU cache of SearchCatalog results.
+        Queries are normalized to sorted set of lowercased tokens left by QueryPlanner, search is case-insensitive
+        and tokens are combined with OR, so 'Red garland' and 'garland red red' share an entry.
+        Entries expire after timeout and are dropped once catalog_version is bumped.
+    """
+    def __init__(self, max_size: int = 256, timeout: float = 5 * 60):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()  # key -> (version, expires_at, results)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(query: str, planner: QueryPlanner) -> Tuple[str, ...]:
+        return tuple(sorted(set(token.lower() for token in planner.plan(query))))
+
+    def get_or_search(self, query: str, search_engine: SearchCatalog) -> List[SearchCatalog.SearchResultInfo]:
+        """ Raises SearchCatalog.NoQuerySpecified and QueryPlanner.QueryRejected just like SearchCatalog.filter """
+        tokens = self.normalize(query, search_engine.planner)
+        if not tokens:
+            raise SearchCatalog.NoQuerySpecified()
+
+        key = (tokens, search_engine.show_first, search_engine.fuzzy, search_engine.fuzzy_limit, search_engine.ranked)
+        version = catalog_version.get()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        results = search_engine.filter(' '.join(tokens))
+
+        with self._lock:
+            self._entries[key] = (version, time.monotonic() + self.timeout, results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return results
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / requests if requests else 0.0,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+            }
+
+
+search_results_cache = SearchResultsCache()
@@ -0,0 +1,122 @@
+from typing import List, Dict
+
+from django.db import connections, router
+from django.db.models import Q, FloatField
+from django.db.models.expressions import RawSQL
+
+from .models import Product
+
+
+class ProductSearchIndex:
+    """ SQLite FTS5 full-text index over name, manufacturer and description of products.
+        Index is an external content table filled by triggers on catalog_product (see migration 0007),
+        so it stays in sync with every insert, update and delete including bulk ones.
+        SQLite drops triggers when a migration remakes catalog_product, they are created again after every migrate,
+        see create_triggers.
+        Trigram tokenizer matches substrings case-insensitively like icontains does, but it needs
+        at least 3 characters, shorter tokens are searched with LIKE.
+    """
+    table = 'catalog_product_fts'
+    fields = ('name', 'manufacturer', 'description')
+    weights = {'name': 10.0, 'manufacturer': 5.0, 'description': 1.0}  # used by bm25 ranking
+    min_token_length = 3
+
+    triggers = {
+        'catalog_product_fts_insert': """
+            CREATE TRIGGER IF NOT EXISTS catalog_product_fts_insert AFTER INSERT ON catalog_product BEGIN
+                INSERT INTO catalog_product_fts(rowid, name, manufacturer, description)
+                VALUES (new.id, new.name, new.manufacturer, new.description);
+            END
+        """,
+        'catalog_product_fts_delete': """
+            CREATE TRIGGER IF NOT EXISTS catalog_product_fts_delete AFTER DELETE ON catalog_product BEGIN
+                INSERT INTO catalog_product_fts(catalog_product_fts, rowid, name, manufacturer, description)
+                VALUES ('delete', old.id, old.name, old.manufacturer, old.description);
+            END
+        """,
+        'catalog_product_fts_update': """
+            CREATE TRIGGER IF NOT EXISTS catalog_product_fts_update
+            AFTER UPDATE OF name, manufacturer, description ON catalog_product BEGIN
+                INSERT INTO catalog_product_fts(catalog_product_fts, rowid, name, manufacturer, description)
+                VALUES ('delete', old.id, old.name, old.manufacturer, old.description);
+                INSERT INTO catalog_product_fts(rowid, name, manufacturer, description)
+                VALUES (new.id, new.name, new.manufacturer, new.description);
+            END
+        """,
+    }
+
+    _available: Dict[str, bool] = dict()
+
+    @classmethod
+    def is_available(cls, using: str = None) -> bool:
+        """ Index exists only in SQLite databases built with FTS5, result is remembered per connection alias """
+        using = using or router.db_for_read(Product)
+        if using not in cls._available:
+            connection = connections[using]
+            cls._available[using] = (connection.vendor == 'sqlite'
+                                     and cls.table in connection.introspection.table_names())
+        return cls._available[using]
+
+    @staticmethod
+    def quote(token: str) -> str:
+        return '"' + token.replace('"', '""') + '"'
+
+    @classmethod
+    def match_expression(cls, tokens: List[str], fields: List[str]) -> str:
+        """ FTS5 query matching any of tokens in any of fields """
+        columns = ' '.join(fields)
+        return '{%s} : (%s)' % (columns, ' OR '.join(cls.quote(token) for token in tokens))
+
+    @classmethod
+    def can_search(cls, fields: List[str], using: str = None) -> bool:
+        return bool(fields) and all(field in cls.fields for field in fields) and cls.is_available(using)
+
+    @classmethod
+    def get_Q(cls, tokens: List[str], fields: List[str]) -> Q:
+        """ Q for products having any of tokens in any of fields, tokens should be long enough for the index """
+        return Q(pk__in=RawSQL(f'SELECT rowid FROM {cls.table} WHERE {cls.table} MATCH %s',
+                               [cls.match_expression(tokens, fields)]))
+
+    @classmethod
+    def can_rank(cls, fields: List[str], using: str = None) -> bool:
+        """ get_rank needs MATERIALIZED common table expressions, added in SQLite 3.35 """
+        using = using or router.db_for_read(Product)
+        return cls.can_search(fields, using) and connections[using].Database.sqlite_version_info >= (3, 35)
+
+    @classmethod
+    def get_rank(cls, tokens: List[str], fields: List[str]) -> RawSQL:
+        """ BM25 score of the product, FTS5 uses statistics stored in the index to compute it.
+            Lower is better, products not matched by the index get NULL.
+            Scores of all matched products are computed by one pass over the index: materialized CTE is not
+            correlated, so SQLite fills it once per query and only looks rows up in it for every product.
+            Correlated MATCH would be run again for every product, which makes ranking time quadratic.
+        """
+        weights = ', '.join(str(cls.weights[field]) for field in cls.fields)
+        return RawSQL(f'WITH search_ranks AS MATERIALIZED ('
+                      f'SELECT rowid, bm25({cls.table}, {weights}) AS search_rank '
+                      f'FROM {cls.table} WHERE {cls.table} MATCH %s) '
+                      f'SELECT search_rank FROM search_ranks WHERE search_ranks.rowid = {Product._meta.db_table}.id',
+                      [cls.match_expression(tokens, fields)], output_field=FloatField())
+
+    @classmethod
+    def rebuild(cls, using: str = None) -> None:
+        using = using or router.db_for_write(Product)
+        with connections[using].cursor() as cursor:
+            cursor.execute(f"INSERT INTO {cls.table}({cls.table}) VALUES('rebuild')")
+
+    @classmethod
+    def create_triggers(cls, using: str) -> None:
+        """ Creates missing triggers of the index, the index is rebuilt if some were missing,
+            since products could have been changed without them. Does nothing if there is no index
+        """
+        connection = connections[using]
+        if connection.vendor != 'sqlite' or cls.table not in connection.introspection.table_names():
+            return
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s",
+                           [Product._meta.db_table])
+            existing = {name for name, in cursor.fetchall()}
+            for sql in cls.triggers.values():
+                cursor.execute(sql)
+        if not existing.issuperset(cls.triggers):
+            cls.rebuild(using)
@@ -0,0 +1,137 @@
+from typing import Callable
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .autocomplete import autocomplete_dictionary
+from .entity_cache import EntityCache
+from .filter_cache import FiltersCache, ListingCache
+from .filter_index import filter_indexes
+from .models import Product, Category, BaseDetails
+from .product_cache import ProductCache
+from .query_cache import query_cache
+from .search_index import ProductSearchIndex
+from .trigram_index import trigram_index
+from .versions import catalog_version, categories_version
+
+
+def invalidate(using: str, invalidation: Callable[[], None]) -> None:
+    """ Runs invalidation now and once more on commit, so data committed before the write and read
+        by concurrent readers after the first run is not left in caches and process-local copies
+    """
+    invalidation()
+    transaction.on_commit(invalidation, using=using)
+
+
+@receiver(pre_save, sender=Product)
+def product_saving(sender, instance: Product, **kwargs):
+    if instance.details_changed():
+        instance.refresh_short_details()
+
+
+# fields not used by indexes, filters and listings, saved by orders on every basket change
+STOCK_FIELDS = frozenset(['units_available'])
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance: Product, using, update_fields=None, **kwargs):
+    EntityCache.invalidate(Product, instance.pk, using=using)
+    transaction.on_commit(lambda: ProductCache.product_saved(instance), using=using)
+    if update_fields is not None and update_fields <= STOCK_FIELDS:
+        return
+
+    filter_indexes.refresh_products([instance.pk])
+    trigram_index.upsert(instance)
+    autocomplete_dictionary.upsert_product(instance)
+    category_ids = (instance.category_id, instance.get_loaded_category_id())
+
+    def invalidation():
+        catalog_version.bump()
+        FiltersCache.invalidate(*category_ids)
+        ListingCache.invalidate(*category_ids)
+    invalidate(using, invalidation)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance: Product, using, **kwargs):
+    filter_indexes.remove_product(instance.pk)
+    trigram_index.remove(instance.pk)
+    autocomplete_dictionary.remove_product(instance.pk)
+    EntityCache.invalidate(Product, instance.pk, using=using)
+    ProductCache.invalidate(instance.pk, using=using)
+
+    def invalidation():
+        catalog_version.bump()
+        FiltersCache.invalidate(instance.category_id)
+        ListingCache.invalidate(instance.category_id)
+    invalidate(using, invalidation)
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance: Category, using, **kwargs):
+    autocomplete_dictionary.upsert_category(instance)
+
+    def invalidation():
+        catalog_version.bump()
+        categories_version.bump()
+        FiltersCache.invalidate(instance.pk)
+        ListingCache.invalidate(instance.pk)
+    invalidate(using, invalidation)
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance: Category, using, **kwargs):
+    filter_indexes.drop(instance.pk)
+    autocomplete_dictionary.remove_category(instance.pk)
+
+    def invalidation():
+        catalog_version.bump()
+        categories_version.bump()
+        FiltersCache.invalidate(instance.pk)
+        ListingCache.invalidate(instance.pk)
+    invalidate(using, invalidation)
+
+
+# details models live in other apps, receivers below are connected per sender by CatalogConfig.ready,
+# receivers without sender would disable fast deletes of every model
+def details_changed(sender, instance: BaseDetails, signal, using, **kwargs):
+    if signal is post_save:
+        filter_indexes.refresh_details(instance)
+
+    products = Product.objects.filter(details_content_type=ContentType.objects.get_for_model(instance),
+                                      details_id=instance.pk)
+    rows = list(products.values_list('pk', 'category_id'))
+    short_details = Product.make_short_details(instance) if signal is post_save else ''
+    products.exclude(short_details=short_details).update(short_details=short_details)
+
+    pks = [pk for pk, _ in rows]
+    EntityCache.invalidate(type(instance), instance.pk, using=using)
+    EntityCache.invalidate(Product, *pks, using=using)  # short details were updated
+    if signal is post_save:
+        transaction.on_commit(lambda: ProductCache.details_saved(instance, pks), using=using)
+    else:
+        ProductCache.invalidate(*pks, using=using)
+    category_ids = {category_id for _, category_id in rows}
+
+    def invalidation():
+        catalog_version.bump()  # filter indexes of other processes hold values of details
+        FiltersCache.invalidate(*category_ids)
+        ListingCache.invalidate(*category_ids)
+    invalidate(using, invalidation)
+
+
+# tables of models using CachingQuerySet, see catalog.query_cache
+def model_written(sender, using, **kwargs):
+    query_cache.model_written(sender, using)
+
+
+def relation_written(sender, action, using, **kwargs):
+    if action.startswith('post_'):
+        query_cache.model_written(sender, using)
+
+
+# connected with catalog app as sender by CatalogConfig.ready
+def catalog_migrated(sender, using, **kwargs):
+    ProductSearchIndex.create_triggers(using)
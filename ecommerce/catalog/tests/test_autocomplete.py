@@ -0,0 +1,88 @@
+import datetime
+
+from .common_setup import common_setup
+
+from django.test import TestCase
+from django.utils.timezone import now
+
+from catalog.models import Product
+from ..autocomplete import AutocompleteDictionary
+from ..versions import catalog_version
+
+
+class TestAutocompleteDictionary(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        common_setup(cls)
+
+    def setUp(self):
+        self.dictionary = AutocompleteDictionary()
+
+    def names(self, prefix, kind='products', limit=10):
+        return [entry['name'] for entry in self.dictionary.lookup(prefix, limit)[kind]]
+
+    def test_prefix_matches_beginning_of_any_word(self):
+        self.assertEqual(self.names('fr'), ['Freeze One'])
+        self.assertEqual(self.names('ONE'), ['Freeze One'])
+        self.assertEqual(self.names('choi'), ["Loner's Choice"])
+
+    def test_several_words_match_consecutive_words(self):
+        self.assertEqual(self.names('freeze o'), ['Freeze One'])
+        self.assertEqual(self.names('one freeze'), [])
+
+    def test_categories_are_looked_up(self):
+        self.assertEqual(self.names('fri', kind='categories'), ['fridges'])
+
+    def test_products_are_sorted_and_limited(self):
+        self.assertEqual(self.names('e', limit=1), ['Erick Son'])
+
+    def test_product_is_returned_once(self):
+        product = self.available_products[0]
+        product.name = 'Galaxy Galaxy'
+        product.save()
+        self.dictionary.load()
+
+        self.assertEqual(self.names('gal'), ['Galaxy Galaxy'])
+
+    def test_products_published_in_future_are_excluded(self):
+        product = self.available_products[0]
+        product.published_at = now() + datetime.timedelta(days=1)
+        product.save()
+
+        self.assertEqual(self.names('galaxy'), [])
+
+    def test_lookup_does_not_query_db_once_loaded(self):
+        self.dictionary.lookup('a')
+
+        with self.assertNumQueries(0):
+            self.dictionary.lookup('galaxy')
+
+    def test_changes_are_applied_incrementally(self):
+        self.dictionary.ensure_loaded()
+        product = self.available_products[0]
+        product.name = 'Nebula'
+        self.dictionary.upsert_product(product)
+        category = self.available_categories[1]
+        category.name = 'coolers'
+        self.dictionary.upsert_category(category)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names('neb'), ['Nebula'])
+            self.assertEqual(self.names('gal'), [])
+            self.assertEqual(self.names('cool', kind='categories'), ['coolers'])
+            self.assertEqual(self.names('fri', kind='categories'), [])
+
+        self.dictionary.remove_product(product.pk)
+        self.assertEqual(self.names('neb'), [])
+
+    def test_dictionary_is_reloaded_after_write_of_other_process(self):
+        self.dictionary.ensure_loaded()
+        Product.objects.filter(pk=self.available_products[0].pk).update(name='Nebula')  # saved by other process,
+        catalog_version.bump()  # which bumps shared version only
+
+        self.assertEqual(self.names('neb'), ['Nebula'])
+
+    def test_products_without_category_are_excluded(self):
+        Product.objects.filter(pk=self.available_products[0].pk).update(category=None)
+
+        self.assertEqual(self.names('galaxy'), [])
@@ -0,0 +1,113 @@
+from .common_setup import common_setup
+
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.signals import request_started, request_finished
+from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import Category
+from catalog_test_app.models import PhoneDetails
+from ..category_registry import CategoryRegistry, category_registry
+from ..versions import categories_version
+
+
+class TestCategoryRegistry(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        common_setup(cls)
+
+    def setUp(self):
+        cache.clear()
+        self.registry = CategoryRegistry()
+
+    def test_categories_are_found_by_slug_and_pk(self):
+        phones = self.available_categories[0]
+
+        self.assertEqual(self.registry.get_by_slug('phones'), phones)
+        self.assertEqual(self.registry.get(phones.pk), phones)
+        self.assertIsNone(self.registry.get_by_slug('unknown'))
+        self.assertEqual(self.registry.all(), self.available_categories)
+
+    def test_details_model_is_resolved(self):
+        self.assertIs(self.registry.get_details_model(self.available_categories[0]), PhoneDetails)
+
+    def test_categories_are_loaded_once(self):
+        self.registry.get_by_slug('phones')
+
+        with self.assertNumQueries(0):
+            self.registry.get_by_slug('fridges')
+            self.registry.all()
+
+    def test_saved_category_is_reloaded(self):
+        self.registry.get_by_slug('phones')
+        category = Category.objects.get(slug='phones')
+        category.slug = 'smartphones'
+        category.save()
+
+        self.assertIsNone(self.registry.get_by_slug('phones'))
+        self.assertEqual(self.registry.get_by_slug('smartphones'), category)
+
+    def test_categories_are_reloaded_when_other_process_bumps_version(self):
+        self.registry.get_by_slug('phones')
+        Category.objects.filter(slug='phones').update(name='smartphones')
+        categories_version.bump()
+
+        self.assertEqual(self.registry.get_by_slug('phones').name, 'smartphones')
+
+    def test_version_is_read_once_per_request(self):
+        request_started.send(sender=None)
+        try:
+            self.registry.get_by_slug('phones')
+            with mock.patch.object(cache, 'get', wraps=cache.get) as cache_get:
+                self.registry.get_by_slug('fridges')
+                self.registry.all()
+            self.assertFalse(cache_get.called)
+
+            category = Category.objects.get(slug='phones')
+            category.slug = 'smartphones'
+            category.save()  # bumps made by the request are seen by it
+            self.assertEqual(self.registry.get_by_slug('smartphones'), category)
+        finally:
+            request_finished.send(sender=None)
+
+
+class TestViewsUseCategoryRegistry(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        common_setup(cls)
+
+    def setUp(self):
+        category_registry.drop()
+
+    def test_index_view_does_not_query_db_when_warm(self):
+        self.client.get(reverse('index'))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('index'))
+
+        self.assertContains(response, 'fridges')
+
+    def test_random_products_page_reads_version_once(self):
+        self.client.get(reverse('get_random_products'))
+
+        with mock.patch.object(cache, 'get', wraps=cache.get) as cache_get:
+            self.client.get(reverse('get_random_products'))
+
+        keys = [call.args[0] for call in cache_get.call_args_list]
+        self.assertEqual(keys.count(categories_version.key), 1)
+
+    def test_unknown_category_produces_404(self):
+        response = self.client.get(reverse('category', kwargs={'slug': 'unknown'}))
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.get(reverse('product', kwargs={'cat_slug': 'unknown',
+                                                              'id': self.available_products[0].pk}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_product_in_other_category_produces_404(self):
+        response = self.client.get(reverse('product', kwargs={'cat_slug': 'fridges',
+                                                              'id': self.available_products[0].pk}))
+
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,21 @@
+from django.test import SimpleTestCase, override_settings
+
+from ..checks import check_shared_cache
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+DATABASE = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'ecommerce_cache'}}
+
+
+class TestSharedCacheCheck(SimpleTestCase):
+    @override_settings(CACHES=LOCMEM, CATALOG_ENTITY_CACHE_TIMEOUT=60)
+    def test_process_local_cache_is_reported(self):
+        self.assertEqual([e.id for e in check_shared_cache(None)], ['catalog.W001'])
+
+    @override_settings(CACHES=DATABASE, CATALOG_ENTITY_CACHE_TIMEOUT=60)
+    def test_shared_cache_passes(self):
+        self.assertEqual(check_shared_cache(None), [])
+
+    @override_settings(CACHES=LOCMEM, CATALOG_PRODUCT_CACHE_TIMEOUT=0, CATALOG_ENTITY_CACHE_TIMEOUT=0,
+                       CATALOG_QUERY_CACHE_TIMEOUT=0, CATALOG_LISTING_CACHE_TIMEOUT=0)
+    def test_process_local_cache_passes_with_disabled_caches(self):
+        self.assertEqual(check_shared_cache(None), [])
@@ -0,0 +1,148 @@
+import datetime
+from unittest import mock
+
+from .common_setup import common_setup
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils.timezone import now
+
+from catalog.models import Product
+from catalog_test_app.models import PhoneDetails
+from orders.models import OrderProducts
+from ..entity_cache import EntityCache
+
+
+@override_settings(CATALOG_ENTITY_CACHE_TIMEOUT=60)
+class TestEntityCache(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        common_setup(cls)
+
+    def setUp(self):
+        cache.clear()
+        self.pks = [p.pk for p in self.available_products[:3]]
+
+    def test_misses_are_loaded_with_one_query(self):
+        with self.assertNumQueries(1):
+            products = EntityCache.get_many(Product, self.pks)
+
+        self.assertEqual(sorted(products), sorted(self.pks))
+        self.assertEqual(products[self.pks[0]].name, 'Galaxy W')
+
+    def test_cached_entities_are_returned_without_queries(self):
+        EntityCache.get_many(Product, self.pks[:2])
+
+        with self.assertNumQueries(0):
+            products = EntityCache.get_many(Product, self.pks[:2])
+
+        self.assertEqual(len(products), 2)
+
+    def test_only_misses_are_loaded(self):
+        EntityCache.get(Product, self.pks[0])
+
+        with self.assertNumQueries(1):
+            products = EntityCache.get_many(Product, self.pks)
+
+        self.assertEqual(len(products), 3)
+
+    def test_missing_pks_are_absent_in_result(self):
+        self.assertIsNone(EntityCache.get(Product, 100500))
+
+    def test_saved_product_is_dropped(self):
+        product = EntityCache.get(Product, self.pks[0])
+        product.name = 'Galaxy X'
+        product.save()
+
+        self.assertEqual(EntityCache.get(Product, self.pks[0]).name, 'Galaxy X')
+
+    def test_rows_loaded_before_commit_are_dropped_on_commit(self):
+        product = EntityCache.get(Product, self.pks[0])
+        product.name = 'Galaxy X'
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+            EntityCache.get(Product, self.pks[0])  # concurrent reader would load the row committed before save
+
+            self.assertIsNotNone(cache.get(EntityCache.key(Product, self.pks[0])))
+
+        self.assertIsNone(cache.get(EntityCache.key(Product, self.pks[0])))
+
+    def test_deleted_product_is_dropped(self):
+        EntityCache.get(Product, self.pks[0])
+        self.available_products[0].delete()
+
+        self.assertIsNone(EntityCache.get(Product, self.pks[0]))
+
+    def test_saved_details_drop_details_and_described_products(self):
+        product = EntityCache.get(Product, self.pks[0])
+        EntityCache.get_details(product)
+        details = PhoneDetails.objects.get(pk=product.details_id)
+        details.color = 'green'
+        details.save()
+
+        product = EntityCache.get(Product, self.pks[0])
+        self.assertEqual(EntityCache.get_details(product).color, 'green')
+        self.assertIn('green', product.short_details)
+
+    def test_rows_read_before_invalidation_are_not_stored(self):
+        in_bulk = Product._base_manager.in_bulk
+
+        def in_bulk_racing_with_writer(pks):
+            rows = in_bulk(pks)
+            Product.objects.filter(pk=self.pks[0]).update(name='Galaxy X')
+            EntityCache.invalidate(Product, self.pks[0])
+            return rows
+
+        with mock.patch.object(Product._base_manager, 'in_bulk', in_bulk_racing_with_writer):
+            EntityCache.get(Product, self.pks[0])
+
+        self.assertEqual(EntityCache.get(Product, self.pks[0]).name, 'Galaxy X')
+
+    @override_settings(CATALOG_ENTITY_CACHE_TIMEOUT=0)
+    def test_cache_can_be_disabled(self):
+        EntityCache.get_many(Product, self.pks)
+
+        with self.assertNumQueries(1):
+            EntityCache.get_many(Product, self.pks)
+
+
+@override_settings(CATALOG_ENTITY_CACHE_TIMEOUT=60)
+class TestOrderViewsDoNotUseEntityCache(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        common_setup(cls)
+        cls.user = get_user_model().objects.create(username='Mia', password='Ami')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.product = self.available_products[0]
+        EntityCache.get(Product, self.product.pk)
+
+    def add(self, amount):
+        return self.client.post(reverse('order_add'), {'product_id': self.product.pk, 'amount': amount},
+                                content_type='application/json')
+
+    def test_order_records_current_price(self):
+        Product.objects.filter(pk=self.product.pk).update(price=100)  # not seen by cached copy
+
+        self.add(1)
+
+        self.assertEqual(OrderProducts.objects.get(product=self.product).buying_price, 100)
+
+    def test_stock_is_checked_against_current_row(self):
+        Product.objects.filter(pk=self.product.pk).update(units_available=1)  # not seen by cached copy
+
+        response = self.add(2)
+
+        self.assertEqual(response.status_code, 422)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.units_available, 1)
+
+    def test_unpublished_product_is_rejected(self):
+        self.product.published_at = now() + datetime.timedelta(days=1)
+        self.product.save()
+
+        self.assertEqual(self.add(1).status_code, 400)
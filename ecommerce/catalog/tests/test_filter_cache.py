@@ -0,0 +1,143 @@
+import datetime
+from typing import List
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .common_setup import common_setup
+
+from catalog.filter_cache import FiltersCache
+from catalog.filters import FilterFactory, FilterSpec, Filters, FilterBase
+from catalog.models import Product
+
+
+class TestFiltersCache(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        common_setup(cls)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_filters(self) -> List[FilterBase]:
+        category_fridges = self.available_categories[1]
+        related_model = category_fridges.details_content_type.model_class()
+
+        specs = [FilterSpec('price', Filters.BOUND)]
+        specs += FilterFactory.get_specs_for_related_model(related_model.generic_relation_name, related_model)
+
+        qs = Product.published.filter(category_id=category_fridges.pk)
+        return FiltersCache.get_or_produce(category_fridges.pk, specs, qs)
+
+    def test_cached_filters_produced_without_queries(self):
+        self.get_filters()
+
+        with self.assertNumQueries(0):
+            self.get_filters()
+
+    def test_parsing_cached_filters_does_not_affect_cache(self):
+        filters = self.get_filters()
+        for f in filters:
+            f.parse(dict(color='white', has_freezer='1'))
+
+        for f in self.get_filters():
+            with self.subTest(filter=f.name):
+                self.assertFalse(f.get_Q())
+
+    def test_product_save_invalidates_cache(self):
+        self.get_filters()
+        product = Product.objects.get(pk=self.available_products[3].pk)
+        product.price = 1000
+        product.save()
+
+        filters = {f.name: f for f in self.get_filters()}
+
+        self.assertEqual(filters['price'].lower_bound, 1000)
+
+    def test_stock_save_keeps_cache(self):
+        self.get_filters()
+        product = Product.objects.get(pk=self.available_products[3].pk)
+        product.units_available = 0
+        product.save(update_fields=['units_available'])
+
+        with self.assertNumQueries(0):
+            self.get_filters()
+
+    def test_product_move_invalidates_cache_of_previous_category(self):
+        self.get_filters()
+        product = Product.objects.get(pk=self.available_products[3].pk)
+        product.category = self.available_categories[0]
+        product.save()
+
+        filters = {f.name: f for f in self.get_filters()}
+
+        self.assertNotIn('black', filters['color'].choices)
+
+    def test_details_save_invalidates_cache(self):
+        self.get_filters()
+        details = self.available_details[3]
+        details.color = 'green'
+        details.save()
+
+        filters = {f.name: f for f in self.get_filters()}
+
+        self.assertIn('green', filters['color'].choices)
+
+    def test_cache_expires_when_next_product_gets_published(self):
+        Product.objects.filter(pk=self.available_products[3].pk)\
+            .update(published_at=timezone.now() + datetime.timedelta(minutes=1))
+
+        with mock.patch.object(cache, 'set') as cache_set:
+            self.get_filters()
+
+        _, _, timeout = cache_set.call_args.args
+        self.assertLessEqual(timeout, 60)
+
+
+@override_settings(CATALOG_LISTING_CACHE_TIMEOUT=60)
+class TestListingCache(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        common_setup(cls)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, **params):
+        return self.client.get(reverse('category', kwargs={'slug': 'phones'}), params)
+
+    def test_landing_page_is_served_without_queries(self):
+        self.get()
+
+        with self.assertNumQueries(0):
+            response = self.get()
+
+        self.assertContains(response, 'Galaxy W')
+
+    def test_product_save_invalidates_cache(self):
+        self.get()
+        product = Product.objects.get(pk=self.available_products[0].pk)
+        product.name = 'Galaxy X'
+        product.save()
+
+        self.assertContains(self.get(), 'Galaxy X')
+
+    def test_filtered_and_sorted_pages_are_not_cached(self):
+        self.get()
+        Product.objects.filter(pk=self.available_products[0].pk).update(name='Galaxy X')  # not seen by cache
+
+        self.assertContains(self.get(sort='price'), 'Galaxy X')
+        self.assertContains(self.get(manufacturer='Shansung'), 'Galaxy X')
+        self.assertNotContains(self.get(), 'Galaxy X')
+
+    def test_stock_save_keeps_cache(self):
+        self.get()
+        product = Product.objects.get(pk=self.available_products[0].pk)
+        product.units_available = 0
+        product.save(update_fields=['units_available'])
+
+        with self.assertNumQueries(0):
+            self.get()
@@ -0,0 +1,146 @@
+import datetime
+from typing import List, Tuple
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .common_setup import common_setup
+
+from catalog.filter_index import filter_indexes, CategoryIndex
+from catalog.filters import FilterFactory, FilterSpec, Filters, FilterBase
+from catalog.models import Product
+from catalog.versions import catalog_version
+from catalog.pagination import KeysetPaginator
+
+
+class TestCategoryIndex(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        common_setup(cls)
+
+    def setUp(self):
+        filter_indexes.drop()
+
+    def tearDown(self):
+        filter_indexes.drop()
+
+    def explicit_setup(self) -> Tuple[List[FilterSpec], CategoryIndex]:
+        category_fridges = self.available_categories[1]
+        related_model = category_fridges.details_content_type.model_class()
+
+        specs = [
+            FilterSpec('price', Filters.BOUND),
+            FilterSpec('manufacturer', Filters.DYNAMIC_CHOICES)
+        ]
+        specs += FilterFactory.get_specs_for_related_model(related_model.generic_relation_name, related_model)
+
+        return specs, filter_indexes.build(category_fridges.pk, specs)
+
+    def produce_filters(self, specs: List[FilterSpec], GET_dict) -> List[FilterBase]:
+        qs = Product.published.filter(category_id=self.available_categories[1].pk)
+        filters = FilterFactory.produce_from_specs(specs, qs)
+        for f in filters:
+            f.parse(GET_dict)
+        return filters
+
+    def test_index_gives_same_result_as_DB(self):
+        specs, index = self.explicit_setup()
+        qs = Product.published.filter(category_id=self.available_categories[1].pk)
+
+        for GET_dict in [dict(color='white'),
+                         dict(has_freezer='0'),
+                         dict(EU_energy_label='A++,B', price_max='100000'),
+                         dict(volume_liters_min='100', volume_liters_max='300', manufacturer='Sentinel,POSH')]:
+            with self.subTest(GET_dict=GET_dict):
+                filters = self.produce_filters(specs, GET_dict)
+                expected = set(qs.filter(*[f.get_Q() for f in filters]).values_list('pk', flat=True))
+
+                with self.assertNumQueries(0):
+                    result = index.filter(filters)
+
+                self.assertEqual(set(result), expected)
+
+    def test_not_published_products_excluded(self):
+        specs, index = self.explicit_setup()
+        product = self.available_products[3]
+        product.published_at = timezone.now() + datetime.timedelta(days=1)
+        product.save()
+
+        result = index.filter(self.produce_filters(specs, dict(manufacturer='POSH,Homestead,Sentinel')))
+
+        self.assertNotIn(product.pk, result)
+        self.assertEqual(len(result), 2)
+
+    def test_index_updated_on_product_save(self):
+        specs, index = self.explicit_setup()
+        product = self.available_products[3]
+        product.manufacturer = 'Sentinel'
+        product.save()
+
+        result = index.filter(self.produce_filters(specs, dict(manufacturer='Sentinel')))
+
+        self.assertEqual(set(result), {product.pk, self.available_products[5].pk})
+
+    def test_index_updated_on_details_save(self):
+        specs, index = self.explicit_setup()
+        details = self.available_details[3]
+        details.color = 'white'
+        details.save()
+
+        result = index.filter(self.produce_filters(specs, dict(color='white')))
+
+        self.assertEqual(len(result), 3)
+
+    def test_deleted_product_removed_from_index(self):
+        specs, index = self.explicit_setup()
+        pk = self.available_products[3].pk
+        self.available_products[3].delete()
+
+        self.assertNotIn(pk, index.filter(self.produce_filters(specs, dict(manufacturer='POSH,Homestead,Sentinel'))))
+
+    def test_no_result_without_applied_filters(self):
+        specs, index = self.explicit_setup()
+
+        self.assertIsNone(index.filter(self.produce_filters(specs, dict())))
+
+    def test_result_is_cut_to_page(self):
+        specs, _ = self.explicit_setup()
+        index = filter_indexes.build(self.available_categories[1].pk, specs, ['price', 'pk'])
+        filters = self.produce_filters(specs, dict(manufacturer='POSH,Homestead,Sentinel'))
+        paginator = KeysetPaginator(['price', 'pk'], 1)
+        qs = Product.published.filter(category_id=self.available_categories[1].pk).order_by('price', 'pk')
+        expected = list(qs.values_list('pk', flat=True))
+
+        with self.assertNumQueries(0):
+            first_page = index.filter(filters, paginator)
+        cursor = paginator.paginate(qs).next_cursor
+
+        self.assertEqual(first_page, expected[:2])
+        self.assertEqual(index.filter(filters, paginator, cursor), expected[1:3])
+
+    @override_settings(CATALOG_FILTER_INDEX_CATEGORIES=['fridges'])
+    def test_category_view_warms_index_and_uses_it(self):
+        url = reverse('category', kwargs={'slug': 'fridges'})
+        self.assertIsNone(filter_indexes.get(self.available_categories[1].pk))
+
+        cold_response = self.client.get(url, {'color': 'white'})
+        self.assertIsNotNone(filter_indexes.get(self.available_categories[1].pk))
+        warm_response = self.client.get(url, {'color': 'white'})
+
+        self.assertEqual(list(cold_response.context['products']), list(warm_response.context['products']))
+        self.assertEqual(len(warm_response.context['products']), 2)
+
+    @override_settings(CATALOG_FILTER_INDEX_CATEGORIES=['fridges'])
+    def test_index_is_dropped_after_write_of_other_process(self):
+        url = reverse('category', kwargs={'slug': 'fridges'})
+        self.client.get(url, {'color': 'white'})
+        details = self.available_details[3]
+        type(details).objects.filter(pk=details.pk).update(color='white')  # saved by other process,
+        catalog_version.bump()  # which bumps shared version only
+
+        self.assertIsNone(filter_indexes.get(self.available_categories[1].pk))
+        response = self.client.get(url, {'color': 'white'})
+
+        self.assertEqual(len(response.context['products']), 3)
+        self.assertIsNotNone(filter_indexes.get(self.available_categories[1].pk))
@@ -0,0 +1,56 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from catalog.filter_registry import FilterRegistry, filter_registry
+from catalog.filters import Filters
+from catalog_test_app.models import FridgeDetails
+
+
+class TestFilterRegistry(SimpleTestCase):
+    def test_project_models_have_no_errors(self):
+        self.assertEqual(filter_registry.get_errors(), [])
+
+    def test_specs_are_compiled(self):
+        specs = {spec.field: spec for spec in filter_registry.get_specs(FridgeDetails)}
+
+        self.assertEqual(specs['volume_liters'].query_name, 'fridges__volume_liters')
+        self.assertEqual(specs['EU_energy_label'].choices, FridgeDetails.EU_ENERGY_LABEL_CHOICES)
+        self.assertIsNone(specs['color'].choices)
+
+    def test_specs_are_copied(self):
+        filter_registry.get_specs(FridgeDetails)[0].field = 'changed'
+
+        self.assertNotEqual(filter_registry.get_specs(FridgeDetails)[0].field, 'changed')
+
+    def test_missing_field_reported(self):
+        registry = FilterRegistry()
+        with mock.patch.object(FridgeDetails, 'FILTERS', [('has_illumination', Filters.BOOL_CHOICES)]):
+            specs = registry.compile(FridgeDetails)
+
+        self.assertEqual(specs, [])
+        self.assertEqual([error.id for error in registry.get_errors()], ['catalog.E003'])
+
+    def test_wrong_filter_type_for_field_reported(self):
+        for entry in [('color', Filters.BOUND), ('volume_liters', Filters.BOOL_CHOICES),
+                      ('color', Filters.STATIC_CHOICES), ('color', 'DYNAMIC_CHOICES')]:
+            with self.subTest(entry=entry):
+                registry = FilterRegistry()
+                with mock.patch.object(FridgeDetails, 'FILTERS', [entry]):
+                    registry.compile(FridgeDetails)
+
+                self.assertEqual([error.id for error in registry.get_errors()], ['catalog.E004'])
+
+    def test_malformed_entry_reported(self):
+        registry = FilterRegistry()
+        with mock.patch.object(FridgeDetails, 'FILTERS', [('color', Filters.DYNAMIC_CHOICES, 'extra')]):
+            registry.compile(FridgeDetails)
+
+        self.assertEqual([error.id for error in registry.get_errors()], ['catalog.E002'])
+
+    def test_wrong_relation_name_reported(self):
+        registry = FilterRegistry()
+        with mock.patch.object(FridgeDetails, 'generic_relation_name', 'fridge'):
+            registry.compile(FridgeDetails)
+
+        self.assertEqual([error.id for error in registry.get_errors()], ['catalog.E001'])
@@ -1,12 +1,16 @@
-from typing import Tuple
+from decimal import Decimal
+from typing import Tuple, List
 
-from django.db.models import QuerySet
+from django.db import connection
+from django.db.models import QuerySet, Count
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 from .common_setup import common_setup
 
 from catalog.models import Product
-from catalog.filters import FilterBound, FilterDynamicChoices, FilterBool, FilterStaticChoices
+from catalog.filters import FilterBound, FilterDynamicChoices, FilterBool, FilterStaticChoices, \
+    FilterFactory, FilterSpec, Filters, FilterCompiler, FilterBase, Buckets
 
 
 class TestFilterBound(TestCase):
@@ -450,3 +454,222 @@ class TestFilterStaticChoices(TestCase):
 
         self.assertTrue(self.available_products[3] in result)
         self.assertTrue(self.available_products[4] in result)
+
+
+class TestFilterFactory(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        common_setup(cls)
+
+    def explicit_setup(self) -> Tuple[QuerySet, List[FilterSpec]]:
+        category_fridges = self.available_categories[1]
+        qs = Product.objects.filter(category_id=category_fridges.pk)
+
+        related_model = category_fridges.details_content_type.model_class()
+        specs = [
+            FilterSpec('price', Filters.BOUND),
+            FilterSpec('manufacturer', Filters.DYNAMIC_CHOICES)
+        ]
+        specs += FilterFactory.get_specs_for_related_model(related_model.generic_relation_name, related_model)
+
+        return qs, specs
+
+    def test_facets_gathered_with_two_queries(self):
+        qs, specs = self.explicit_setup()
+
+        with self.assertNumQueries(2):
+            FilterFactory.produce_from_specs(specs, qs)
+
+    def test_choices_are_counted_by_each_field_separately(self):
+        qs, specs = self.explicit_setup()
+        choices_names = [spec.query_name for spec in specs if spec.filter_type in (Filters.DYNAMIC_CHOICES,
+                                                                                    Filters.STATIC_CHOICES)]
+
+        with CaptureQueriesContext(connection) as context:
+            facets = FilterFactory.plan_facets(specs, qs)
+
+        sql = context.captured_queries[-1]['sql']
+        self.assertEqual(sql.count('GROUP BY'), len(choices_names))
+        self.assertIn('UNION ALL', sql)
+        for query_name in choices_names:
+            expected = dict(qs.order_by().values_list(query_name).annotate(Count('pk')))
+            self.assertEqual(facets.choices[query_name], expected)
+
+    def test_planned_filters_are_same_as_produced_one_by_one(self):
+        qs, specs = self.explicit_setup()
+
+        planned = FilterFactory.produce_from_specs(specs, qs)
+        single = [FilterFactory.produce(spec.field, spec.filter_type, qs, query_to=spec.query_to,
+                                        choices=spec.choices) for spec in specs]
+
+        for planned_filter, single_filter in zip(planned, single):
+            with self.subTest(filter=planned_filter.name):
+                self.assertEqual(type(planned_filter), type(single_filter))
+                if isinstance(planned_filter, FilterBound):
+                    self.assertEqual(planned_filter.lower_bound, single_filter.lower_bound)
+                    self.assertEqual(planned_filter.upper_bound, single_filter.upper_bound)
+                if isinstance(planned_filter, FilterDynamicChoices):
+                    self.assertEqual(planned_filter.counts, single_filter.counts)
+                if isinstance(planned_filter, FilterStaticChoices):
+                    self.assertEqual(planned_filter.choices, single_filter.choices)
+
+    def test_choices_counts_are_gathered(self):
+        qs, specs = self.explicit_setup()
+
+        filters = {f.name: f for f in FilterFactory.produce_from_specs(specs, qs)}
+
+        self.assertEqual(filters['color'].counts, {'black': 1, 'white': 2})
+        self.assertEqual(filters['manufacturer'].counts, {'POSH': 1, 'Homestead': 1, 'Sentinel': 1})
+        self.assertEqual(filters['EU_energy_label'].counts['A++'], 1)
+        self.assertEqual(filters['EU_energy_label'].counts['C'], 0)
+
+    def test_choices_counts_shown_in_html(self):
+        qs, specs = self.explicit_setup()
+
+        filters = {f.name: f for f in FilterFactory.produce_from_specs(specs, qs)}
+
+        self.assertIn('white (2)', filters['color'].get_html())
+
+    def test_planned_filters_filter_correctly(self):
+        qs, specs = self.explicit_setup()
+        GET_dict = dict(color='white', volume_liters_min='300')
+
+        filters = FilterFactory.produce_from_specs(specs, qs)
+        for f in filters:
+            f.parse(GET_dict)
+            qs = f.filter(qs)
+
+        result = list(qs)
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0], self.available_products[4])
+
+    def test_narrowed_facets_reflect_other_filters_but_not_own(self):
+        qs, specs = self.explicit_setup()
+        GET_dict = dict(color='white', has_freezer='1', EU_energy_label='B')
+
+        filters = {f.name: f for f in FilterFactory.produce_from_specs(specs, qs)}
+        for f in filters.values():
+            f.parse(GET_dict)
+        FilterFactory.narrow_facets(list(filters.values()), qs)
+
+        # own choice is ignored, so other colors stay countable
+        self.assertEqual(filters['color'].counts, {'black': 0, 'white': 1})
+        self.assertEqual(filters['EU_energy_label'].counts['A++'], 1)
+        self.assertEqual(filters['EU_energy_label'].counts['B'], 1)
+        self.assertEqual(filters['manufacturer'].counts, {'POSH': 0, 'Homestead': 0, 'Sentinel': 1})
+        self.assertEqual(filters['volume_liters'].available_bounds, (200, 200))
+        self.assertEqual(filters['price'].available_bounds, (Decimal(32999), Decimal(32999)))
+
+    def test_narrowing_facets_uses_one_query(self):
+        qs, specs = self.explicit_setup()
+
+        for GET_dict in [dict(), dict(color='white'), dict(color='white', volume_liters_min='100', has_freezer='0')]:
+            with self.subTest(GET_dict=GET_dict):
+                filters = FilterFactory.produce_from_specs(specs, qs)
+                for f in filters:
+                    f.parse(GET_dict)
+
+                with self.assertNumQueries(1):
+                    FilterFactory.narrow_facets(filters, qs)
+
+
+class TestFilterCompiler(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        common_setup(cls)
+
+    def explicit_setup(self) -> Tuple[QuerySet, List[FilterBase], type]:
+        category_fridges = self.available_categories[1]
+        qs = Product.objects.filter(category_id=category_fridges.pk)
+
+        related_model = category_fridges.details_content_type.model_class()
+        specs = [FilterSpec('price', Filters.BOUND)]
+        specs += FilterFactory.get_specs_for_related_model(related_model.generic_relation_name, related_model)
+
+        filters = FilterFactory.produce_from_specs(specs, qs)
+        GET_dict = dict(price_max='100000', color='white,black', has_freezer='1', volume_liters_min='100')
+        for f in filters:
+            f.parse(GET_dict)
+
+        return qs, filters, related_model
+
+    def test_compiled_filters_join_details_table_once(self):
+        qs, filters, related_model = self.explicit_setup()
+
+        sql = str(FilterCompiler.apply(qs, filters).query)
+
+        self.assertEqual(sql.count(f'JOIN "{related_model._meta.db_table}"'), 1)
+
+    def test_semi_join_does_not_join_details_table(self):
+        qs, filters, related_model = self.explicit_setup()
+
+        sql = str(FilterCompiler.apply(qs, filters, related_model).query)
+
+        self.assertNotIn(f'JOIN "{related_model._meta.db_table}"', sql)
+        self.assertEqual(sql.count(f'FROM "{related_model._meta.db_table}"'), 1)
+
+    def test_compiled_filters_produce_same_result(self):
+        qs, filters, related_model = self.explicit_setup()
+
+        chained = qs
+        for f in filters:
+            chained = f.filter(chained)
+        expected = list(chained)
+
+        self.assertEqual(expected, [self.available_products[5]])
+        self.assertEqual(list(FilterCompiler.apply(qs, filters)), expected)
+        self.assertEqual(list(FilterCompiler.apply(qs, filters, related_model)), expected)
+
+
+class TestFilterBoundHistogram(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        common_setup(cls)
+
+    def test_equal_width_buckets_count_all_objects(self):
+        qs = Product.objects.all()
+
+        with self.assertNumQueries(2):
+            test_filter = FilterBound('price', qs, buckets=4)
+
+        self.assertEqual([bucket.count for bucket in test_filter.histogram], [3, 2, 0, 1])
+        self.assertEqual(test_filter.histogram[0].lower, 28500)
+        self.assertEqual(test_filter.histogram[-1].upper, 186900)
+        self.assertEqual(test_filter.histogram[0].upper, test_filter.histogram[1].lower)
+
+    def test_values_on_bucket_edges_go_to_upper_bucket(self):
+        products = self.available_products[:3]
+        for product, price in zip(products, ['0.10', '0.30', '0.70']):
+            product.price = Decimal(price)
+            product.save()
+        qs = Product.objects.filter(pk__in=[p.pk for p in products])
+
+        test_filter = FilterBound('price', qs, buckets=6)
+
+        self.assertEqual(test_filter.histogram[2].lower, Decimal('0.30'))
+        self.assertEqual([bucket.count for bucket in test_filter.histogram], [1, 0, 1, 0, 0, 1])
+
+    def test_equal_width_buckets_on_related_model(self):
+        category_fridges = self.available_categories[1]
+        qs = Product.objects.filter(category_id=category_fridges.pk)
+        related_object_name = category_fridges.details_content_type.model_class().generic_relation_name
+
+        test_filter = FilterBound('volume_liters', qs, query_to=related_object_name, buckets=3)
+
+        self.assertEqual([bucket.count for bucket in test_filter.histogram], [1, 1, 1])
+
+    def test_quantile_buckets_have_equal_size(self):
+        qs = Product.objects.all()
+
+        with self.assertNumQueries(2):
+            test_filter = FilterBound('price', qs, buckets=3, bucket_mode=Buckets.QUANTILE)
+
+        self.assertEqual([bucket.count for bucket in test_filter.histogram], [2, 2, 2])
+        self.assertEqual(test_filter.histogram[0].lower, 28500)
+        self.assertEqual(test_filter.histogram[0].upper, 32999)
+        self.assertEqual(test_filter.histogram[-1].upper, 186900)
+
+    def test_no_histogram_by_default(self):
+        test_filter = FilterBound('price', Product.objects.all())
+
+        self.assertIsNone(test_filter.histogram)
@@ -0,0 +1,79 @@
+from io import StringIO
+
+from .common_setup import common_setup
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from orders.models import Order, OrderProducts
+from ..search import SearchCatalog
+
+
+class TestListProjections(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        common_setup(cls)
+
+        cls.user = get_user_model().objects.create_user('buyer', password='password')
+        cls.order = Order.objects.create(user=cls.user)
+        for p in cls.available_products[:2]:
+            OrderProducts.objects.create(order=cls.order, product=p, amount=1,
+                                         buying_price=p.price, buying_discount_percent=0)
+
+    def assertDescriptionNotLoaded(self, context):
+        for query in context.captured_queries:
+            self.assertNotIn('"description"', query['sql'])
+
+    def test_category_view_does_not_load_description(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('category', kwargs={'slug': self.available_categories[0].slug}))
+
+        self.assertDescriptionNotLoaded(context)
+        self.assertContains(response, 'Galaxy W')
+
+    def test_category_view_does_not_load_deferred_fields_per_product(self):
+        url = reverse('category', kwargs={'slug': self.available_categories[0].slug})
+        self.client.get(url)  # warms filters cache
+
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url, {'sort': 'discount'})
+
+        self.assertLess(len(context.captured_queries), len(self.available_products))
+
+    def test_catalog_search_does_not_load_description(self):
+        SearchCatalog().filter('galaxy')  # checks whether full-text index is available once
+
+        with CaptureQueriesContext(connection) as context:
+            result = SearchCatalog().filter('galaxy')
+            [p.name for entry in result for p in entry.first_found_products]
+
+        self.assertDescriptionNotLoaded(context)
+        self.assertEqual(len(context.captured_queries), 3)
+
+    @override_settings(CATALOG_ENTITY_CACHE_TIMEOUT=60)
+    def test_order_view_loads_only_order_lines_once_products_are_cached(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.client.get(reverse('order', kwargs={'order_id': self.order.pk}))
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('order', kwargs={'order_id': self.order.pk}))
+
+        self.assertDescriptionNotLoaded(context)
+        self.assertFalse(any('FROM "catalog_product"' in q['sql'] for q in context.captured_queries))
+        self.assertContains(response, 'Erick Son')
+        self.assertContains(response, 'now costs 40000')
+
+    def test_benchmark_compares_whole_rows_and_projections(self):
+        out = StringIO()
+        call_command('benchmark_listings', stdout=out)
+
+        output = out.getvalue()
+        for listing in ['category phones', 'search "a"', f'order {self.order.pk}']:
+            self.assertIn(listing, output)
+        self.assertIn('bytes fetched', output)
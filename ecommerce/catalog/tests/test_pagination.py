@@ -0,0 +1,126 @@
+from unittest import mock
+
+from .common_setup import common_setup
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog.models import Product
+from integration_app.views import CategoryView
+from ..pagination import KeysetPaginator
+
+
+class TestKeysetPaginator(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        common_setup(cls)
+        # equal prices make pk decide the order
+        Product.objects.filter(pk__in=[cls.available_products[0].pk, cls.available_products[2].pk]).update(price=100)
+
+    def collect_pages(self, paginator, queryset):
+        pages = []
+        cursor = None
+        while True:
+            page = paginator.paginate(queryset, cursor)
+            pages.append(page.object_list)
+            if not page.has_next():
+                return pages
+            cursor = page.next_cursor
+
+    def test_pages_follow_ordering(self):
+        for ordering in [['price', 'pk'], ['-published_at', '-pk'], ['-discount_percent', '-pk']]:
+            with self.subTest(ordering=ordering):
+                pages = self.collect_pages(KeysetPaginator(ordering, 4), Product.objects.all())
+
+                self.assertEqual([len(page) for page in pages], [4, 2])
+                self.assertEqual([p for page in pages for p in page], list(Product.objects.order_by(*ordering)))
+
+    def test_rows_in_memory_are_paginated_as_in_DB(self):
+        for ordering in [['price', 'pk'], ['-published_at', '-pk'], ['-discount_percent', '-pk']]:
+            with self.subTest(ordering=ordering):
+                paginator = KeysetPaginator(ordering, 4)
+                rows = list(Product.objects.values('pk', 'price', 'published_at', 'discount_percent'))
+                cursor = paginator.paginate(Product.objects.all()).next_cursor
+
+                first_page = paginator.paginate_rows(rows)
+                second_page = paginator.paginate_rows(rows, cursor)
+
+                expected = list(Product.objects.order_by(*ordering).values_list('pk', flat=True))
+                self.assertEqual([row['pk'] for row in first_page], expected[:5])
+                self.assertEqual([row['pk'] for row in second_page], expected[4:])
+
+    def test_full_last_page_has_no_next(self):
+        page = KeysetPaginator(['pk'], 6).paginate(Product.objects.all())
+
+        self.assertEqual(len(page.object_list), 6)
+        self.assertFalse(page.has_next())
+
+    def test_next_page_is_found_without_offset(self):
+        paginator = KeysetPaginator(['price', 'pk'], 2)
+        first_page = paginator.paginate(Product.objects.all())
+
+        with CaptureQueriesContext(connection) as context:
+            paginator.paginate(Product.objects.all(), first_page.next_cursor)
+
+        self.assertNotIn('OFFSET', context.captured_queries[0]['sql'])
+
+    def test_forged_cursor_raises_InvalidCursor(self):
+        with self.assertRaises(KeysetPaginator.InvalidCursor):
+            KeysetPaginator(['pk'], 2).paginate(Product.objects.all(), 'forged')
+
+    def test_cursor_of_other_ordering_raises_InvalidCursor(self):
+        cursor = KeysetPaginator(['price', 'pk'], 2).paginate(Product.objects.all()).next_cursor
+
+        with self.assertRaises(KeysetPaginator.InvalidCursor):
+            KeysetPaginator(['-pk'], 2).paginate(Product.objects.all(), cursor)
+
+
+@mock.patch.object(CategoryView, 'products_per_page', 2)
+class TestCategoryViewPagination(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        common_setup(cls)
+        cls.url = reverse('category', kwargs={'slug': cls.available_categories[0].slug})
+
+    def collect_pages(self, params):
+        products = []
+        response = self.client.get(self.url, params)
+        products += response.context['products']
+        while response.context['next_page_query']:
+            response = self.client.get(self.url + '?' + response.context['next_page_query'])
+            products += response.context['products']
+        return products
+
+    def test_newest_products_go_first_by_default(self):
+        products = self.collect_pages({})
+
+        self.assertEqual(products, list(self.available_categories[0].product_set.order_by('-published_at')))
+
+    def test_products_are_sorted_by_price(self):
+        products = self.collect_pages({'sort': 'price'})
+
+        self.assertEqual(products, list(self.available_categories[0].product_set.order_by('price')))
+
+    def test_pagination_keeps_search_and_filters(self):
+        products = self.collect_pages({'q': 'Galaxy icall son', 'manufacturer': 'Bony,Shansung',
+                                       'sort': 'price'})
+
+        self.assertEqual(products, [self.available_products[0], self.available_products[1]])
+
+    def test_search_results_are_sorted_by_relevance_by_default(self):
+        response = self.client.get(self.url, {'q': 'Galaxy'})
+
+        self.assertEqual(response.context['sort'], CategoryView.RELEVANCE)
+        self.assertEqual(list(response.context['products']), [self.available_products[0]])
+
+    def test_unknown_sort_falls_back_to_default(self):
+        response = self.client.get(self.url, {'sort': 'name'})
+
+        self.assertEqual(response.context['sort'], CategoryView.default_sort)
+
+    def test_forged_cursor_produces_400_status_code(self):
+        response = self.client.get(self.url, {'after': 'forged'})
+
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,152 @@
+import datetime
+
+from .common_setup import common_setup
+
+from django.core.cache import cache
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils.timezone import now
+
+from catalog.models import Product, Category
+from ..product_cache import ProductCache
+
+
+class TestProductView(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        common_setup(cls)
+
+    def get(self, product, cat_slug=None):
+        return self.client.get(reverse('product', kwargs={'cat_slug': cat_slug or product.category.slug,
+                                                          'id': product.pk}))
+
+    def test_product_and_details_are_loaded_with_two_queries(self):
+        with self.assertNumQueries(2):
+            response = self.get(self.available_products[0])
+
+        self.assertContains(response, 'Galaxy W [red/980x620/2.0GB]')
+
+    def test_wrong_category_produces_404(self):
+        response = self.get(self.available_products[0], cat_slug='fridges')
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_product_published_in_future_produces_404(self):
+        product = self.available_products[0]
+        product.published_at = now() + datetime.timedelta(days=1)
+        product.save()
+
+        self.assertEqual(self.get(product).status_code, 404)
+
+
+@override_settings(CATALOG_PRODUCT_CACHE_TIMEOUT=60)
+class TestProductCache(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        common_setup(cls)
+
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.get(pk=self.available_products[0].pk)
+
+    def get(self, cat_slug='phones'):
+        return self.client.get(reverse('product', kwargs={'cat_slug': cat_slug, 'id': self.product.pk}))
+
+    def test_warm_cache_serves_page_without_queries(self):
+        self.get()
+
+        with self.assertNumQueries(0):
+            response = self.get()
+
+        self.assertContains(response, 'Galaxy W [red/980x620/2.0GB]')
+
+    def test_cached_product_is_checked_against_category(self):
+        self.get()
+
+        self.assertEqual(self.get(cat_slug='fridges').status_code, 404)
+
+    def test_saved_product_is_written_through(self):
+        self.get()
+        self.product.name = 'Galaxy X'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+
+        with self.assertNumQueries(0):
+            response = self.get()
+
+        self.assertContains(response, 'Galaxy X')
+
+    def test_product_saved_with_expressions_is_dropped(self):
+        self.get()
+        self.product.units_available = F('units_available') - 1
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+
+        self.assertIsNone(ProductCache.get(self.product.pk))
+
+    def test_saved_details_are_written_through(self):
+        self.get()
+        details = self.available_details[0]
+        details.color = 'green'
+        with self.captureOnCommitCallbacks(execute=True):
+            details.save()
+
+        with self.assertNumQueries(0):
+            response = self.get()
+
+        self.assertContains(response, '[green/980x620/2.0GB]')
+
+    def test_product_is_written_through_on_commit_only(self):
+        self.get()
+        self.product.name = 'Galaxy X'
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.product.save()
+
+            self.assertEqual(ProductCache.get(self.product.pk)[0].name, 'Galaxy W')
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(ProductCache.get(self.product.pk)[0].name, 'Galaxy X')
+
+    def test_rolled_back_details_are_not_written_through(self):
+        self.get()
+        details = self.available_details[0]
+        details.color = 'green'
+        with self.captureOnCommitCallbacks():  # callbacks are not run, as on rollback
+            details.save()
+
+        self.assertContains(self.get(), '[red/980x620/2.0GB]')
+
+    def test_product_loaded_before_commit_of_deletion_is_dropped_on_commit(self):
+        self.get()
+        pk = self.product.pk
+        entry = ProductCache.get(pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.delete()
+            ProductCache.set(*entry)  # concurrent reader would load the row committed before deletion
+
+        self.assertIsNone(ProductCache.get(pk))
+
+    def test_changed_category_makes_entries_stale(self):
+        self.get()
+        category = Category.objects.get(slug='phones')
+        category.slug = 'smartphones'
+        category.save()
+
+        self.assertEqual(self.get().status_code, 404)
+        self.assertEqual(self.get(cat_slug='smartphones').status_code, 200)
+
+    def test_deleted_product_is_dropped(self):
+        self.get()
+        pk = self.product.pk
+        self.product.delete()
+
+        self.assertIsNone(ProductCache.get(pk))
+
+    @override_settings(CATALOG_PRODUCT_CACHE_TIMEOUT=0)
+    def test_cache_can_be_disabled(self):
+        self.get()
+
+        with self.assertNumQueries(2):
+            self.get()
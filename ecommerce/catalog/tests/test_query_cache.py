@@ -0,0 +1,120 @@
+from .common_setup import common_setup
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Max
+from django.contrib.sessions.models import Session
+from django.db.models.deletion import Collector
+from django.db.models.signals import post_delete
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from catalog.models import Product, Category
+from catalog_test_app.models import PhoneDetails
+from orders.models import Order, OrderProducts
+
+
+@override_settings(CATALOG_QUERY_CACHE_TIMEOUT=60)
+class TestCachingQuerySet(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        common_setup(cls)
+
+    def setUp(self):
+        cache.clear()
+        self.phones = Product.objects.filter(category__slug='phones').order_by('pk')
+
+    def test_repeated_queryset_is_served_from_cache(self):
+        names = [p.name for p in self.phones.cached()]
+
+        with self.assertNumQueries(0):
+            self.assertEqual([p.name for p in self.phones.cached()], names)
+
+    def test_querysets_are_not_cached_unless_asked(self):
+        list(self.phones.all())
+
+        with self.assertNumQueries(1):
+            list(self.phones.all())
+
+    def test_saved_model_makes_entries_stale(self):
+        list(self.phones.cached())
+        product = self.available_products[0]
+        product.name = 'Galaxy X'
+        product.save()
+
+        self.assertIn('Galaxy X', [p.name for p in self.phones.cached()])
+
+    def test_write_to_joined_table_makes_entries_stale(self):
+        list(self.phones.cached())
+        category = self.available_categories[0]
+        category.slug = 'smartphones'
+        category.save()
+
+        self.assertEqual(list(self.phones.cached()), [])
+
+    def test_write_to_other_tables_keeps_entries(self):
+        list(Category.objects.order_by('pk').cached())
+        self.available_products[0].save()
+
+        with self.assertNumQueries(0):
+            list(Category.objects.order_by('pk').cached())
+
+    def test_update_makes_entries_stale(self):
+        list(self.phones.cached())
+        Product.objects.filter(pk=self.available_products[0].pk).update(name='Galaxy X')
+
+        self.assertIn('Galaxy X', [p.name for p in self.phones.cached()])
+
+    def test_details_models_are_tracked(self):
+        list(PhoneDetails.objects.cached())
+        PhoneDetails.objects.filter(color='red').update(color='green')
+
+        self.assertIn('green', [d.color for d in PhoneDetails.objects.cached()])
+
+    def test_values_and_instances_are_cached_separately(self):
+        list(self.phones.cached())
+
+        self.assertEqual(list(self.phones.values_list('name', flat=True).cached())[0], 'Galaxy W')
+
+    def test_count_and_aggregate_are_cached(self):
+        self.phones.cached().count()
+        self.phones.cached().aggregate(max_price=Max('price'))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.phones.cached().count(), 3)
+            self.assertEqual(self.phones.cached().aggregate(max_price=Max('price'))['max_price'], 85000)
+
+    def test_orders_are_tracked(self):
+        user = get_user_model().objects.create_user('buyer', password='password')
+        order = Order.objects.create(user=user)
+        list(OrderProducts.objects.filter(order=order).cached())
+        OrderProducts.objects.create(order=order, product=self.available_products[0], amount=1,
+                                     buying_price=1, buying_discount_percent=0)
+
+        self.assertEqual(len(OrderProducts.objects.filter(order=order).cached()), 1)
+
+    def test_queries_touching_untracked_tables_are_not_cached(self):
+        user = get_user_model().objects.create_user('buyer', password='password')
+        Order.objects.create(user=user)
+        orders = Order.objects.filter(user__username='buyer')
+        list(orders.cached())
+
+        with self.assertNumQueries(1):
+            list(orders.cached())
+
+    @override_settings(CATALOG_QUERY_CACHE_TIMEOUT=0)
+    def test_cache_can_be_disabled(self):
+        list(self.phones.cached(timeout=60))
+
+        with self.assertNumQueries(1):
+            list(self.phones.cached(timeout=60))
+
+
+class TestSignalReceivers(SimpleTestCase):
+    def test_models_without_receivers_are_deleted_fast(self):
+        self.assertTrue(Collector('default').can_fast_delete(Session.objects.all()))
+
+    def test_receivers_are_connected_to_details_and_tracked_models(self):
+        for model in [Product, PhoneDetails, OrderProducts]:
+            with self.subTest(model=model.__name__):
+                self.assertTrue(post_delete.has_listeners(model))
+                self.assertFalse(Collector('default').can_fast_delete(model.objects.all()))
@@ -0,0 +1,71 @@
+import datetime
+
+from .common_setup import common_setup
+
+from django.core.cache import cache
+from django.test import TestCase, SimpleTestCase
+from django.utils.timezone import now
+
+from catalog.models import Product
+from ..random_feed import FeistelPermutation, PublishedIds
+
+
+class TestFeistelPermutation(SimpleTestCase):
+    def test_permutation_is_bijection(self):
+        for size in [1, 2, 3, 10, 17, 64, 1000]:
+            with self.subTest(size=size):
+                permutation = FeistelPermutation(size, seed=42)
+                self.assertEqual(sorted(permutation(i) for i in range(size)), list(range(size)))
+
+    def test_same_seed_produces_same_permutation(self):
+        first = [FeistelPermutation(100, seed=7)(i) for i in range(100)]
+        second = [FeistelPermutation(100, seed=7)(i) for i in range(100)]
+
+        self.assertEqual(first, second)
+
+    def test_different_seeds_usually_produce_different_permutations(self):
+        first = [FeistelPermutation(100, seed=7)(i) for i in range(100)]
+        second = [FeistelPermutation(100, seed=8)(i) for i in range(100)]
+
+        self.assertNotEqual(first, second)
+
+    def test_position_out_of_range_raises_IndexError(self):
+        with self.assertRaises(IndexError):
+            FeistelPermutation(10, seed=1)(10)
+
+
+class TestPublishedIds(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        common_setup(cls)
+
+    def setUp(self):
+        cache.clear()
+        self.published_ids = PublishedIds()
+
+    def test_ids_of_published_products_are_sorted(self):
+        self.assertEqual(list(self.published_ids.get()), sorted(p.pk for p in self.available_products))
+
+    def test_ids_are_loaded_once(self):
+        self.published_ids.get()
+
+        with self.assertNumQueries(0):
+            self.published_ids.get()
+
+    def test_ids_are_reloaded_after_product_changes(self):
+        self.published_ids.get()
+        product = self.available_products[0]
+        product.published_at = now() + datetime.timedelta(hours=1)
+        product.save()
+
+        self.assertNotIn(product.pk, self.published_ids.get())
+
+    def test_ids_are_reloaded_when_next_product_gets_published(self):
+        product = self.available_products[0]
+        Product.objects.filter(pk=product.pk).update(published_at=now() + datetime.timedelta(seconds=1))
+        self.assertNotIn(product.pk, self.published_ids.get())
+
+        Product.objects.filter(pk=product.pk).update(published_at=now() - datetime.timedelta(seconds=1))
+        self.published_ids._expires_at = now()
+
+        self.assertIn(product.pk, self.published_ids.get())
@@ -1,9 +1,18 @@
+from io import StringIO
+
 from .common_setup import common_setup
 
+from django.core.management import call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
 from catalog.models import Category, Product
-from ..search import SearchCategory, SearchCatalog, SearchBase
+from ..pagination import KeysetPaginator
+from ..search import SearchCategory, SearchCatalog, SearchBase, QueryPlanner
+from ..search_index import ProductSearchIndex
 
 
 class TestSearchBase(TestCase):
@@ -111,3 +120,268 @@ class TestSearchCatalog(TestCase):
                 self.assertTrue(False)
 
 
+
+    def test_number_of_queries_does_not_depend_on_number_of_categories(self):
+        search_engine = SearchCatalog()
+
+        with self.assertNumQueries(3):
+            result = search_engine.filter('i')
+
+        self.assertEqual(len(result), 2)
+
+    def test_first_found_products_belong_to_their_category(self):
+        search_engine = SearchCatalog(show_first=2)
+
+        result = search_engine.filter('e')
+
+        for entry in result:
+            with self.subTest(category=entry.category.name):
+                self.assertLessEqual(len(entry.first_found_products), 2)
+                for p in entry.first_found_products:
+                    self.assertEqual(p.category_id, entry.category.pk)
+
+    def test_product_moved_between_queries_is_skipped(self):
+        product = self.available_products[0]
+        moving = False
+
+        def move_before_first_products_query(execute, sql, params, many, context):
+            nonlocal moving
+            if 'ROW_NUMBER' in sql and not moving:
+                moving = True
+                Product.objects.filter(pk=product.pk).update(category=self.available_categories[1])
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(move_before_first_products_query):
+            result = SearchCatalog().filter('galaxy')
+
+        self.assertEqual(result, [])
+
+
+class TestProductSearchIndex(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        common_setup(cls)
+
+    def setUp(self):
+        if not ProductSearchIndex.is_available():
+            self.skipTest('full-text index requires SQLite with FTS5')
+
+    def search(self, query, fields=('name', 'manufacturer', 'description')):
+        return set(SearchBase(list(fields))._filter(query, Product.objects.all()))
+
+    def test_long_tokens_are_searched_with_index(self):
+        qs = SearchBase(['name'])._filter('choice', Product.objects.all())
+
+        self.assertIn('MATCH', str(qs.query))
+        self.assertEqual(list(qs), [self.available_products[5]])
+
+    def test_index_finds_same_products_as_icontains(self):
+        for query in ['CHOICE', 'ergonomic', 'description', 'Bony cool', 'est']:
+            with self.subTest(query=query):
+                expected = set()
+                for token in query.split():
+                    for field in ['name', 'manufacturer', 'description']:
+                        expected |= set(Product.objects.filter(**{field + '__icontains': token}))
+                self.assertEqual(self.search(query), expected)
+
+    def test_index_searches_only_requested_fields(self):
+        self.assertEqual(self.search('Banana', fields=['name']), set())
+        self.assertEqual(self.search('Banana', fields=['manufacturer']), {self.available_products[2]})
+
+    def test_short_and_long_tokens_are_combined_with_or_logic(self):
+        result = self.search('M8 galaxy', fields=['name'])
+
+        self.assertEqual(result, {self.available_products[0], self.available_products[4]})
+
+    def test_index_is_updated_on_save_and_delete(self):
+        product = self.available_products[0]
+        product.name = 'Nebula'
+        product.save()
+
+        self.assertEqual(self.search('nebula', fields=['name']), {product})
+        self.assertEqual(self.search('galaxy', fields=['name']), set())
+
+        product.delete()
+        self.assertEqual(self.search('nebula', fields=['name']), set())
+
+    def test_rebuild_command_restores_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {ProductSearchIndex.table}({ProductSearchIndex.table}) VALUES('delete-all')")
+        self.assertEqual(self.search('galaxy'), set())
+
+        call_command('rebuild_search_index', stdout=StringIO())
+
+        self.assertEqual(self.search('galaxy'), {self.available_products[0]})
+
+    def test_triggers_dropped_by_migration_are_created_after_migrate(self):
+        with connection.cursor() as cursor:
+            for name in ProductSearchIndex.triggers:
+                cursor.execute(f'DROP TRIGGER {name}')
+        Product.objects.filter(pk=self.available_products[0].pk).update(name='Nebula')  # not seen by index
+
+        emit_post_migrate_signal(verbosity=0, interactive=False, db='default')
+
+        self.assertEqual(self.search('nebula', fields=['name']), {self.available_products[0]})
+        product = self.available_products[1]
+        product.name = 'Quasar'
+        product.save()
+        self.assertEqual(self.search('quasar', fields=['name']), {product})
+
+    def test_existing_triggers_are_kept(self):
+        emit_post_migrate_signal(verbosity=0, interactive=False, db='default')
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'catalog_product'")
+            self.assertEqual(cursor.fetchone()[0], len(ProductSearchIndex.triggers))
+
+
+class TestRankedSearch(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        common_setup(cls)
+
+    def setUp(self):
+        if not ProductSearchIndex.is_available():
+            self.skipTest('full-text index requires SQLite with FTS5')
+
+    def test_name_match_is_ranked_above_description_match(self):
+        product = self.available_products[4]
+        product.description = 'Much better than Galaxy'
+        product.save()
+
+        qs = SearchBase(['name', 'description'], ranked=True)._filter('galaxy', Product.objects.all())
+
+        self.assertEqual(list(qs), [self.available_products[0], product])
+
+    def test_products_matching_more_tokens_go_first(self):
+        qs = SearchBase(['name'], ranked=True)._filter('freeze one', Product.objects.all())
+
+        self.assertEqual(list(qs)[0], self.available_products[3])
+
+    def test_products_found_by_short_tokens_go_last(self):
+        qs = SearchBase(['name'], ranked=True)._filter('M8 choice', Product.objects.all())
+
+        self.assertEqual(list(qs), [self.available_products[5], self.available_products[4]])
+
+    def test_ranking_is_done_in_single_query(self):
+        qs = SearchBase(['name'], ranked=True)._filter('galaxy call', Product.objects.all())
+
+        with self.assertNumQueries(1):
+            list(qs)
+
+    def test_catalog_shows_most_relevant_products_first(self):
+        other_phone = self.available_products[0]
+        other_phone.name = 'Galaxy Son'
+        other_phone.save()
+        phone = self.available_products[1]
+        phone.name = 'Erick Son One'
+        phone.save()
+
+        result = SearchCatalog(show_first=1, ranked=True).filter('son erick')
+
+        phones = [entry for entry in result if entry.category.name == 'phones']
+        self.assertEqual(phones[0].found, 2)
+        self.assertEqual(phones[0].first_found_products, [phone])
+
+
+class TestRankedSearchOfManyProducts(TestCase):
+    """ Rank of every matched product must be looked up, not computed by a MATCH of its own """
+    found = 2000
+
+    @classmethod
+    def setUpTestData(cls):
+        common_setup(cls)
+        product = cls.available_products[0]
+        Product.objects.bulk_create([
+            Product(name=f'Red garland {i}', manufacturer='Shine', description='Lights', price=10 + i % 50,
+                    discount_percent=0, units_available=1, category=product.category,
+                    details_content_type=product.details_content_type, details_id=product.details_id,
+                    published_at=product.published_at)
+            for i in range(cls.found)
+        ])
+
+    def setUp(self):
+        if not ProductSearchIndex.can_rank(['name']):
+            self.skipTest('ranking requires SQLite 3.35 with FTS5')
+
+    def assertRanksAreLookedUp(self, sql: str):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            plan = [row[-1] for row in cursor.fetchall()]
+
+        rank_steps = [step for step in plan if 'search_ranks' in step]
+        self.assertTrue(rank_steps)
+        for step in rank_steps:
+            self.assertTrue(step.startswith('MATERIALIZE') or 'INDEX' in step, plan)
+
+    def test_category_pages_look_ranks_up(self):
+        qs = SearchCategory(['name'], ranked=True).filter('garland', Product.published.all())
+        paginator = KeysetPaginator(['search_rank', 'pk'], 24)
+        cursor = paginator.paginate(qs).next_cursor
+
+        for page_qs in [qs, qs.filter(paginator.get_after_Q(paginator.decode_cursor(cursor)))]:
+            with self.subTest(cursor=page_qs is not qs):
+                with CaptureQueriesContext(connection) as context:
+                    self.assertEqual(len(page_qs[:24]), 24)
+                self.assertRanksAreLookedUp(context.captured_queries[0]['sql'])
+
+    def test_catalog_looks_ranks_up(self):
+        with CaptureQueriesContext(connection) as context:
+            result = SearchCatalog(ranked=True).filter('garland')
+
+        self.assertEqual(len(context), 3)
+        self.assertEqual(result[0].found, self.found)
+        self.assertRanksAreLookedUp(context.captured_queries[-1]['sql'])
+
+
+class TestQueryPlanner(TestCase):
+    def setUp(self):
+        self.planner = QueryPlanner()
+
+    def test_duplicates_are_dropped_ignoring_case(self):
+        self.assertEqual(self.planner.plan('red Garland garland RED'), ['red', 'Garland'])
+
+    def test_stop_words_and_short_tokens_are_dropped(self):
+        self.assertEqual(self.planner.plan('garland for the tree x'), ['garland', 'tree'])
+
+    def test_short_tokens_are_kept_if_nothing_else_left(self):
+        self.assertEqual(self.planner.plan('i the'), ['i', 'the'])
+
+    def test_too_many_tokens_are_rejected(self):
+        with self.assertRaises(QueryPlanner.QueryRejected):
+            self.planner.plan(' '.join(f'word{i}' for i in range(QueryPlanner.max_tokens + 1)))
+
+    def test_too_long_query_is_rejected(self):
+        with self.assertRaises(QueryPlanner.QueryRejected):
+            self.planner.plan('lights ' * 300)
+
+    def test_too_long_token_is_rejected(self):
+        with self.assertRaises(QueryPlanner.QueryRejected):
+            self.planner.plan('a' * (QueryPlanner.max_token_length + 1))
+
+    def test_non_printable_characters_are_rejected(self):
+        with self.assertRaises(QueryPlanner.QueryRejected):
+            self.planner.plan('garland\x00')
+
+
+class TestSearchViewsRejectExpensiveQueries(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        common_setup(cls)
+
+    def test_search_view_responds_with_400(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('search'), {'q': 'lights ' * 300})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_category_view_responds_with_400(self):
+        response = self.client.get(reverse('category', kwargs={'slug': self.available_categories[0].slug}),
+                                   {'q': ' '.join(f'word{i}' for i in range(QueryPlanner.max_tokens + 1))})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_search_base_searches_planned_tokens(self):
+        qs = SearchBase(['name'])._filter('the Galaxy galaxy of', Product.objects.all())
+
+        self.assertEqual(list(qs), [self.available_products[0]])
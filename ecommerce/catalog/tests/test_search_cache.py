@@ -0,0 +1,100 @@
+from unittest import mock
+
+from .common_setup import common_setup
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from ..search import SearchCatalog
+from ..search_cache import SearchResultsCache, search_results_cache
+from ..versions import catalog_version
+
+
+class TestSearchResultsCache(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        common_setup(cls)
+
+    def setUp(self):
+        cache.clear()
+        self.cache = SearchResultsCache(max_size=2)
+
+    def test_queries_with_same_tokens_share_entry(self):
+        results = self.cache.get_or_search('Galaxy icall', SearchCatalog())
+
+        with self.assertNumQueries(0):
+            self.assertIs(self.cache.get_or_search('ICALL galaxy  galaxy', SearchCatalog()), results)
+
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+    def test_search_parameters_are_part_of_key(self):
+        self.cache.get_or_search('galaxy', SearchCatalog(show_first=1))
+        self.cache.get_or_search('galaxy', SearchCatalog(show_first=2))
+
+        self.assertEqual(self.cache.stats()['misses'], 2)
+
+    def test_empty_query_raises_NoQuerySpecified(self):
+        with self.assertRaises(SearchCatalog.NoQuerySpecified):
+            self.cache.get_or_search('  ', SearchCatalog())
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.cache.get_or_search('galaxy', SearchCatalog())
+        self.cache.get_or_search('freeze', SearchCatalog())
+        self.cache.get_or_search('galaxy', SearchCatalog())
+        self.cache.get_or_search('choice', SearchCatalog())
+
+        self.assertEqual(self.cache.stats()['size'], 2)
+        self.cache.get_or_search('galaxy', SearchCatalog())
+        self.assertEqual(self.cache.stats()['hits'], 2)
+        self.cache.get_or_search('freeze', SearchCatalog())
+        self.assertEqual(self.cache.stats()['misses'], 4)
+
+    def test_expired_entry_is_recomputed(self):
+        self.cache.get_or_search('galaxy', SearchCatalog())
+
+        with mock.patch('catalog.search_cache.time.monotonic', return_value=10 ** 9):
+            self.cache.get_or_search('galaxy', SearchCatalog())
+
+        self.assertEqual(self.cache.stats()['misses'], 2)
+
+    def test_saving_product_invalidates_entries(self):
+        self.assertEqual(self.cache.get_or_search('nebula', SearchCatalog(fuzzy=False)), [])
+
+        product = self.available_products[0]
+        product.name = 'Nebula'
+        product.save()
+
+        results = self.cache.get_or_search('nebula', SearchCatalog(fuzzy=False))
+        self.assertEqual(results[0].first_found_products, [product])
+
+    def test_lost_version_is_not_reused(self):
+        version = catalog_version.get()
+        cache.clear()
+
+        self.assertNotEqual(catalog_version.get(), version)
+
+
+class TestSearchViewCache(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        common_setup(cls)
+
+    def setUp(self):
+        cache.clear()
+        search_results_cache.clear()
+
+    def test_repeated_search_is_served_from_cache(self):
+        self.client.get(reverse('search'), {'q': 'galaxy'})
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('search'), {'q': 'Galaxy'})
+
+        self.assertContains(response, 'Galaxy W')
+        self.assertEqual(search_results_cache.stats()['hits'], 1)
+
+    def test_missing_query_produces_400_status_code(self):
+        response = self.client.get(reverse('search'))
+
+        self.assertEqual(response.status_code, 400)
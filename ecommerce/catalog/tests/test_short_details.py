@@ -0,0 +1,65 @@
+from io import StringIO
+
+from .common_setup import common_setup
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from catalog.models import Product
+
+
+class TestShortDetails(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        common_setup(cls)
+
+    def test_new_product_gets_short_details(self):
+        product = Product.objects.get(pk=self.available_products[0].pk)
+
+        self.assertEqual(product.short_details, self.available_details[0].get_short_details())
+        self.assertEqual(product.short_details, 'red/980x620/2.0GB')
+
+    def test_saving_details_updates_products(self):
+        details = self.available_details[0]
+        details.color = 'green'
+        details.save()
+
+        self.assertEqual(Product.objects.get(pk=self.available_products[0].pk).short_details, 'green/980x620/2.0GB')
+
+    def test_product_pointed_to_other_details_is_updated(self):
+        product = Product.objects.get(pk=self.available_products[0].pk)
+        product.details_object = self.available_details[1]
+        product.save()
+
+        self.assertEqual(Product.objects.get(pk=product.pk).short_details, 'purple/1980x720/1.0GB')
+
+    def test_saving_product_does_not_load_details(self):
+        product = Product.objects.get(pk=self.available_products[0].pk)
+        product.units_available = 10
+
+        with CaptureQueriesContext(connection) as context:
+            product.save()
+
+        for query in context.captured_queries:
+            self.assertNotIn('catalog_test_app_phonedetails', query['sql'])
+
+    def test_backfill_command_fixes_stale_values(self):
+        Product.objects.update(short_details='stale')
+
+        out = StringIO()
+        call_command('backfill_short_details', batch_size=2, stdout=out)
+
+        self.assertIn('6 products', out.getvalue())
+        for p in self.available_products:
+            self.assertEqual(Product.objects.get(pk=p.pk).short_details, p.details_object.get_short_details())
+
+    def test_category_view_does_not_load_details(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('category', kwargs={'slug': 'phones'}))
+
+        self.assertContains(response, '[red/980x620/2.0GB]')
+        for query in context.captured_queries:
+            self.assertNotIn('FROM "catalog_test_app_phonedetails"', query['sql'])
@@ -0,0 +1,253 @@
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from ..tiered_cache import TieredCache
+
+
+class TestTieredCache(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.tiers = TieredCache('test:tiers')
+        self.computed = 0
+
+    def compute(self, value='value', delay=0.0):
+        def compute():
+            time.sleep(delay)
+            self.computed += 1
+            return [value]
+        return compute
+
+    def test_value_is_computed_once(self):
+        self.assertEqual(self.tiers.get_or_compute('key', self.compute(), 60), ['value'])
+        self.assertEqual(self.tiers.get_or_compute('key', self.compute(), 60), ['value'])
+
+        self.assertEqual(self.computed, 1)
+        stats = self.tiers.stats()
+        self.assertEqual(stats['local']['hits'], 1)
+        self.assertEqual(stats['shared']['misses'], 1)
+        self.assertEqual(stats['recomputes'], 1)
+
+    def test_shared_tier_is_used_by_other_processes(self):
+        self.tiers.get_or_compute('key', self.compute(), 60)
+        other = TieredCache('test:tiers')
+
+        self.assertEqual(other.get_or_compute('key', self.compute('other'), 60), ['value'])
+
+        self.assertEqual(self.computed, 1)
+        self.assertEqual(other.stats()['shared']['hits'], 1)
+
+    def test_every_get_returns_new_copy(self):
+        self.tiers.get_or_compute('key', self.compute(), 60).append('changed')
+
+        self.assertEqual(self.tiers.get_or_compute('key', self.compute(), 60), ['value'])
+
+    def test_delete_drops_local_tiers_of_other_processes(self):
+        other = TieredCache('test:tiers')
+        other.get_or_compute('key', self.compute(), 60)
+
+        self.tiers.delete('key')
+
+        self.assertEqual(other.get_or_compute('key', self.compute('new'), 60), ['new'])
+
+    def test_timeout_function_is_called_after_compute(self):
+        self.tiers.get_or_compute('key', self.compute(), lambda: 0)
+
+        self.assertEqual(self.tiers.get_or_compute('key', self.compute('new'), 60), ['new'])
+
+    def test_only_one_process_recomputes_missing_value(self):
+        holder = TieredCache('test:tiers')
+        thread = threading.Thread(target=holder.get_or_compute, args=('key', self.compute(delay=0.2), 60))
+        thread.start()
+        time.sleep(0.05)
+
+        value = self.tiers.get_or_compute('key', self.compute('waiter'), 60)
+        thread.join()
+
+        self.assertEqual(value, ['value'])
+        self.assertEqual(self.computed, 1)
+        self.assertEqual(self.tiers.stats()['lock_waits'], 1)
+
+    def test_value_is_recomputed_if_lock_is_not_released(self):
+        self.tiers.lock_timeout = 0.1
+        cache.add(self.tiers.lock_key('key'), True, 60)
+
+        self.assertEqual(self.tiers.get_or_compute('key', self.compute(), 60), ['value'])
+
+    def test_value_stored_right_before_lock_is_released_is_not_recomputed(self):
+        holder = TieredCache('test:tiers')
+        cache.add(self.tiers.lock_key('key'), True, 60)
+        get = cache.get
+
+        def get_while_holder_finishes(key, *args, **kwargs):
+            if key == self.tiers.lock_key('key') and self.computed == 0:  # after value was found missing
+                holder._recompute('key', holder.version.get(), self.compute('holder'), 60)
+                cache.delete(key)
+            return get(key, *args, **kwargs)
+
+        with mock.patch.object(cache, 'get', get_while_holder_finishes), \
+                mock.patch.object(self.tiers, '_recompute_locked', wraps=self.tiers._recompute_locked) as locked:
+            value = self.tiers.get_or_compute('key', self.compute('waiter'), 60)
+
+        self.assertEqual(value, ['holder'])
+        self.assertEqual(self.computed, 1)
+        self.assertEqual(locked.call_count, 1)
+
+    def test_value_stored_before_lock_is_taken_is_not_recomputed(self):
+        holder = TieredCache('test:tiers')
+        add = cache.add
+
+        def add_after_holder_finished(key, *args, **kwargs):
+            if key == self.tiers.lock_key('key') and self.computed == 0:
+                holder._recompute('key', holder.version.get(), self.compute('holder'), 60)
+            return add(key, *args, **kwargs)
+
+        with mock.patch.object(cache, 'add', add_after_holder_finished):
+            value = self.tiers.get_or_compute('key', self.compute('waiter'), 60)
+
+        self.assertEqual(value, ['holder'])
+        self.assertEqual(self.computed, 1)
+
+    def test_only_one_waiter_recomputes_after_lock_expires(self):
+        cache.add(self.tiers.lock_key('key'), True, 0.1)  # holder hung
+        values = []
+
+        def get():
+            waiter = TieredCache('test:tiers', lock_timeout=0.1, wait_interval=0.01)
+            values.append(waiter.get_or_compute('key', self.compute(delay=0.02), 60))
+
+        threads = [threading.Thread(target=get) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(values, [['value']] * 4)
+        self.assertEqual(self.computed, 1)
+
+    def test_value_is_recomputed_early(self):
+        self.tiers.beta = 10 ** 9
+        self.tiers.get_or_compute('key', self.compute(delay=0.01), 60)
+
+        self.assertEqual(self.tiers.get_or_compute('key', self.compute('new'), 60), ['new'])
+        self.assertEqual(self.tiers.stats()['early_recomputes'], 1)
+
+    def test_early_recomputes_can_be_disabled(self):
+        self.tiers.beta = 0
+        self.tiers.get_or_compute('key', self.compute(delay=0.01), 60)
+
+        self.assertEqual(self.tiers.get_or_compute('key', self.compute('new'), 60), ['value'])
+
+    def test_recompute_times_are_reported(self):
+        self.tiers.get_or_compute('key', self.compute(delay=0.01), 60)
+
+        stats = self.tiers.stats()
+        self.assertGreaterEqual(stats['avg_recompute_seconds'], 0.01)
+        self.assertGreaterEqual(stats['max_recompute_seconds'], 0.01)
+
+
+SHARED_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'ecommerce_cache'}}
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class TestTieredCacheWithSharedBackend(TestCase):
+    """ Instances stand for processes, they share only Django cache """
+    @classmethod
+    def setUpTestData(cls):
+        call_command('createcachetable', verbosity=0)
+
+    def setUp(self):
+        self.computed = 0
+
+    def compute(self, value='value'):
+        def compute():
+            self.computed += 1
+            return [value]
+        return compute
+
+    def test_shared_tier_is_used_by_other_processes(self):
+        TieredCache('test:tiers').get_or_compute('key', self.compute(), 60)
+
+        self.assertEqual(TieredCache('test:tiers').get_or_compute('key', self.compute('other'), 60), ['value'])
+        self.assertEqual(self.computed, 1)
+
+    def test_delete_drops_local_tiers_of_other_processes(self):
+        other = TieredCache('test:tiers')
+        other.get_or_compute('key', self.compute(), 60)
+
+        TieredCache('test:tiers').delete('key')
+
+        self.assertEqual(other.get_or_compute('key', self.compute('new'), 60), ['new'])
+
+    def test_lock_is_seen_by_other_processes(self):
+        waiter = TieredCache('test:tiers', lock_timeout=0.1)
+        holder = TieredCache('test:tiers')
+
+        def compute_while_other_process_asks():
+            return waiter.get_or_compute('key', self.compute('waiter'), 60)
+
+        holder.get_or_compute('key', compute_while_other_process_asks, 60)
+
+        # holder waits for the waiter, so its lock is held during every attempt
+        self.assertEqual(waiter.stats()['lock_waits'], TieredCache.LOCK_ATTEMPTS)
+
+
+WORKER = '''
+import sys, time
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+
+database, log, mode = sys.argv[1:]
+settings.configure(
+    DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': database, 'OPTIONS': {'timeout': 30}}},
+    CACHES=%r,
+)
+django.setup()
+if mode == 'setup':
+    call_command('createcachetable', verbosity=0)
+    sys.exit()
+
+from catalog.tiered_cache import TieredCache
+
+
+def compute():
+    with open(log, 'a') as f:
+        f.write('computed\\n')
+    time.sleep(2)
+    return 'value'
+
+
+print(TieredCache('test:tiers', wait_interval=0.01).get_or_compute('key', compute, 60))
+''' % SHARED_CACHES
+
+
+class TestTieredCacheAcrossProcesses(SimpleTestCase):
+    def test_only_one_process_recomputes_missing_value(self):
+        with tempfile.TemporaryDirectory() as directory:
+            database, log = os.path.join(directory, 'cache.sqlite3'), os.path.join(directory, 'computes.log')
+            cwd = settings.BASE_DIR
+
+            def run(mode):
+                return subprocess.Popen([sys.executable, '-c', WORKER, database, log, mode],
+                                        cwd=cwd, stdout=subprocess.PIPE, text=True)
+
+            run('setup').wait()
+            workers = [run('work') for _ in range(4)]
+            outputs = [worker.communicate(timeout=60)[0].strip() for worker in workers]
+
+            with open(log) as f:
+                computes = f.read().count('computed')
+
+        self.assertEqual(outputs, ['value'] * 4)
+        self.assertEqual(computes, 1)
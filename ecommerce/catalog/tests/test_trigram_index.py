@@ -0,0 +1,116 @@
+from .common_setup import common_setup
+
+from django.test import TestCase
+
+from catalog.models import Category, Product
+from ..search import SearchCatalog
+from ..trigram_index import TrigramIndex, trigram_index
+from ..versions import catalog_version
+
+
+class TestTrigramIndex(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        common_setup(cls)
+
+    def setUp(self):
+        self.index = TrigramIndex()
+
+    def test_trigrams_of_words_are_padded(self):
+        self.assertEqual(TrigramIndex.trigrams('Ab c'), {'  a', ' ab', 'ab ', '  c', ' c '})
+
+    def test_misspelled_name_is_found(self):
+        for query, product in [('galxy', 0), ('freez', 3), ('Shansong', 0), ('ICAL', 2)]:
+            with self.subTest(query=query):
+                ranked = self.index.search(query)
+                self.assertEqual(ranked[0][0], self.available_products[product].pk)
+
+    def test_products_are_ranked_by_similarity(self):
+        ranked = self.index.search('choice one')
+        similarities = [similarity for _, similarity in ranked]
+
+        self.assertEqual(similarities, sorted(similarities, reverse=True))
+        self.assertEqual(ranked[0][0], self.available_products[5].pk)
+
+    def test_dissimilar_query_finds_nothing(self):
+        self.assertEqual(self.index.search('xyzzy'), [])
+
+    def test_index_is_loaded_once(self):
+        self.index.search('galaxy')
+
+        with self.assertNumQueries(0):
+            self.index.search('freeze')
+
+    def test_index_is_updated_incrementally(self):
+        self.index.ensure_loaded()
+        product = self.available_products[0]
+        product.name = 'Nebula'
+        self.index.upsert(product)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.index.search('nebla')[0][0], product.pk)
+            self.assertNotIn(product.pk, [pk for pk, _ in self.index.search('galaxy')])
+
+        self.index.remove(product.pk)
+        self.assertEqual(self.index.search('nebla'), [])
+
+    def test_index_is_reloaded_after_write_of_other_process(self):
+        self.index.ensure_loaded()
+        product = self.available_products[0]
+        Product.objects.filter(pk=product.pk).update(name='Nebula')  # saved by other process,
+        catalog_version.bump()  # which bumps shared version only
+
+        self.assertEqual(self.index.search('nebla')[0][0], product.pk)
+
+    def test_index_size_is_bounded(self):
+        self.index.max_products = 2
+        self.index.load()
+        self.assertEqual(len(self.index), 2)
+
+        self.index.upsert(Product.objects.exclude(pk__in=self.index.documents).first())
+        self.assertEqual(len(self.index), 2)
+
+    def test_memory_usage_grows_with_products(self):
+        self.index.max_products = 1
+        self.index.load()
+        small = self.index.memory_usage()
+
+        self.index.max_products = 6
+        self.index.load()
+        self.assertGreater(self.index.memory_usage(), small)
+
+
+class TestSearchCatalogFuzzy(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        common_setup(cls)
+
+    def setUp(self):
+        trigram_index.drop()
+
+    def test_similar_products_are_found_when_nothing_matches(self):
+        result = SearchCatalog().filter('galxy')
+
+        self.assertEqual(len(result), 1)
+        self.assertTrue(result[0].fuzzy)
+        self.assertFalse(result[0].whole_category)
+        self.assertEqual(result[0].category, Category.objects.get(name='phones'))
+        self.assertEqual(result[0].first_found_products[0], self.available_products[0])
+
+    def test_exact_matches_are_not_fuzzy(self):
+        result = SearchCatalog().filter('galaxy')
+
+        self.assertFalse(result[0].fuzzy)
+
+    def test_fuzzy_search_can_be_disabled(self):
+        self.assertEqual(SearchCatalog(fuzzy=False).filter('galxy'), [])
+
+    def test_saved_products_are_searched(self):
+        trigram_index.ensure_loaded()
+        product = self.available_products[3]
+        product.name = 'Glacier'
+        product.save()
+
+        result = SearchCatalog().filter('glaicer')
+
+        self.assertEqual(result[0].first_found_products, [product])
@@ -0,0 +1,196 @@
+import math
+import pickle
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Union
+
+from django.core.cache import cache
+
+from .versions import SharedVersion
+
+
+class TieredCache:
+    """ Process-local LRU tier in front of Django cache tier.
+        Only one process recomputes a missing value: it takes a lock key with cache.add, others wait for the value
+        and take the lock in turn if it is released or expires without the value.
+        Values are recomputed before they expire with probability growing towards expiry and with time
+        the last recompute took (XFetch), so entries of hot keys do not expire in every process at once.
+        Local tier keeps pickled values, so every get returns a new copy, just like Django cache does.
+        Deleting a key drops local tiers of every process: they check shared version of the namespace on every get.
+        Locks and versions are shared only if Django cache is shared by processes (see CACHES in settings).
+    """
+    LOCKED = object()  # recompute is made by someone else
+    LOCK_ATTEMPTS = 3  # waiters recompute without the lock only if it is still held after that many waits
+
+    def __init__(self, namespace: str, max_size: int = 256, local_timeout: float = 30, beta: float = 1.0,
+                 lock_timeout: float = 10, wait_interval: float = 0.05):
+        """ :param local_timeout: seconds values are kept in local tier, never longer than in Django cache
+            :param beta: > 1 favours earlier recomputes, 0 disables them
+            :param lock_timeout: seconds the lock is held and other processes wait for a recompute before they try
+                                 to take the lock themselves
+        """
+        self.namespace = namespace
+        self.max_size = max_size
+        self.local_timeout = local_timeout
+        self.beta = beta
+        self.lock_timeout = lock_timeout
+        self.wait_interval = wait_interval
+        self.version = SharedVersion(f'{namespace}:version')
+        self._entries: OrderedDict = OrderedDict()  # key -> (version, local_expires_at, shared entry)
+        self._lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self) -> None:
+        self._stats = {
+            'local': {'hits': 0, 'misses': 0},
+            'shared': {'hits': 0, 'misses': 0},
+            'recomputes': 0,
+            'early_recomputes': 0,
+            'recompute_seconds': 0.0,
+            'max_recompute_seconds': 0.0,
+            'lock_waits': 0,
+        }
+
+    def _count(self, tier: str, result: str) -> None:
+        with self._lock:
+            self._stats[tier][result] += 1
+
+    def shared_key(self, key: str) -> str:
+        return f'{self.namespace}:{key}'
+
+    def lock_key(self, key: str) -> str:
+        return f'{self.namespace}:lock:{key}'
+
+    def _should_recompute_early(self, entry: tuple) -> bool:
+        """ XFetch: recompute if now - delta * beta * log(rand) >= expires_at """
+        _, delta, expires_at = entry
+        return time.time() - delta * self.beta * math.log(1 - random.random()) >= expires_at
+
+    def _get_local(self, key: str, version: int) -> Optional[tuple]:
+        with self._lock:
+            local = self._entries.get(key)
+            if local is None or local[0] != version or local[1] <= time.monotonic():
+                return None
+            self._entries.move_to_end(key)
+            return local[2]
+
+    def _set_local(self, key: str, version: int, entry: tuple) -> None:
+        local_timeout = min(self.local_timeout, entry[2] - time.time())
+        with self._lock:
+            self._entries[key] = (version, time.monotonic() + local_timeout, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _recompute(self, key: str, version: int, compute: Callable[[], object],
+                   timeout: Union[float, Callable[[], float]]) -> object:
+        started = time.monotonic()
+        value = compute()
+        delta = time.monotonic() - started
+
+        timeout = timeout() if callable(timeout) else timeout
+        entry = (pickle.dumps(value), delta, time.time() + timeout)
+        cache.set(self.shared_key(key), entry, timeout)
+        self._set_local(key, version, entry)
+
+        with self._lock:
+            self._stats['recomputes'] += 1
+            self._stats['recompute_seconds'] += delta
+            self._stats['max_recompute_seconds'] = max(self._stats['max_recompute_seconds'], delta)
+        return value
+
+    def _recompute_locked(self, key: str, version: int, compute: Callable[[], object],
+                          timeout: Union[float, Callable[[], float]], missing: bool = False) -> object:
+        """ Recomputes value if no other process does, returns LOCKED otherwise
+            :param missing: value was missing, it is returned without recompute if the previous holder of the lock
+                            has stored it in the meantime
+        """
+        if not cache.add(self.lock_key(key), True, self.lock_timeout):
+            return self.LOCKED
+        try:
+            if missing:
+                entry = cache.get(self.shared_key(key))
+                if entry is not None:
+                    self._set_local(key, version, entry)
+                    return pickle.loads(entry[0])
+            return self._recompute(key, version, compute, timeout)
+        finally:
+            cache.delete(self.lock_key(key))
+
+    def _wait_for_shared(self, key: str) -> Optional[tuple]:
+        """ Shared entry stored by holder of the lock, None if the lock is released or expires without it """
+        with self._lock:
+            self._stats['lock_waits'] += 1
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.wait_interval)
+            entry = cache.get(self.shared_key(key))
+            if entry is not None:
+                return entry
+            if cache.get(self.lock_key(key)) is None:
+                # value may be stored and the lock released between the two reads
+                return cache.get(self.shared_key(key))
+        return None
+
+    def get_or_compute(self, key: str, compute: Callable[[], object],
+                       timeout: Union[float, Callable[[], float]]) -> object:
+        """ :param timeout: seconds value is kept in Django cache, or function returning them called after compute """
+        version = self.version.get()
+
+        entry = self._get_local(key, version)
+        self._count('local', 'misses' if entry is None else 'hits')
+        if entry is None:
+            entry = cache.get(self.shared_key(key))
+            self._count('shared', 'misses' if entry is None else 'hits')
+            if entry is not None:
+                self._set_local(key, version, entry)
+
+        if entry is not None:
+            if self._should_recompute_early(entry):
+                value = self._recompute_locked(key, version, compute, timeout)
+                if value is not self.LOCKED:
+                    with self._lock:
+                        self._stats['early_recomputes'] += 1
+                    return value
+            return pickle.loads(entry[0])
+
+        # a lock of hung holder expires while others wait, then one of them takes it
+        for _ in range(self.LOCK_ATTEMPTS):
+            value = self._recompute_locked(key, version, compute, timeout, missing=True)
+            if value is not self.LOCKED:
+                return value
+
+            entry = self._wait_for_shared(key)
+            if entry is not None:
+                self._set_local(key, version, entry)
+                return pickle.loads(entry[0])
+        return self._recompute(key, version, compute, timeout)  # lock is not expired by cache
+
+    def delete(self, *keys: str) -> None:
+        cache.delete_many([self.shared_key(key) for key in keys])
+        self.version.bump()
+
+    def clear_local(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._reset_stats()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {tier: dict(self._stats[tier]) for tier in ['local', 'shared']}
+            for tier in stats.values():
+                requests = tier['hits'] + tier['misses']
+                tier['hit_ratio'] = tier['hits'] / requests if requests else 0.0
+            recomputes = self._stats['recomputes']
+            return {
+                **stats,
+                'recomputes': recomputes,
+                'early_recomputes': self._stats['early_recomputes'],
+                'avg_recompute_seconds': self._stats['recompute_seconds'] / recomputes if recomputes else 0.0,
+                'max_recompute_seconds': self._stats['max_recompute_seconds'],
+                'lock_waits': self._stats['lock_waits'],
+                'size': len(self._entries),
+                'max_size': self.max_size,
+            }
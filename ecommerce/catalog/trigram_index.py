@@ -0,0 +1,132 @@
+import re
+import sys
+import threading
+from collections import defaultdict
+from typing import Dict, FrozenSet, List, Set, Tuple
+
+from .models import Product
+from .versions import catalog_version
+
+
+class TrigramIndex:
+    """ In-process index of character trigrams of product names and manufacturers for typo-tolerant search.
+        Every word is padded like in pg_trgm ('  word '), so beginnings and endings of words weigh more.
+        Products are ranked by share of query trigrams found in them, ties are broken by Jaccard similarity.
+        Index holds trigram sets only (no texts) of at most max_products products, memory_usage() estimates its size.
+        Index is kept per process and reloaded once catalog_version is bumped, so products saved by other processes
+        are found too.
+    """
+    max_products = 200_000
+    threshold = 0.5  # min share of query trigrams product must have
+
+    word_re = re.compile(r'\w+')
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.version = None  # catalog_version the index was loaded at, None if not loaded
+        self._reset()
+
+    def _reset(self) -> None:
+        self.postings: Dict[str, Set[int]] = defaultdict(set)  # trigram -> pks
+        self.documents: Dict[int, FrozenSet[str]] = dict()  # pk -> trigrams
+
+    def __len__(self):
+        return len(self.documents)
+
+    @classmethod
+    def trigrams(cls, text: str) -> FrozenSet[str]:
+        result = set()
+        for word in cls.word_re.findall(text.lower()):
+            padded = '  ' + word + ' '
+            result.update(sys.intern(padded[i:i + 3]) for i in range(len(padded) - 2))
+        return frozenset(result)
+
+    @staticmethod
+    def document_text(name: str, manufacturer: str) -> str:
+        return f'{name} {manufacturer}'
+
+    def load(self) -> None:
+        """ Reads most recently published products from DB, up to max_products """
+        version = catalog_version.get()  # read before rows, so writes made meanwhile make the index stale
+        rows = Product.objects.order_by('-published_at').values_list('pk', 'name', 'manufacturer')
+        with self.lock:
+            self._reset()
+            for pk, name, manufacturer in rows[:self.max_products]:
+                self._add(pk, self.trigrams(self.document_text(name, manufacturer)))
+            self.version = version
+
+    def ensure_loaded(self) -> None:
+        version = catalog_version.get()
+        if self.version != version:
+            with self.lock:
+                if self.version != version:
+                    self.load()
+
+    def drop(self) -> None:
+        with self.lock:
+            self._reset()
+            self.version = None
+
+    def upsert(self, product: Product) -> None:
+        """ Reindexes the product if index is loaded, new products are skipped when index is full """
+        with self.lock:
+            if self.version is None:
+                return
+            self._remove(product.pk)
+            if len(self.documents) < self.max_products:
+                self._add(product.pk, self.trigrams(self.document_text(product.name, product.manufacturer)))
+
+    def remove(self, pk: int) -> None:
+        with self.lock:
+            self._remove(pk)
+
+    def _add(self, pk: int, trigrams: FrozenSet[str]) -> None:
+        self.documents[pk] = trigrams
+        for trigram in trigrams:
+            self.postings[trigram].add(pk)
+
+    def _remove(self, pk: int) -> None:
+        trigrams = self.documents.pop(pk, None)
+        if trigrams is None:
+            return
+        for trigram in trigrams:
+            pks = self.postings[trigram]
+            pks.discard(pk)
+            if not pks:
+                del self.postings[trigram]
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[int, float]]:
+        """ Returns (pk, similarity) of at most limit most similar products, most similar go first """
+        self.ensure_loaded()
+        query_trigrams = self.trigrams(query)
+        if not query_trigrams:
+            return []
+
+        with self.lock:
+            common = defaultdict(int)
+            for trigram in query_trigrams:
+                for pk in self.postings.get(trigram, ()):
+                    common[pk] += 1
+
+            ranked = []
+            for pk, count in common.items():
+                similarity = count / len(query_trigrams)
+                if similarity >= self.threshold:
+                    jaccard = count / (len(query_trigrams) + len(self.documents[pk]) - count)
+                    ranked.append((-similarity, -jaccard, pk))
+
+        ranked.sort()
+        return [(pk, -similarity) for similarity, _, pk in ranked[:limit]]
+
+    def memory_usage(self) -> int:
+        """ Approximate size of the index in bytes """
+        with self.lock:
+            size = sys.getsizeof(self.postings) + sys.getsizeof(self.documents)
+            for trigram, pks in self.postings.items():
+                size += sys.getsizeof(trigram) + sys.getsizeof(pks)
+            for pk, trigrams in self.documents.items():
+                size += sys.getsizeof(pk) + sys.getsizeof(trigrams)
+            return size
+
+
+trigram_index = TrigramIndex()
@@ -0,0 +1,69 @@
+import threading
+import time
+
+from django.core.cache import cache
+from django.core.signals import request_started, request_finished
+
+
+# versions read during current request of the thread, None outside of requests
+_request_versions = threading.local()
+
+
+def _start_request(**kwargs):
+    _request_versions.values = dict()
+
+
+def _finish_request(**kwargs):
+    _request_versions.values = None
+
+
+request_started.connect(_start_request, dispatch_uid='catalog.versions.start_request')
+request_finished.connect(_finish_request, dispatch_uid='catalog.versions.finish_request')
+
+
+class SharedVersion:
+    """ Counter kept in Django cache, shared by every process. Process-local caches remember the version
+        their data was built for and drop the data once the version is bumped by someone.
+        Initial value is based on current time, so a version lost by cache eviction never comes back.
+    """
+    def __init__(self, key: str, per_request: bool = False):
+        """ :param per_request: read the version from cache at most once per request,
+            for versions checked on every access of process-local data. Bumps made by the request are still seen
+        """
+        self.key = key
+        self.per_request = per_request
+
+    def _request_values(self):
+        return getattr(_request_versions, 'values', None) if self.per_request else None
+
+    def get(self) -> int:
+        values = self._request_values()
+        if values is not None and self.key in values:
+            return values[self.key]
+
+        version = cache.get(self.key)
+        if version is None:
+            cache.add(self.key, time.time_ns(), timeout=None)
+            version = cache.get(self.key)
+        if version is None:  # cache does not store anything, e.g. DummyCache
+            version = time.time_ns()
+
+        if values is not None:
+            values[self.key] = version
+        return version
+
+    def bump(self) -> None:
+        values = self._request_values()
+        if values is not None:
+            values.pop(self.key, None)
+        try:
+            cache.incr(self.key)
+        except ValueError:  # key is missing
+            cache.add(self.key, time.time_ns(), timeout=None)
+
+
+# bumped on every change of products or categories, see catalog.signals
+catalog_version = SharedVersion('catalog:version', per_request=True)
+
+# bumped on every change of categories
+categories_version = SharedVersion('catalog:categories:version', per_request=True)
@@ -142,6 +142,30 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 MEDIA_URL = 'media/'
 
+# Shared by every process: catalog keeps versions, locks and cached entries there, see catalog.versions.
+# Create the table with `python manage.py createcachetable`, Redis or Memcached backends fit as well
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'ecommerce_cache',
+    }
+}
+
+# Categories (slugs) served by in-memory filter index, see catalog.filter_index
+CATALOG_FILTER_INDEX_CATEGORIES = []
+
+# Seconds product pages are cached for, 0 disables the cache, see catalog.product_cache
+CATALOG_PRODUCT_CACHE_TIMEOUT = 10 * 60
+
+# Seconds products and details are cached for, 0 disables the cache, see catalog.entity_cache
+CATALOG_ENTITY_CACHE_TIMEOUT = 10 * 60
+
+# Seconds results of CachingQuerySet.cached() are kept by default, 0 disables the cache, see catalog.query_cache
+CATALOG_QUERY_CACHE_TIMEOUT = 60
+
+# Seconds first pages of category listings are cached for, 0 disables the cache, see catalog.filter_cache
+CATALOG_LISTING_CACHE_TIMEOUT = 5 * 60
+
 # For django-debug-toolbar
 INTERNAL_IPS = [
     "127.0.0.1"
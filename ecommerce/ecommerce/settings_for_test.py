@@ -139,3 +139,25 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_ROOT = BASE_DIR / 'media'
 
 MEDIA_URL = 'media/'
+
+# Tests run in one process, catalog.tests.test_tiered_cache checks DatabaseCache used by settings
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Categories (slugs) served by in-memory filter index, see catalog.filter_index
+CATALOG_FILTER_INDEX_CATEGORIES = []
+
+# Seconds product pages are cached for, 0 disables the cache, see catalog.product_cache
+CATALOG_PRODUCT_CACHE_TIMEOUT = 0
+
+# Seconds products and details are cached for, 0 disables the cache, see catalog.entity_cache
+CATALOG_ENTITY_CACHE_TIMEOUT = 0
+
+# Seconds results of CachingQuerySet.cached() are kept by default, 0 disables the cache, see catalog.query_cache
+CATALOG_QUERY_CACHE_TIMEOUT = 0
+
+# Seconds first pages of category listings are cached for, 0 disables the cache, see catalog.filter_cache
+CATALOG_LISTING_CACHE_TIMEOUT = 0
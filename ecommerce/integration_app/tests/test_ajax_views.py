@@ -1,14 +1,19 @@
 import json
 
 from django import forms
+from django.conf import settings
+from django.core import signing
 from django.contrib.auth import get_user_model
 from django.urls import path, reverse_lazy, reverse
 from django.test import SimpleTestCase, override_settings, TestCase
 
+from catalog.autocomplete import autocomplete_dictionary
 from catalog.models import Product
+from catalog.random_feed import published_ids
 from catalog.tests.common_setup import common_setup
 from orders.models import Order, OrderProducts
 from ..ajax_views_classes import AJAXPostView, AJAXAuthRequiredMixin
+from ..views import GetRandomProductsView
 
 
 @override_settings(ROOT_URLCONF='integration_app.tests.test_ajax_views')
@@ -395,6 +400,16 @@ class TestGetRandomProductsView(TestCase):
 
             Product(**p).save()
 
+    def setUp(self):
+        published_ids.drop()
+
+    @staticmethod
+    def get_signer():
+        return signing.get_cookie_signer(salt=GetRandomProductsView.seed_cookie + GetRandomProductsView.seed_salt)
+
+    def get_seed(self):
+        return self.get_signer().unsign(self.client.cookies[GetRandomProductsView.seed_cookie].value)
+
     def test_requesting_non_integer_page_number_produces_400_status_code(self):
 
         response = self.client.get(reverse('get_random_products'), {'page': 'non-integer'})
@@ -444,13 +459,85 @@ class TestGetRandomProductsView(TestCase):
         response_data = json.loads(response.content)
         self.assertFalse(response_data['has_next_page'])
 
+    def test_pages_contain_every_published_product_once(self):
+        response1 = self.client.get(reverse('get_random_products'), {'page': 1})
+        response2 = self.client.get(reverse('get_random_products'), {'page': 2})
+
+        pks = [p['pk'] for r in [response1, response2] for p in json.loads(r.content)['products']]
+        self.assertEqual(sorted(pks), sorted(Product.published.values_list('pk', flat=True)))
+
     def test_setting_reset_key_usually_shuffles_products(self):
         # Note: changing seed doesnt imply changing order of products!
-        # this test relies on session['seed'] always being an integer during normal execution
-        session = self.client.session
-        session['seed'] = 'seed'
-        session.save()
+        # this test relies on seed always being a number during normal execution
+        self.client.cookies.load({GetRandomProductsView.seed_cookie: self.get_signer().sign('seed')})
+
+        self.client.get(reverse('get_random_products'), {'reset': ''})
+
+        self.assertNotEqual(self.get_seed(), 'seed')
+
+    def test_seed_is_kept_between_requests(self):
+        self.client.get(reverse('get_random_products'))
+        seed = self.get_seed()
+
+        self.client.get(reverse('get_random_products'), {'page': 2})
+
+        self.assertEqual(self.get_seed(), seed)
+
+    def test_forged_seed_is_replaced(self):
+        self.client.cookies.load({GetRandomProductsView.seed_cookie: 'forged'})
+
+        self.client.get(reverse('get_random_products'))
+
+        self.assertNotEqual(self.client.cookies[GetRandomProductsView.seed_cookie].value, 'forged')
+        self.assertIsNotNone(self.get_seed())
+
+    def test_session_is_not_used(self):
+        response = self.client.get(reverse('get_random_products'))
+
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+
+class TestProductAutocompleteView(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        common_setup(cls)
+
+    def setUp(self):
+        autocomplete_dictionary.drop()
+
+    def test_missing_prefix_produces_400_status_code(self):
+        response = self.client.get(reverse('autocomplete_products'))
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(reverse('autocomplete_products'), {'q': ' -'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_products_and_categories_are_returned(self):
+        response = self.client.get(reverse('autocomplete_products'), {'q': 'Fr'})
+
+        response_data = json.loads(response.content)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response_data['products'], [{
+            'pk': self.available_products[3].pk,
+            'name': 'Freeze One',
+            'category__name': 'fridges',
+            'category__slug': self.available_categories[1].slug,
+        }])
+        self.assertEqual(response_data['categories'], [{'name': 'fridges', 'slug': self.available_categories[1].slug}])
+
+    def test_saved_products_are_returned(self):
+        self.client.get(reverse('autocomplete_products'), {'q': 'a'})
+        product = self.available_products[0]
+        product.name = 'Nebula'
+        product.save()
+
+        response = self.client.get(reverse('autocomplete_products'), {'q': 'neb'})
+
+        response_data = json.loads(response.content)
+        self.assertEqual([p['pk'] for p in response_data['products']], [product.pk])
 
-        response = self.client.get(reverse('get_random_products'), {'reset': ''})
+    def test_requests_do_not_query_db_once_loaded(self):
+        self.client.get(reverse('autocomplete_products'), {'q': 'a'})
 
-        self.assertNotEqual(response.client.session['seed'], 'seed')
+        with self.assertNumQueries(0):
+            self.client.get(reverse('autocomplete_products'), {'q': 'ga'})
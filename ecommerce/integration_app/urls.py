@@ -1,7 +1,7 @@
 from django.urls import path
 
 from .views import IndexView, CategoryView, ProductView, SearchView, OrderView, AddProductToOrderView, \
-    DeleteProductFromOrderView, GetRandomProductsView
+    DeleteProductFromOrderView, GetRandomProductsView, ProductAutocompleteView
 
 urlpatterns = [
     path('', IndexView.as_view(), name='index'),
@@ -12,5 +12,6 @@ urlpatterns = [
     path('order/<uuid:order_id>', OrderView.as_view(), name='order'),
     path('order/add', AddProductToOrderView.as_view(), name='order_add'),
     path('order/delete', DeleteProductFromOrderView.as_view(), name='order_delete'),
-    path('products/random', GetRandomProductsView.as_view(), name='get_random_products')
+    path('products/random', GetRandomProductsView.as_view(), name='get_random_products'),
+    path('products/autocomplete', ProductAutocompleteView.as_view(), name='autocomplete_products')
 ]
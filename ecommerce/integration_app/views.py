@@ -1,21 +1,35 @@
-import random
+import secrets
+from typing import List
 
 from django import forms
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import UserCreationForm
 from django.core.paginator import Paginator, EmptyPage
+from django.db import transaction
 from django.db.models import QuerySet, F
 from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse_lazy
+from django.utils.timezone import now
 from django.views import View
 from django.views.generic import ListView, DetailView, CreateView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import PermissionDenied, BadRequest
 
-from catalog.filters import FilterFactory, Filters
+from catalog.autocomplete import autocomplete_dictionary
+from catalog.category_registry import category_registry
+from catalog.entity_cache import EntityCache
+from catalog.filter_cache import FiltersCache, ListingCache
+from catalog.filter_index import filter_indexes
+from catalog.filter_registry import filter_registry
+from catalog.filters import FilterFactory, Filters, FilterSpec, FilterCompiler
 from catalog.models import Category, Product, BaseDetails
-from catalog.search import SearchCategory, SearchCatalog
+from catalog.pagination import KeysetPaginator
+from catalog.product_cache import ProductCache
+from catalog.random_feed import FeistelPermutation, published_ids
+from catalog.search import SearchCategory, SearchCatalog, QueryPlanner
+from catalog.search_cache import search_results_cache
 from integration_app.ajax_views_classes import AJAXPostView, AJAXAuthRequiredMixin
 
 from orders.models import Order, OrderProducts
@@ -26,77 +40,179 @@ from orders.models import Order, OrderProducts
 # Catalog related views:
 
 
+def get_category_or_404(slug: str) -> Category:
+    category = category_registry.get_by_slug(slug)
+    if category is None:
+        raise Http404('No category found matching the query')
+    return category
+
+
 class IndexView(ListView):
-    queryset = Category.objects.all()
     template_name = 'catalog/index_page.html'
     context_object_name = 'categories'
 
+    def get_queryset(self):
+        return category_registry.all()
+
 
 class CategoryView(ListView):
     template_name = 'catalog/category_index.html'
     context_object_name = 'products'
 
+    # if set, counts and bounds of each filter reflect every other applied filter, costs one more query
+    disjunctive_facets = False
+
+    price_histogram_buckets = 10
+
+    products_per_page = 24
+
+    # orderings available to users, every one ends with pk and has matching index on Product
+    sorts = {
+        'newest': ['-published_at', '-pk'],
+        'price': ['price', 'pk'],
+        'discount': ['-discount_percent', '-pk'],
+    }
+    default_sort = 'newest'
+    RELEVANCE = 'relevance'  # available when products are ranked by search, see SearchBase
+
+    # columns used by the template and by sorts, description is not loaded
+    list_fields = ['name', 'category', 'short_details', 'published_at', 'price', 'discount_percent']
+
     def get_queryset(self):
-        self.category = get_object_or_404(Category, slug=self.kwargs['slug'])
-        queryset = Product.published.filter(category_id=self.category.pk)\
-            .prefetch_related('category').prefetch_related('details_object')
+        self.category = get_category_or_404(self.kwargs['slug'])
+        queryset = Product.published.filter(category_id=self.category.pk).only(*self.list_fields)
 
-        # gather first because dynamic filters need access to unfiltered queryset
-        self.gather_filters(queryset, self.category.details_content_type.model_class())
+        self.details_model = category_registry.get_details_model(self.category)
 
-        queryset = self.apply_filters(queryset)
+        # gather first because dynamic filters need access to unfiltered queryset
+        self.gather_filters(queryset, self.details_model)
 
         if 'q' in self.request.GET:
-            search_engine = SearchCategory(['name'])
-            queryset = search_engine.filter(self.request.GET['q'], queryset)
+            search_engine = SearchCategory(['name'], ranked=True)
+            try:
+                queryset = search_engine.filter(self.request.GET['q'], queryset)
+            except QueryPlanner.QueryRejected as e:
+                raise BadRequest(str(e))
+
+        if self.disjunctive_facets:
+            FilterFactory.narrow_facets(self.filters, queryset)
 
-        return queryset
+        paginator = self.get_paginator(queryset)
+        return self.paginate(self.apply_filters(queryset, paginator), paginator)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['filter_widgets'] = self.filters
+        context['facet_counts'] = {f.name: f.counts for f in self.filters if getattr(f, 'counts', None) is not None}
+        context['histograms'] = {f.name: f.histogram for f in self.filters if getattr(f, 'histogram', None)}
         context['current_category'] = self.category
+        context['sort'] = self.sort
+        context['sort_queries'] = {sort: self.get_page_query(sort=sort, after=None) for sort in self.available_sorts}
+        context['next_page_query'] = self.get_page_query(after=self.page.next_cursor) if self.page.has_next() else None
         return context
 
+    def get_paginator(self, queryset: QuerySet) -> KeysetPaginator:
+        """ Paginator for sort chosen by 'sort' GET-key """
+        self.available_sorts = dict(self.sorts)
+        if 'search_rank' in queryset.query.annotations:
+            self.available_sorts[self.RELEVANCE] = ['search_rank', 'pk']
+
+        self.sort = self.request.GET.get('sort')
+        if self.sort not in self.available_sorts:
+            self.sort = self.RELEVANCE if self.RELEVANCE in self.available_sorts else self.default_sort
+
+        return KeysetPaginator(self.available_sorts[self.sort], self.products_per_page)
+
+    def paginate(self, queryset: QuerySet, paginator: KeysetPaginator) -> List[Product]:
+        """ Keyset pagination, see KeysetPaginator. Cursor of the page is passed as 'after' GET-key """
+        cursor = self.request.GET.get('after')
+        try:
+            if self.sort == self.default_sort and not cursor and self.is_unfiltered():
+                self.page = ListingCache.get_or_paginate(self.category.pk, lambda: paginator.paginate(queryset))
+            else:
+                self.page = paginator.paginate(queryset, cursor)
+        except KeysetPaginator.InvalidCursor:
+            raise BadRequest('Invalid page cursor')
+
+        for product in self.page.object_list:
+            product.category = self.category  # instead of loading it for products
+        return self.page.object_list
+
+    def is_unfiltered(self) -> bool:
+        """ True if neither search nor filters narrow the listing """
+        return 'q' not in self.request.GET and not FilterCompiler.compile(self.filters)
+
+    def get_page_query(self, **params) -> str:
+        """ Current GET-query with replaced params, None value removes the param """
+        query = self.request.GET.copy()
+        for key, value in params.items():
+            query.pop(key, None)
+            if value is not None:
+                query[key] = value
+        return query.urlencode()
+
     def gather_filters(self, queryset: QuerySet, related_model_class: type[BaseDetails]):
-        self.filters = [
-            FilterFactory.produce('price', Filters.BOUND, queryset=queryset),
-            FilterFactory.produce('manufacturer', Filters.DYNAMIC_CHOICES, queryset=queryset)
+        specs = [
+            FilterSpec('price', Filters.BOUND, buckets=self.price_histogram_buckets),
+            FilterSpec('manufacturer', Filters.DYNAMIC_CHOICES)
         ]
+        specs += filter_registry.get_specs(related_model_class)
 
-        FilterFactory.add_filters_for_related_model(self.filters,
-                                                    related_model_class.generic_relation_name,
-                                                    related_model_class,
-                                                    queryset)
+        # facets of all filters are gathered at once, see FilterFactory.plan_facets, and cached
+        self.specs = specs
+        self.filters = FiltersCache.get_or_produce(self.category.pk, specs, queryset)
 
         for f in self.filters:
             f.parse(self.request.GET)
 
-    def apply_filters(self, queryset: QuerySet) -> QuerySet:
-        result = queryset
-        for f in self.filters:
-            result = f.filter(result)
-        return result
+    def apply_filters(self, queryset: QuerySet, paginator: KeysetPaginator) -> QuerySet:
+        if self.category.slug in settings.CATALOG_FILTER_INDEX_CATEGORIES:
+            index = filter_indexes.get(self.category.pk)
+            if index is None:
+                ordering_fields = {name.lstrip('-') for ordering in self.sorts.values() for name in ordering}
+                filter_indexes.build_later(self.category.pk, self.specs, ordering_fields)  # this time DB does the job
+            else:
+                # search narrows the queryset further, so only results of filters alone are cut to the page
+                page_paginator = None if 'q' in self.request.GET else paginator
+                try:
+                    ids = index.filter(self.filters, page_paginator, self.request.GET.get('after'))
+                except KeysetPaginator.InvalidCursor:
+                    raise BadRequest('Invalid page cursor')
+                if ids is not None:
+                    return queryset.filter(pk__in=ids)
+
+        return FilterCompiler.apply(queryset, self.filters, self.details_model)
 
 
 class ProductView(DetailView):
     template_name = 'catalog/product_details.html'
     pk_url_kwarg = 'id'
     context_object_name = 'product'
-    queryset = Product.published.all()
+    queryset = Product.published.select_related('category')
 
     def get_object(self, queryset=None):
-        product = super().get_object()
+        """ One query for product with its category and one for details, none if product is cached """
+        pk = self.kwargs[self.pk_url_kwarg]
+        cat_slug = self.kwargs['cat_slug']
 
-        category = get_object_or_404(Category, slug=self.kwargs['cat_slug'])
+        cached = ProductCache.get(pk)
+        if cached is not None:
+            product, self.details = cached
+            if product.category is None or product.category.slug != cat_slug or product.published_at > now():
+                raise Http404("Wrong category used!")
+            return product
 
-        if product.category_id != category.pk:
-            raise Http404("Wrong category used!")
+        try:
+            product = self.get_queryset().get(pk=pk, category__slug=cat_slug)
+        except Product.DoesNotExist:
+            raise Http404("No product found in this category")
 
+        self.details = EntityCache.get_details(product)
+        ProductCache.set(product, self.details)
         return product
 
     def get_context_data(self, **kwargs):
-        return super().get_context_data(details=self.object.details_object)
+        return super().get_context_data(details=self.details)
 
 
 class SearchView(ListView):
@@ -104,11 +220,13 @@ class SearchView(ListView):
     context_object_name = 'categories'
 
     def get_queryset(self):
-        search_engine = SearchCatalog()
+        search_engine = SearchCatalog(ranked=True)
         try:
-            search_results = search_engine.filter(self.request.GET.get('q'))
+            search_results = search_results_cache.get_or_search(self.request.GET.get('q', ''), search_engine)
         except SearchCatalog.NoQuerySpecified:
             raise BadRequest('Query missing')
+        except QueryPlanner.QueryRejected as e:
+            raise BadRequest(str(e))
 
         return search_results
 
@@ -124,15 +242,23 @@ class OrderView(LoginRequiredMixin, ListView):
     template_name = 'orders/order.html'
     context_object_name = 'product_details'
 
+    # columns used by the template, products are resolved through EntityCache
+    list_fields = ['amount', 'buying_price', 'order', 'product']
+
     def get_queryset(self):
-        order = get_object_or_404(Order, pk=self.kwargs['order_id'])
+        order = get_object_or_404(Order.objects.cached(), pk=self.kwargs['order_id'])
 
         self.order = order
 
         if self.order.user.id != self.request.user.id:
             raise PermissionDenied
 
-        return OrderProducts.objects.filter(order=order).select_related('product').prefetch_related('product__category')
+        product_details = list(OrderProducts.objects.filter(order=order).only(*self.list_fields).cached())
+        products = EntityCache.get_many(Product, [d.product_id for d in product_details])
+        for d in product_details:
+            d.product = products[d.product_id]
+            d.product.category = category_registry.get(d.product.category_id)
+        return product_details
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super().get_context_data(objects_list=object_list, **kwargs)
@@ -149,13 +275,14 @@ class ProfileView(LoginRequiredMixin, ListView):
     login_url = reverse_lazy('login')
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return Order.objects.filter(user=self.request.user).cached()
 
 
 # AJAX-related views:
 
 class ProductAmountForm(forms.Form):
-    product_id = forms.ModelChoiceField(queryset=Product.published.all())
+    """ Product row is locked till the end of transaction, validate inside transaction.atomic """
+    product_id = forms.ModelChoiceField(queryset=Product.published.select_for_update())
     amount = forms.IntegerField(required=False, min_value=1)
 
 
@@ -168,6 +295,10 @@ class AddProductToOrderView(AJAXAuthRequiredMixin, AJAXPostView):
     get_default = get_payload_default
     ValidationForm = ProductAmountForm
 
+    def post(self, request, *args, **kwargs):
+        with transaction.atomic():
+            return super().post(request, *args, **kwargs)
+
     def handle_request(self) -> None:
         product = self.cleaned_data['product_id']
         amount = self.cleaned_data['amount']
@@ -192,7 +323,7 @@ class AddProductToOrderView(AJAXAuthRequiredMixin, AJAXPostView):
             detail.save()
 
         product.units_available = F('units_available') - amount
-        product.save()
+        product.save(update_fields=['units_available'])
 
         self.response_data['success'] = True
 
@@ -202,6 +333,10 @@ class DeleteProductFromOrderView(AJAXAuthRequiredMixin, AJAXPostView):
     get_default = get_payload_default
     ValidationForm = ProductAmountForm
 
+    def post(self, request, *args, **kwargs):
+        with transaction.atomic():
+            return super().post(request, *args, **kwargs)
+
     def handle_request(self):
         product = self.cleaned_data['product_id']
         amount = self.cleaned_data['amount']
@@ -228,38 +363,67 @@ class DeleteProductFromOrderView(AJAXAuthRequiredMixin, AJAXPostView):
             detail.save()
 
         product.units_available = F('units_available') + released_amount
-        product.save()
+        product.save(update_fields=['units_available'])
 
         self.response_data['success'] = True
 
 
 class GetRandomProductsView(View):
+    # seed is kept in signed cookie, so the feed does not create or write sessions
+    seed_cookie = 'feed_seed'
+    seed_salt = 'integration_app.random_feed'
+
     def get(self, request, *args, **kwargs):
         try:
             page_num = int(request.GET.get('page', 1))
         except ValueError:
             return JsonResponse({}, status=400)
 
-        if 'reset' in request.GET and 'seed' in request.session:
-            del request.session['seed']
-
-        seed = request.session.setdefault('seed', random.randint(-32568, 32568))
+        seed = None
+        if 'reset' not in request.GET:
+            seed = request.get_signed_cookie(self.seed_cookie, default=None, salt=self.seed_salt)
+        is_new_seed = seed is None
+        if is_new_seed:
+            seed = str(secrets.randbits(32))
 
-        ids = list(Product.published.values_list('pk', flat=True))
-        random.seed(seed)
-        random.shuffle(ids)
-
-        paginated_ids = Paginator(ids, 10)
+        # only positions of requested page are shuffled, see FeistelPermutation
+        ids = published_ids.get()
+        paginated_positions = Paginator(range(len(ids)), 10)
 
         try:
-            current_page = paginated_ids.page(page_num)
+            current_page = paginated_positions.page(page_num)
         except EmptyPage:
             return JsonResponse({}, status=400)
 
-        fields = ['pk', 'name', 'picture', 'category__name', 'category__slug']
-        products = list(Product.published.filter(pk__in=current_page.object_list).values(*fields))
+        permutation = FeistelPermutation(len(ids), seed)
+        page_ids = [ids[permutation(position)] for position in current_page.object_list]
+
+        current_time = now()
+        cached_products = EntityCache.get_many(Product, page_ids)
+        products = []
+        for pk in page_ids:
+            product = cached_products.get(pk)
+            category = product and category_registry.get(product.category_id)
+            if category is not None and product.published_at <= current_time:
+                products.append({'pk': pk, 'name': product.name, 'picture': product.picture.name,
+                                 'category__name': category.name, 'category__slug': category.slug})
+
+        response = JsonResponse({'has_next_page': current_page.has_next(), 'products': products}, status=200)
+        if is_new_seed:
+            response.set_signed_cookie(self.seed_cookie, seed, salt=self.seed_salt, httponly=True, samesite='Lax')
+        return response
+
+
+class ProductAutocompleteView(View):
+    limit = 10
+
+    def get(self, request, *args, **kwargs):
+        prefix = request.GET.get('q', '')
+        if not autocomplete_dictionary.normalize(prefix):
+            return JsonResponse({}, status=400)
 
-        return JsonResponse({'has_next_page': current_page.has_next(), 'products': products}, status=200)
+        # served from memory, see catalog.autocomplete
+        return JsonResponse(autocomplete_dictionary.lookup(prefix, self.limit), status=200)
 
 
 class SignUpView(CreateView):
@@ -6,23 +6,24 @@ from django.urls import reverse_lazy
 from django.utils import timezone
 
 import catalog
+from catalog.query_cache import CachingManager
 from catalog.validators import validate_percent
 from .validators import non_zero_validator
 
 
 # Create your models here.
 
-class BasketManager(models.Manager):
+class BasketManager(CachingManager):
     def get_queryset(self):
         return super().get_queryset().filter(done=False, ordered=False)
 
 
-class ActiveOrdersManager(models.Manager):
+class ActiveOrdersManager(CachingManager):
     def get_queryset(self):
         return super().get_queryset().filter(done=False, ordered=True)
 
 
-class DoneManager(models.Manager):
+class DoneManager(CachingManager):
     def get_queryset(self):
         return super().get_queryset().filter(done=True, ordered=True)
 
@@ -45,7 +46,7 @@ class Order(models.Model):
     done = models.BooleanField(default=False)
     done_at = models.DateTimeField(null=True, blank=True)
 
-    objects = models.Manager()
+    objects = CachingManager()
     baskets = BasketManager()
     active_orders = ActiveOrdersManager()
     finished = DoneManager()
@@ -82,6 +83,8 @@ class OrderProducts(models.Model):
     buying_discount_percent = models.DecimalField(max_digits=5, decimal_places=2, validators=[validate_percent])
     amount = models.PositiveIntegerField(validators=[non_zero_validator])
 
+    objects = CachingManager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(name='unique_product_in_order', fields=['order', 'product'])
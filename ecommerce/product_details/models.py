@@ -129,7 +129,6 @@ class DecorationDetails(BaseDetails):
         ('width_cm', Filters.BOUND),
         ('height_cm', Filters.BOUND),
         ('quantity', Filters.BOUND),
-        ('has_illumination', Filters.BOOL_CHOICES),
         ('material', Filters.DYNAMIC_CHOICES),
         ('color', Filters.DYNAMIC_CHOICES)
     ]